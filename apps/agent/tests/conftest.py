@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from topos_agent.outbox import Outbox
+from topos_agent.state import ScanStateStore
+
+# The API's modules, for tests that check the agent's encodings against its parsers
+sys.path.append(str(Path(__file__).resolve().parents[2] / "api"))
+
+
+@pytest.fixture
+def state(tmp_path):
+    store = ScanStateStore(str(tmp_path / "state.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.db"))
+    yield box
+    box.close()
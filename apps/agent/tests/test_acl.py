@@ -0,0 +1,178 @@
+import errno
+import os
+import struct
+
+import pytest
+
+from topos_agent import acl
+from topos_agent.acl import (
+    ACL_GROUP,
+    ACL_GROUP_OBJ,
+    ACL_MASK,
+    ACL_OTHER,
+    ACL_USER,
+    ACL_USER_OBJ,
+    CIFS_ACL,
+    POSIX_ACL_ACCESS,
+    POSIX_ACL_DEFAULT,
+    AclEntry,
+    AclReader,
+    parse_cifs_acl,
+    parse_posix_acl,
+    posix_acl_entries,
+)
+
+NO_ID = 0xFFFFFFFF
+
+
+def posix_acl(*entries: tuple[int, int, int], version: int = 2) -> bytes:
+    return struct.pack("<I", version) + b"".join(struct.pack("<HHI", *e) for e in entries)
+
+
+def sid(authority: int, *subs: int) -> bytes:
+    return (
+        bytes([1, len(subs)])
+        + authority.to_bytes(6, "big")
+        + b"".join(struct.pack("<I", s) for s in subs)
+    )
+
+
+def security_descriptor(*aces: tuple[int, int, int, bytes]) -> bytes:
+    body = b""
+    for ace_type, flags, mask, ace_sid in aces:
+        body += struct.pack("<BBHI", ace_type, flags, 8 + len(ace_sid), mask) + ace_sid
+    dacl = struct.pack("<BBHHH", 2, 0, 8 + len(body), len(aces), 0) + body
+    return struct.pack("<BBHIIII", 1, 0, 0x8004, 0, 0, 0, 20) + dacl
+
+
+def stat_result(mode: int = 0o640, uid: int = 1000, gid: int = 1000) -> os.stat_result:
+    return os.stat_result((mode, 1, 0, 1, uid, gid, 0, 0, 0, 0))
+
+
+def test_parse_posix_acl():
+    data = posix_acl((ACL_USER_OBJ, 6, NO_ID), (ACL_USER, 4, 1234), (ACL_MASK, 4, NO_ID))
+
+    assert parse_posix_acl(data) == [
+        (ACL_USER_OBJ, 6, NO_ID),
+        (ACL_USER, 4, 1234),
+        (ACL_MASK, 4, NO_ID),
+    ]
+
+
+@pytest.mark.parametrize("data", [b"\x02\x00", posix_acl((ACL_USER_OBJ, 6, NO_ID), version=1)])
+def test_parse_posix_acl_rejects_malformed_headers(data):
+    with pytest.raises(ValueError, match="POSIX ACL"):
+        parse_posix_acl(data)
+
+
+def test_posix_entries_apply_mask_and_mark_inherited():
+    raw = [
+        (ACL_USER_OBJ, 6, NO_ID),
+        (ACL_USER, 6, 1234),
+        (ACL_GROUP_OBJ, 4, NO_ID),
+        (ACL_GROUP, 4, 5678),
+        (ACL_MASK, 4, NO_ID),
+        (ACL_OTHER, 0, NO_ID),
+    ]
+
+    entries = posix_acl_entries(raw, stat_result(), frozenset({(ACL_GROUP, 4, 5678)}))
+
+    rights = {e.principal_external_id: (e.rights, e.source) for e in entries}
+    assert rights == {
+        "uid:1000": ("RW", "FILE"),
+        "uid:1234": ("R", "FILE"),  # RW limited to R by the mask
+        "gid:1000": ("R", "FILE"),
+        "gid:5678": ("R", "INHERITED"),
+    }
+
+
+def test_parse_cifs_acl():
+    everyone = sid(1, 0)
+    domain_users = sid(5, 21, 1, 2, 3, 513)
+    data = security_descriptor(
+        (0x00, 0x00, 0x001F01FF, everyone),
+        (0x00, 0x10, 0x00000001, domain_users),
+        (0x01, 0x00, 0x00000001, sid(5, 11)),  # Deny ACEs are ignored
+    )
+
+    assert parse_cifs_acl(data) == [
+        AclEntry("sid:S-1-1-0", "Everyone", "GROUP", "FULL", "FILE"),
+        AclEntry("sid:S-1-5-21-1-2-3-513", "Domain Users", "GROUP", "R", "INHERITED"),
+    ]
+
+
+def test_null_dacl_grants_everyone():
+    data = struct.pack("<BBHIIII", 1, 0, 0x8004, 0, 0, 0, 0)
+
+    assert parse_cifs_acl(data) == [AclEntry("sid:S-1-1-0", "Everyone", "GROUP", "FULL", "FILE")]
+
+
+class FakeXattrs:
+    """os.getxattr stand-in serving attributes by (path, name) and counting reads."""
+
+    def __init__(self, attributes: dict[tuple[str, str], bytes], missing: int = errno.ENODATA):
+        self.attributes = attributes
+        self.missing = missing
+        self.reads: list[tuple[str, str]] = []
+
+    def __call__(self, path: str, name: str) -> bytes:
+        self.reads.append((path, name))
+        if (path, name) in self.attributes:
+            return self.attributes[(path, name)]
+        raise OSError(self.missing, os.strerror(self.missing))
+
+
+def test_reader_only_reads_the_acl_kind_the_share_has(monkeypatch):
+    descriptor = security_descriptor((0x00, 0x00, 0x00000001, sid(1, 0)))
+    xattrs = FakeXattrs({("/s/a.txt", CIFS_ACL): descriptor, ("/s/b.txt", CIFS_ACL): descriptor})
+    monkeypatch.setattr(acl.os, "getxattr", xattrs)
+    reader = AclReader("auto")
+
+    reader.read("/s/a.txt", stat_result())
+    xattrs.reads.clear()
+    entries = reader.read("/s/b.txt", stat_result())
+
+    assert xattrs.reads == [("/s/b.txt", CIFS_ACL)]
+    assert entries == [AclEntry("sid:S-1-1-0", "Everyone", "GROUP", "R", "FILE")]
+
+
+def test_reader_stops_reading_unsupported_attributes(monkeypatch):
+    xattrs = FakeXattrs({}, missing=errno.EOPNOTSUPP)
+    monkeypatch.setattr(acl.os, "getxattr", xattrs)
+    reader = AclReader("auto")
+
+    reader.read("/s/a.txt", stat_result())
+    xattrs.reads.clear()
+    reader.read("/s/b.txt", stat_result())
+
+    assert xattrs.reads == []
+
+
+def test_file_without_acl_inherits_directory_default(monkeypatch):
+    default = posix_acl(
+        (ACL_USER_OBJ, 7, NO_ID),
+        (ACL_GROUP, 6, 5678),
+        (ACL_GROUP_OBJ, 5, NO_ID),
+        (ACL_MASK, 4, NO_ID),
+        (ACL_OTHER, 0, NO_ID),
+    )
+    monkeypatch.setattr(acl.os, "getxattr", FakeXattrs({("/s", POSIX_ACL_DEFAULT): default}))
+
+    entries = AclReader("posix").read("/s/a.txt", stat_result(mode=0o600))
+
+    assert [(e.principal_external_id, e.rights, e.source) for e in entries] == [
+        ("uid:1000", "RW", "FILE"),
+        ("gid:5678", "R", "INHERITED"),
+    ]
+
+
+def test_explicit_posix_acl_is_used(monkeypatch):
+    access = posix_acl((ACL_USER_OBJ, 6, NO_ID), (ACL_GROUP_OBJ, 0, NO_ID), (ACL_OTHER, 4, NO_ID))
+    monkeypatch.setattr(acl.os, "getxattr", FakeXattrs({("/s/a.txt", POSIX_ACL_ACCESS): access}))
+
+    entries = AclReader("auto").read("/s/a.txt", stat_result())
+
+    assert [(e.principal_external_id, e.rights) for e in entries] == [
+        ("uid:1000", "RW"),
+        ("posix:other", "R"),
+    ]
@@ -0,0 +1,67 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from topos_agent.acl import AclEntry, compute_acl_hash
+from topos_agent.client import ToposClient, encode_compact_events
+from topos_agent.reconcile import file_entry_digest
+from topos_agent.scanner import FileInfo
+
+# Skipped where the API's dependencies are not installed
+api_ingest = pytest.importorskip("app.api.ingest")
+api_folder_digest = pytest.importorskip("app.services.folder_digest")
+api_schemas = pytest.importorskip("app.schemas")
+
+
+def file_info(relative_path: str, share_name: str = "docs", acl: str = "Domain Users") -> FileInfo:
+    entries = [AclEntry(f"sid:{acl}", acl, "GROUP", "R", "INHERITED")]
+    return FileInfo(
+        share_name=share_name,
+        relative_path=relative_path,
+        size_bytes=1024,
+        mtime=datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=UTC),
+        file_type="pdf",
+        content_hash="sha256:abc",
+        acl_hash=compute_acl_hash(entries),
+        acl_entries=entries,
+    )
+
+
+def test_compact_events_round_trip_through_api_parser():
+    events = ToposClient.build_events(
+        [
+            file_info("a/1.pdf"),
+            file_info("a/2.pdf"),
+            file_info("b/3.pdf", share_name="hr", acl="HR"),
+        ]
+    ) + ToposClient.build_deletions("docs", ["a/old.pdf"])
+
+    body = api_ingest.decompress_gzip(encode_compact_events("agent-1", events))
+    request = api_ingest.parse_compact_events(body)
+
+    expected = api_schemas.IngestEventsRequest.model_validate(
+        {"agent_id": "agent-1", "events": events}
+    )
+    assert request.agent_id == "agent-1"
+    assert [e.model_dump(exclude={"acl_entries"}) for e in request.events] == [
+        e.model_dump(exclude={"acl_entries"}) for e in expected.events
+    ]
+    # Each distinct ACL travels once, as a set keyed by its hash
+    assert {
+        acl_hash: [entry.model_dump() for entry in entries]
+        for acl_hash, entries in request.acl_sets.items()
+    } == {event["acl_hash"]: event["acl_entries"] for event in events if event.get("acl_entries")}
+
+
+@pytest.mark.parametrize(
+    "mtime",
+    [
+        datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=UTC),
+        datetime(2026, 3, 1, 12, 30, 15, 123456),
+        datetime(1969, 12, 31, 23, 59, 59, tzinfo=UTC),
+    ],
+)
+def test_file_entry_digest_matches_api(mtime):
+    args = ("a/ü 1.pdf", 1024, mtime, "blake2b:abc")
+
+    assert file_entry_digest(*args) == api_folder_digest.file_entry_digest(*args)
@@ -0,0 +1,75 @@
+import asyncio
+
+from topos_agent.client import ToposClient
+from topos_agent.config import AgentSettings
+from topos_agent.outbox import Outbox
+
+
+def test_batches_are_peeked_oldest_first_until_acked(outbox):
+    first = outbox.append([{"relative_path": "a.txt"}])
+    second = outbox.append([{"relative_path": "b.txt"}])
+
+    assert outbox.pending() == 2
+    assert outbox.peek(10) == [
+        (first, [{"relative_path": "a.txt"}]),
+        (second, [{"relative_path": "b.txt"}]),
+    ]
+
+    outbox.ack(first)
+
+    assert outbox.pending() == 1
+    assert outbox.peek(10) == [(second, [{"relative_path": "b.txt"}])]
+
+
+def test_failed_batch_stays_until_dead(outbox):
+    batch_id = outbox.append([{"relative_path": "a.txt"}])
+
+    outbox.record_failure(batch_id)
+    assert outbox.peek(1) == [(batch_id, [{"relative_path": "a.txt"}])]
+
+    outbox.record_failure(batch_id, dead=True)
+    assert outbox.peek(1) == []
+    assert outbox.pending() == 0
+    assert outbox.dead_letters() == 1
+
+
+def test_batches_survive_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.ack(outbox.append([{"relative_path": "a.txt"}]))
+    batch_id = outbox.append([{"relative_path": "b.txt"}])
+    outbox.close()
+
+    outbox = Outbox(path)
+    assert outbox.pending() == 1
+    assert outbox.peek(10) == [(batch_id, [{"relative_path": "b.txt"}])]
+    outbox.close()
+
+
+def test_wait_covers_only_batches_queued_before_it(outbox):
+    client = ToposClient(AgentSettings(), outbox)
+    sent: list[list[dict]] = []
+
+    async def post_events(events: list[dict]) -> dict:
+        sent.append(events)
+        if len(sent) == 1:
+            # Queued while waiting, e.g. by a watcher, and never accepted
+            await client.queue_events([{"relative_path": "late.txt"}])
+        else:
+            await asyncio.Event().wait()
+        return {"processed": len(events)}
+
+    client._post_events = post_events
+
+    async def run() -> tuple[bool, bool]:
+        await client.queue_events([{"relative_path": "a.txt"}])
+        unsent = await client.wait_outbox_sent(timeout=0.01)
+        drain_task = asyncio.create_task(client.drain_outbox())
+        try:
+            return unsent, await client.wait_outbox_sent(timeout=5)
+        finally:
+            drain_task.cancel()
+            await asyncio.gather(drain_task, return_exceptions=True)
+
+    assert asyncio.run(run()) == (False, True)
+    assert sent[0] == [{"relative_path": "a.txt"}]
@@ -0,0 +1,72 @@
+from topos_agent.checkpoint import ScanCheckpoint
+from topos_agent.state import ScanStateStore
+
+INCLUDE_PATHS = ["/docs", "/hr"]
+
+
+def test_fresh_scan_has_no_progress(state):
+    assert state.begin_scan("share") == (1, None)
+
+
+def test_interrupted_scan_resumes_after_checkpoint(tmp_path):
+    path = str(tmp_path / "state.db")
+    state = ScanStateStore(path)
+    scan_id, _ = state.begin_scan("share")
+    checkpoint = ScanCheckpoint(state, "share", INCLUDE_PATHS)
+
+    # Two directories walked; only the first one's files were queued
+    checkpoint.add("/docs", "docs/a")
+    checkpoint.add("/docs", "docs/a")
+    checkpoint.add("/docs", "docs/b")
+    checkpoint.acknowledge(["docs/a/1.txt", "docs/a/2.txt"], errors=1)
+    state.close()
+
+    state = ScanStateStore(path)
+    resumed_id, progress = state.begin_scan("share")
+    assert resumed_id == scan_id
+    checkpoint = ScanCheckpoint(state, "share", INCLUDE_PATHS)
+    checkpoint.resume(progress)
+
+    assert checkpoint.resumed
+    assert checkpoint.progress.errors == 1
+    assert not checkpoint.include_completed("/docs")
+    assert checkpoint.resume_after("/docs") == "docs/a"
+    assert checkpoint.resume_after("/hr") is None
+    state.close()
+
+
+def test_completed_include_path_is_skipped_on_resume(state):
+    state.begin_scan("share")
+    checkpoint = ScanCheckpoint(state, "share", INCLUDE_PATHS)
+    checkpoint.add("/docs", "docs")
+    checkpoint.include_listed("/docs")
+    checkpoint.acknowledge(["docs/1.txt"])
+
+    _, progress = state.begin_scan("share")
+    checkpoint = ScanCheckpoint(state, "share", INCLUDE_PATHS)
+    checkpoint.resume(progress)
+
+    assert checkpoint.include_completed("/docs")
+    assert not checkpoint.include_completed("/hr")
+
+
+def test_changed_include_paths_restart_the_scan(state):
+    state.begin_scan("share")
+    checkpoint = ScanCheckpoint(state, "share", INCLUDE_PATHS)
+    checkpoint.add("/docs", "docs")
+    checkpoint.include_listed("/docs")
+    checkpoint.acknowledge(["docs/1.txt"])
+
+    _, progress = state.begin_scan("share")
+    checkpoint = ScanCheckpoint(state, "share", ["/hr"])
+    checkpoint.resume(progress)
+
+    assert checkpoint.progress.include_path is None
+    assert checkpoint.resume_after("/hr") is None
+
+
+def test_finished_scan_starts_a_new_one(state):
+    scan_id, _ = state.begin_scan("share")
+    state.finish_scan("share")
+
+    assert state.begin_scan("share") == (scan_id + 1, None)
@@ -0,0 +1,61 @@
+import pytest
+
+from topos_agent import throttle
+from topos_agent.throttle import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(throttle.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(throttle.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_zero_rate_means_unlimited():
+    assert RateLimiter.per_second(0) is None
+    with pytest.raises(ValueError, match="positive"):
+        RateLimiter(0)
+
+
+def test_bucket_covers_one_second_then_throttles(clock):
+    limiter = RateLimiter(10)
+
+    for _ in range(10):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.1)]
+
+
+def test_large_request_leaves_debt(clock):
+    limiter = RateLimiter(100)
+
+    limiter.acquire(300)
+
+    assert clock.sleeps == [pytest.approx(2.0)]
+    assert limiter.slept_seconds == pytest.approx(2.0)
+
+
+def test_tokens_refill_over_time(clock):
+    limiter = RateLimiter(10)
+    limiter.acquire(10)
+
+    clock.now += 0.5
+    limiter.acquire(5)
+
+    assert clock.sleeps == []
@@ -0,0 +1,371 @@
+import errno
+import functools
+import grp
+import hashlib
+import logging
+import os
+import pwd
+import struct
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+POSIX_ACL_ACCESS = "system.posix_acl_access"
+POSIX_ACL_DEFAULT = "system.posix_acl_default"
+CIFS_ACL = "system.cifs_acl"
+
+# POSIX ACL xattr layout: uint32 version, then (uint16 tag, uint16 perm, uint32 id) entries
+POSIX_ACL_HEADER = struct.Struct("<I")
+POSIX_ACL_XATTR_VERSION = 0x0002
+POSIX_ACL_ENTRY = struct.Struct("<HHI")
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+PERM_READ = 0x4
+PERM_WRITE = 0x2
+
+# NT security descriptor layout (self-relative), as returned by CIFS
+SD_HEADER = struct.Struct("<BBHIIII")
+ACL_HEADER = struct.Struct("<BBHHH")
+ACE_HEADER = struct.Struct("<BBHI")
+ACCESS_ALLOWED_ACE_TYPE = 0x00
+INHERITED_ACE = 0x10
+FILE_READ_DATA = 0x00000001
+FILE_WRITE_DATA = 0x00000002
+FILE_ALL_ACCESS = 0x001F01FF
+GENERIC_ALL = 0x10000000
+GENERIC_WRITE = 0x40000000
+GENERIC_READ = 0x80000000
+
+WELL_KNOWN_SIDS = {
+    "S-1-1-0": ("Everyone", "GROUP"),
+    "S-1-5-11": ("Authenticated Users", "GROUP"),
+    "S-1-5-18": ("SYSTEM", "SERVICE"),
+    "S-1-5-32-544": ("Administrators", "GROUP"),
+    "S-1-5-32-545": ("Users", "GROUP"),
+}
+DOMAIN_GROUP_RIDS = {
+    512: "Domain Admins",
+    513: "Domain Users",
+    514: "Domain Guests",
+    515: "Domain Computers",
+}
+
+ACL_SOURCES = ("auto", "posix", "cifs", "mode")
+
+# errno values meaning "this filesystem does not support the attribute at all"
+UNSUPPORTED_ERRNOS = {errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+@dataclass
+class AclEntry:
+    """Represents an ACL entry for a file."""
+
+    principal_external_id: str
+    principal_display_name: str
+    principal_type: str = "USER"
+    rights: str = "R"
+    source: str = "FILE"
+
+
+def compute_acl_hash(acl_entries: list[AclEntry]) -> str:
+    """Compute hash of ACL entries for change detection."""
+    if not acl_entries:
+        return "sha256:empty"
+
+    # Sort entries for consistent hashing
+    sorted_entries = sorted(
+        acl_entries,
+        key=lambda e: (e.principal_external_id, e.rights, e.source),
+    )
+
+    content = "|".join(f"{e.principal_external_id}:{e.rights}:{e.source}" for e in sorted_entries)
+    return f"sha256:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+@functools.lru_cache(maxsize=4096)
+def user_name(uid: int) -> str:
+    """Resolve a uid to a user name, falling back to a generic label."""
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return f"User {uid}"
+
+
+@functools.lru_cache(maxsize=4096)
+def group_name(gid: int) -> str:
+    """Resolve a gid to a group name, falling back to a generic label."""
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return f"Group {gid}"
+
+
+def _posix_rights(perm: int) -> str | None:
+    if not perm & PERM_READ:
+        return None
+    return "RW" if perm & PERM_WRITE else "R"
+
+
+def _posix_principal(tag: int, qualifier: int) -> tuple[str, str, str]:
+    """Return (external_id, display_name, principal_type) for a POSIX ACL entry."""
+    if tag == ACL_OTHER:
+        return "posix:other", "Everyone", "GROUP"
+    if tag in (ACL_USER_OBJ, ACL_USER):
+        return f"uid:{qualifier}", user_name(qualifier), "USER"
+    return f"gid:{qualifier}", group_name(qualifier), "GROUP"
+
+
+def parse_posix_acl(data: bytes) -> list[tuple[int, int, int]]:
+    """Parse a POSIX ACL xattr into (tag, perm, id) tuples."""
+    if len(data) < POSIX_ACL_HEADER.size:
+        raise ValueError("POSIX ACL too short")
+    (version,) = POSIX_ACL_HEADER.unpack_from(data)
+    if version != POSIX_ACL_XATTR_VERSION:
+        raise ValueError(f"Unsupported POSIX ACL version {version}")
+    return [
+        POSIX_ACL_ENTRY.unpack_from(data, offset)
+        for offset in range(POSIX_ACL_HEADER.size, len(data), POSIX_ACL_ENTRY.size)
+    ]
+
+
+def posix_acl_entries(
+    raw_entries: list[tuple[int, int, int]],
+    stat: os.stat_result,
+    inherited: frozenset[tuple[int, int, int]] = frozenset(),
+) -> list[AclEntry]:
+    """
+    Convert POSIX ACL entries into AclEntry objects for principals that can read.
+
+    Named entries and the owning group are limited by the mask entry. Named
+    entries that also appear in the parent directory's default ACL are
+    reported as INHERITED.
+    """
+    mask = next((perm for tag, perm, _ in raw_entries if tag == ACL_MASK), 0o7)
+    entries = []
+
+    for tag, perm, qualifier in raw_entries:
+        if tag == ACL_MASK:
+            continue
+        effective = perm & mask if tag in (ACL_USER, ACL_GROUP, ACL_GROUP_OBJ) else perm
+        rights = _posix_rights(effective)
+        if rights is None:
+            continue
+
+        if tag == ACL_USER_OBJ:
+            qualifier = stat.st_uid
+        elif tag == ACL_GROUP_OBJ:
+            qualifier = stat.st_gid
+
+        external_id, display_name, principal_type = _posix_principal(tag, qualifier)
+        entries.append(
+            AclEntry(
+                principal_external_id=external_id,
+                principal_display_name=display_name,
+                principal_type=principal_type,
+                rights=rights,
+                source="INHERITED" if (tag, perm, qualifier) in inherited else "FILE",
+            )
+        )
+
+    return entries
+
+
+def mode_acl_entries(stat: os.stat_result) -> list[AclEntry]:
+    """Derive ACL entries from owner, group and other permission bits."""
+    return posix_acl_entries(
+        [
+            (ACL_USER_OBJ, (stat.st_mode >> 6) & 0o7, stat.st_uid),
+            (ACL_GROUP_OBJ, (stat.st_mode >> 3) & 0o7, stat.st_gid),
+            (ACL_OTHER, stat.st_mode & 0o7, 0),
+        ],
+        stat,
+    )
+
+
+def _sid_to_string(data: bytes, offset: int) -> tuple[str, int]:
+    """Decode a binary SID; returns (string form, size in bytes)."""
+    revision, count = data[offset], data[offset + 1]
+    authority = int.from_bytes(data[offset + 2 : offset + 8], "big")
+    subs = struct.unpack_from(f"<{count}I", data, offset + 8)
+    return f"S-{revision}-{authority}" + "".join(f"-{s}" for s in subs), 8 + 4 * count
+
+
+def _sid_principal(sid: str) -> tuple[str, str]:
+    """Return (display_name, principal_type) for a SID."""
+    if sid in WELL_KNOWN_SIDS:
+        return WELL_KNOWN_SIDS[sid]
+    if sid.startswith("S-1-5-21-"):
+        rid = int(sid.rsplit("-", 1)[1])
+        if rid in DOMAIN_GROUP_RIDS:
+            return DOMAIN_GROUP_RIDS[rid], "GROUP"
+    # Without a directory lookup, other SIDs cannot be told apart; assume users
+    return sid, "USER"
+
+
+def _nt_rights(mask: int) -> str | None:
+    if mask & GENERIC_ALL or mask & FILE_ALL_ACCESS == FILE_ALL_ACCESS:
+        return "FULL"
+    if not mask & (FILE_READ_DATA | GENERIC_READ):
+        return None
+    return "RW" if mask & (FILE_WRITE_DATA | GENERIC_WRITE) else "R"
+
+
+def parse_cifs_acl(data: bytes) -> list[AclEntry]:
+    """
+    Parse an NT security descriptor from the CIFS ACL xattr.
+
+    Only access-allowed ACEs that grant read are reported; deny ACEs are
+    ignored, matching the read-only effective access model used by the API.
+    """
+    _rev, _sbz, _control, _owner, _group, _sacl, dacl_offset = SD_HEADER.unpack_from(data, 0)
+    if dacl_offset == 0:
+        # A NULL DACL grants everyone full access
+        return [AclEntry("sid:S-1-1-0", "Everyone", "GROUP", "FULL", "FILE")]
+
+    _acl_rev, _sbz1, _size, ace_count, _sbz2 = ACL_HEADER.unpack_from(data, dacl_offset)
+    offset = dacl_offset + ACL_HEADER.size
+    entries = []
+
+    for _ in range(ace_count):
+        ace_type, ace_flags, ace_size, mask = ACE_HEADER.unpack_from(data, offset)
+        if ace_type == ACCESS_ALLOWED_ACE_TYPE:
+            rights = _nt_rights(mask)
+            if rights is not None:
+                sid, _ = _sid_to_string(data, offset + ACE_HEADER.size)
+                display_name, principal_type = _sid_principal(sid)
+                entries.append(
+                    AclEntry(
+                        principal_external_id=f"sid:{sid}",
+                        principal_display_name=display_name,
+                        principal_type=principal_type,
+                        rights=rights,
+                        source="INHERITED" if ace_flags & INHERITED_ACE else "FILE",
+                    )
+                )
+        offset += ace_size
+
+    return entries
+
+
+class AclReader:
+    """
+    Read effective ACL entries for files, one directory at a time.
+
+    Per directory, the default POSIX ACL is read once and parsed results are
+    cached by their raw xattr bytes, so files sharing their directory's ACL
+    (the common case) only cost the xattr read itself. Files without an
+    explicit ACL get the directory's default ACL, with owner, group and
+    other taken from their permission bits, or only those bits if there is
+    none. Attributes the filesystem does not support are remembered and
+    never requested again. In auto mode, once a file has a POSIX or CIFS
+    ACL, only that kind is read for the rest of the share.
+
+    Not thread-safe; use one reader per walking thread.
+    """
+
+    def __init__(self, source: str = "auto"):
+        if source not in ACL_SOURCES:
+            raise ValueError(f"Unknown ACL source {source!r}; expected one of {ACL_SOURCES}")
+        self.source = source
+        self._posix_supported = source in ("auto", "posix")
+        self._cifs_supported = source in ("auto", "cifs")
+        self._directory: str | None = None
+        self._inherited: frozenset[tuple[int, int, int]] = frozenset()
+        self._mask: tuple[int, int, int] | None = None  # Mask entry of the default ACL
+        self._cache: dict[tuple[bytes, int, int, int], list[AclEntry]] = {}
+
+    def read(self, path: str, stat: os.stat_result) -> list[AclEntry]:
+        """Return the ACL entries for a file, given its current stat result."""
+        directory = os.path.dirname(path)
+        if directory != self._directory:
+            self._enter_directory(directory)
+
+        try:
+            if self._posix_supported:
+                data = self._getxattr(path, POSIX_ACL_ACCESS)
+                if data is not None:
+                    entries = self._cached(data, stat, self._posix_entries)
+                    self._found("posix")
+                    return entries
+
+            if self._cifs_supported:
+                data = self._getxattr(path, CIFS_ACL)
+                if data is not None:
+                    entries = self._cached(data, stat, lambda d, _s: parse_cifs_acl(d))
+                    self._found("cifs")
+                    return entries
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Could not parse ACL of {path}, using permission bits: {e}")
+
+        return self._cached(b"", stat, self._default_entries)
+
+    def _found(self, kind: str) -> None:
+        """Stop reading the other kind of ACL once a file of the share had this one."""
+        if self.source != "auto" or not (self._posix_supported and self._cifs_supported):
+            return
+        logger.info(f"Found {kind} ACLs; not reading other kinds for this share")
+        self._posix_supported = kind == "posix"
+        self._cifs_supported = kind == "cifs"
+
+    def _enter_directory(self, directory: str) -> None:
+        self._directory = directory
+        self._cache.clear()
+        self._inherited = frozenset()
+        self._mask = None
+        if self._posix_supported:
+            data = self._getxattr(directory, POSIX_ACL_DEFAULT)
+            if data is not None:
+                try:
+                    default = parse_posix_acl(data)
+                except (ValueError, struct.error) as e:
+                    logger.warning(f"Could not parse default ACL of {directory}: {e}")
+                    return
+                self._inherited = frozenset(
+                    entry for entry in default if entry[0] in (ACL_USER, ACL_GROUP)
+                )
+                self._mask = next((entry for entry in default if entry[0] == ACL_MASK), None)
+
+    def _posix_entries(self, data: bytes, stat: os.stat_result) -> list[AclEntry]:
+        return posix_acl_entries(parse_posix_acl(data), stat, self._inherited)
+
+    def _default_entries(self, _data: bytes, stat: os.stat_result) -> list[AclEntry]:
+        """Entries of a file without an explicit ACL, inherited from its directory."""
+        if not self._inherited:
+            return mode_acl_entries(stat)
+        raw_entries = [
+            (ACL_USER_OBJ, (stat.st_mode >> 6) & 0o7, stat.st_uid),
+            (ACL_GROUP_OBJ, (stat.st_mode >> 3) & 0o7, stat.st_gid),
+            (ACL_OTHER, stat.st_mode & 0o7, 0),
+            *sorted(self._inherited),
+        ]
+        if self._mask is not None:
+            raw_entries.append(self._mask)
+        return posix_acl_entries(raw_entries, stat, self._inherited)
+
+    def _cached(self, data: bytes, stat: os.stat_result, parse) -> list[AclEntry]:
+        # Owner entries depend on the file's owner, and mode-derived entries on its mode
+        key = (data, stat.st_uid, stat.st_gid, 0 if data else stat.st_mode & 0o777)
+        entries = self._cache.get(key)
+        if entries is None:
+            entries = parse(data, stat)
+            self._cache[key] = entries
+        return entries
+
+    def _getxattr(self, path: str, name: str) -> bytes | None:
+        """Read an xattr, returning None if absent and disabling it if unsupported."""
+        try:
+            return os.getxattr(path, name)
+        except OSError as e:
+            if e.errno in UNSUPPORTED_ERRNOS:
+                logger.info(f"Filesystem does not support {name}; not reading it again")
+                if name == CIFS_ACL:
+                    self._cifs_supported = False
+                else:
+                    self._posix_supported = False
+            elif e.errno != errno.ENODATA:
+                logger.warning(f"Could not read {name} of {path}: {e}")
+            return None
@@ -0,0 +1,480 @@
+"""
+Scan benchmark: synthetic shares scanned and uploaded to a local stub API.
+
+Generates a directory tree under a temporary directory, then runs the
+agent's full scan and upload path against it several times:
+
+- cold: no local state, every file is hashed
+- unchanged: the same tree again, nothing should be hashed
+- churn: after modifying, adding and deleting a fraction of the files
+
+The stub API runs in a separate process, so resource figures only cover
+the agent. Usage:
+
+    python -m topos_agent.benchmark --files 20000 --depth 4 --churn 0.05
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+from topos_agent.client import NDJSON_MEDIA_TYPE
+from topos_agent.config import AgentSettings, ShareConfig
+from topos_agent.main import Agent
+
+logger = logging.getLogger(__name__)
+
+# Extensions generated by default, with relative weights
+DEFAULT_TYPE_MIX = "txt=50,pdf=25,docx=15,pptx=10"
+
+# Words making up generated text files
+WORDS = (
+    "agreement",
+    "policy",
+    "data",
+    "storage",
+    "share",
+    "access",
+    "review",
+    "contract",
+    "budget",
+    "quarter",
+    "retention",
+    "schedule",
+    "customer",
+    "vendor",
+    "invoice",
+)
+
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ShareSpec:
+    """Shape of a synthetic share."""
+
+    files: int = 10000
+    depth: int = 3  # Folder levels below the share root
+    fanout: int = 8  # Subfolders per folder
+    # File sizes are log-normal around the median, capped at max_size_bytes
+    median_size_bytes: int = 32 * 1024
+    size_sigma: float = 1.5
+    max_size_bytes: int = 64 * 1024 * 1024
+    type_mix: dict[str, float] = field(default_factory=dict)
+    seed: int = 0
+
+
+def parse_type_mix(value: str) -> dict[str, float]:
+    """Parse "txt=50,pdf=25" into extension weights."""
+    mix = {}
+    for item in value.split(","):
+        extension, _, weight = item.partition("=")
+        mix[extension.strip().lstrip(".")] = float(weight or 1)
+    return mix
+
+
+def list_folders(depth: int, fanout: int) -> list[str]:
+    """Relative paths of every folder of a tree, the root ("") first."""
+    folders = [""]
+    level = [""]
+    for _ in range(depth):
+        level = [
+            os.path.join(parent, f"dir{i:03d}") if parent else f"dir{i:03d}"
+            for parent in level
+            for i in range(fanout)
+        ]
+        folders.extend(level)
+    return folders
+
+
+def random_size(rng: random.Random, spec: ShareSpec) -> int:
+    """Draw a file size from the spec's distribution."""
+    size = rng.lognormvariate(math.log(spec.median_size_bytes), spec.size_sigma)
+    return min(int(size), spec.max_size_bytes)
+
+
+def write_file(path: str, size: int, rng: random.Random) -> None:
+    """Write a file of the given size, as text for .txt files and random bytes otherwise."""
+    text = path.endswith(".txt")
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            n = min(remaining, WRITE_CHUNK_SIZE)
+            if text:
+                words = " ".join(rng.choices(WORDS, k=n // 6 + 1)).encode()
+                f.write(words[:n])
+            else:
+                f.write(rng.randbytes(n))
+            remaining -= n
+
+
+def generate_share(root: str, spec: ShareSpec) -> list[str]:
+    """
+    Create a synthetic share under root.
+
+    Returns:
+        Relative paths of the files created
+    """
+    rng = random.Random(spec.seed)
+    folders = list_folders(spec.depth, spec.fanout)
+    for folder in folders:
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    extensions = list(spec.type_mix or parse_type_mix(DEFAULT_TYPE_MIX))
+    weights = list((spec.type_mix or parse_type_mix(DEFAULT_TYPE_MIX)).values())
+    paths = []
+    for i in range(spec.files):
+        folder = rng.choice(folders)
+        extension = rng.choices(extensions, weights)[0]
+        relative_path = os.path.join(folder, f"file{i:07d}.{extension}")
+        write_file(os.path.join(root, relative_path), random_size(rng, spec), rng)
+        paths.append(relative_path)
+    return paths
+
+
+def apply_churn(root: str, paths: list[str], fraction: float, spec: ShareSpec) -> list[str]:
+    """
+    Modify, delete and add files, each a third of the given fraction of the share.
+
+    Returns:
+        Relative paths of the files now in the share
+    """
+    rng = random.Random(spec.seed + 1)
+    count = int(len(paths) * fraction / 3)
+    touched = rng.sample(paths, min(2 * count, len(paths)))
+    modified, deleted = touched[:count], touched[count:]
+
+    for relative_path in modified:
+        write_file(os.path.join(root, relative_path), random_size(rng, spec), rng)
+    for relative_path in deleted:
+        os.unlink(os.path.join(root, relative_path))
+
+    remaining = sorted(set(paths) - set(deleted))
+    folders = list_folders(spec.depth, spec.fanout)
+    for i in range(count):
+        folder = rng.choice(folders)
+        relative_path = os.path.join(folder, f"added{i:07d}.txt")
+        write_file(os.path.join(root, relative_path), random_size(rng, spec), rng)
+        remaining.append(relative_path)
+    return remaining
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """
+    Accept agent requests the way an API with no prior knowledge would.
+
+    Every file is new and every folder differs, so nothing is skipped on the
+    API's say-so. GET /stats returns request, event and byte counts.
+    """
+
+    protocol_version = "HTTP/1.1"
+    counters: ClassVar[dict[str, int]] = {"requests": 0, "events": 0, "bytes": 0}
+    counters_lock = threading.Lock()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def count(self, name: str, value: int) -> None:
+        with self.counters_lock:
+            self.counters[name] += value
+
+    def reply(self, status: int, body: dict | None = None) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.count("requests", 1)
+        self.count("bytes", len(body))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            with self.counters_lock:
+                self.reply(200, self.counters)
+        else:
+            self.reply(404, {"detail": "Not found"})
+
+    def do_POST(self) -> None:
+        body = self.read_body()
+        if self.path == "/v0/ingest/events":
+            if self.headers.get("Content-Type") == NDJSON_MEDIA_TYPE:
+                events = len(body.splitlines()) - 1
+            else:
+                events = len(json.loads(body)["events"])
+            self.count("events", events)
+            self.reply(200, {"processed": events, "jobs_created": 0})
+        elif self.path == "/v0/ingest/reconcile":
+            entries = json.loads(body)["entries"]
+            paths = [entry["relative_path"] for entry in entries]
+            self.reply(200, {"new": paths, "changed": [], "unchanged": []})
+        elif self.path == "/v0/ingest/folders/compare":
+            folders = json.loads(body)["folders"]
+            self.reply(200, {"different": [folder["path"] for folder in folders]})
+        elif self.path == "/v0/ingest/content/missing":
+            self.reply(200, {"content_hashes": json.loads(body)["content_hashes"]})
+        elif self.path == "/v0/ingest/scans":
+            self.reply(201, {"session_id": str(uuid.uuid4())})
+        elif self.path.startswith("/v0/ingest/scans/") and self.path.endswith("/close"):
+            self.reply(200, {"files_deleted": 0})
+        else:
+            self.reply(404, {"detail": "Not found"})
+
+    def do_PUT(self) -> None:
+        self.read_body()
+        self.reply(204)
+
+
+def serve_stub_api(port_queue: multiprocessing.Queue) -> None:
+    """Run the stub API on a free local port until terminated."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApiHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+@dataclass
+class ResourceSample:
+    """Process resource counters at one point in time."""
+
+    seconds: float
+    peak_rss_bytes: int
+    read_syscalls: int | None
+    write_syscalls: int | None
+
+    @classmethod
+    def take(cls) -> "ResourceSample":
+        """Sample this process; syscall counts need Linux's /proc/self/io."""
+        io = {}
+        try:
+            with open("/proc/self/io") as f:
+                for line in f:
+                    name, _, value = line.partition(":")
+                    io[name] = int(value)
+        except OSError:
+            pass
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return cls(
+            seconds=time.perf_counter(),
+            peak_rss_bytes=usage.ru_maxrss * scale,
+            read_syscalls=io.get("syscr"),
+            write_syscalls=io.get("syscw"),
+        )
+
+
+@dataclass
+class RunResult:
+    """Measurements of one scan and upload of the share."""
+
+    name: str
+    files_found: int
+    files_hashed: int
+    bytes_hashed: int
+    events_sent: int
+    bytes_sent: int
+    seconds: float
+    peak_rss_bytes: int
+    read_syscalls: int | None
+    write_syscalls: int | None
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_found / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_hashed_per_second(self) -> float:
+        return self.bytes_hashed / self.seconds if self.seconds else 0.0
+
+
+async def fetch_stub_stats(agent: Agent) -> dict:
+    """Read the stub API's counters."""
+    response = await agent.client.http.get("/stats")
+    response.raise_for_status()
+    return response.json()
+
+
+async def run_scan(name: str, settings: AgentSettings) -> RunResult:
+    """Scan and upload the benchmark share once, as a fresh agent process would."""
+    agent = Agent(settings)
+    drain_task = asyncio.create_task(agent.client.drain_outbox())
+    try:
+        before_stats = await fetch_stub_stats(agent)
+        before = ResourceSample.take()
+        stats = await agent.scan_and_send_share(settings.shares[0])
+        await agent.client.wait_outbox_sent()
+        after = ResourceSample.take()
+        after_stats = await fetch_stub_stats(agent)
+    finally:
+        drain_task.cancel()
+        await asyncio.gather(drain_task, return_exceptions=True)
+        await agent.client.aclose()
+        agent.close()
+
+    def delta(start: int | None, end: int | None) -> int | None:
+        return end - start if start is not None and end is not None else None
+
+    return RunResult(
+        name=name,
+        files_found=stats.files_found,
+        files_hashed=stats.files_hashed,
+        bytes_hashed=stats.bytes_hashed,
+        events_sent=after_stats["events"] - before_stats["events"],
+        bytes_sent=after_stats["bytes"] - before_stats["bytes"],
+        seconds=after.seconds - before.seconds,
+        peak_rss_bytes=after.peak_rss_bytes,
+        read_syscalls=delta(before.read_syscalls, after.read_syscalls),
+        write_syscalls=delta(before.write_syscalls, after.write_syscalls),
+    )
+
+
+def format_report(results: list[RunResult]) -> str:
+    """Render results as a fixed-width table."""
+    header = (
+        f"{'run':<10} {'files':>9} {'hashed':>9} {'MB hashed':>10} {'events':>9} "
+        f"{'KB sent':>9} {'seconds':>8} {'files/s':>9} {'MB/s':>8} {'peak RSS MB':>11} "
+        f"{'read sys':>9} {'write sys':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.name:<10} {r.files_found:>9} {r.files_hashed:>9} "
+            f"{r.bytes_hashed / 1e6:>10.1f} {r.events_sent:>9} {r.bytes_sent / 1e3:>9.1f} "
+            f"{r.seconds:>8.2f} {r.files_per_second:>9.0f} "
+            f"{r.bytes_hashed_per_second / 1e6:>8.1f} {r.peak_rss_bytes / 1e6:>11.1f} "
+            f"{'-' if r.read_syscalls is None else r.read_syscalls:>9} "
+            f"{'-' if r.write_syscalls is None else r.write_syscalls:>9}"
+        )
+    return "\n".join(lines)
+
+
+async def run_benchmark(
+    args: argparse.Namespace, work_dir: str, api_base_url: str
+) -> list[RunResult]:
+    """Generate the share and time each run against it."""
+    spec = ShareSpec(
+        files=args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        median_size_bytes=args.median_size,
+        size_sigma=args.size_sigma,
+        max_size_bytes=args.max_size,
+        type_mix=parse_type_mix(args.types),
+        seed=args.seed,
+    )
+    share_root = os.path.join(work_dir, "share")
+    print(f"Generating {spec.files} files under {share_root}", file=sys.stderr)
+    paths = generate_share(share_root, spec)
+
+    settings = AgentSettings(
+        agent_id="benchmark",
+        tenant_api_key="benchmark",
+        api_base_url=api_base_url,
+        batch_size=args.batch_size,
+        hash_workers=args.hash_workers,
+        state_db_path=os.path.join(work_dir, "state.db"),
+        outbox_db_path=os.path.join(work_dir, "outbox.db"),
+        shares=[
+            ShareConfig(
+                name="benchmark",
+                smb_uri="//benchmark/share",
+                mount_point=share_root,
+                hash_concurrency=args.hash_concurrency,
+                hash_algorithm=args.hash_algorithm,
+                extract_text=args.extract_text,
+            )
+        ],
+    )
+
+    results = [await run_scan("cold", settings), await run_scan("unchanged", settings)]
+    if args.churn > 0:
+        apply_churn(share_root, paths, args.churn, spec)
+        results.append(await run_scan("churn", settings))
+    return results
+
+
+def main() -> None:
+    """Benchmark entrypoint."""
+    parser = argparse.ArgumentParser(description="Benchmark the agent's scan and upload path")
+    parser.add_argument("--files", type=int, default=10000, help="Files in the share")
+    parser.add_argument("--depth", type=int, default=3, help="Folder levels")
+    parser.add_argument("--fanout", type=int, default=8, help="Subfolders per folder")
+    parser.add_argument("--median-size", type=int, default=32 * 1024, help="Median file size")
+    parser.add_argument("--size-sigma", type=float, default=1.5, help="Log-normal size spread")
+    parser.add_argument("--max-size", type=int, default=64 * 1024 * 1024, help="Largest file")
+    parser.add_argument("--types", default=DEFAULT_TYPE_MIX, help="Extension weights")
+    parser.add_argument(
+        "--churn", type=float, default=0.05, help="Fraction of files changed before the last run"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--batch-size", type=int, default=100, help="Events per batch")
+    parser.add_argument("--hash-workers", type=int, default=32, help="Hash thread pool size")
+    parser.add_argument("--hash-concurrency", type=int, default=16, help="Outstanding reads")
+    parser.add_argument("--hash-algorithm", default="sha256", choices=["sha256", "blake2b"])
+    parser.add_argument("--extract-text", action="store_true", help="Extract text on the agent")
+    parser.add_argument("--work-dir", help="Directory for the share (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated share")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument(
+        "--min-files-per-second",
+        type=float,
+        default=0.0,
+        help="Exit with an error if any run is slower than this",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show agent logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="topos-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    stub = context.Process(target=serve_stub_api, args=(port_queue,), daemon=True)
+    stub.start()
+    try:
+        api_base_url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+        results = asyncio.run(run_benchmark(args, work_dir, api_base_url))
+    finally:
+        stub.terminate()
+        stub.join()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps([r.__dict__ for r in results], indent=2))
+    else:
+        print(format_report(results))
+
+    slow = [r.name for r in results if r.files_per_second < args.min_files_per_second]
+    if slow:
+        print(f"Below {args.min_files_per_second:.0f} files/s: {', '.join(slow)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
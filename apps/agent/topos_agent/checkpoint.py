@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from topos_agent.state import ScanProgress, ScanStateStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Directory:
+    include_path: str
+    directory: str | None  # None marks the end of an include path
+    outstanding: int = 0  # Files handed to the uploader but not yet queued
+    listed: bool = False  # The walk has moved past this directory
+
+
+class ScanCheckpoint:
+    """
+    Track which directories of a full scan have been uploaded, and persist it.
+
+    The walk visits include paths in configuration order and directories in
+    sorted depth-first order, so progress is recorded as the last directory
+    in that order which, together with every directory before it, has had
+    all of its files durably queued for upload. Files are registered by the
+    walking thread and acknowledged once each batch is in the outbox.
+
+    After a restart, the scan keeps its scan id and the walk skips every
+    directory up to the checkpoint; files queued beyond it are recorded
+    in the state store and not sent again unless they changed.
+    """
+
+    def __init__(self, state: ScanStateStore, share_name: str, include_paths: list[str]):
+        self.state = state
+        self.share_name = share_name
+        self.include_paths = include_paths
+        self.progress = ScanProgress()
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._order: deque[_Directory] = deque()
+        self._open: dict[str, _Directory] = {}
+
+    def resume(self, progress: ScanProgress | None) -> None:
+        """Adopt the progress of an interrupted scan returned by begin_scan."""
+        if progress is None:
+            return
+        self.resumed = True
+        if progress.include_path is not None and progress.include_path not in self.include_paths:
+            logger.warning(f"Include paths of share {self.share_name} changed; rescanning them all")
+            progress = ScanProgress(errors=progress.errors)
+        self.progress = progress
+        logger.info(
+            f"Resuming scan of share {self.share_name} after "
+            f"{progress.include_path or '(start)'}:{progress.directory or ''}"
+        )
+
+    def include_completed(self, include_path: str) -> bool:
+        """Whether an include path was fully uploaded before the scan was interrupted."""
+        if self.progress.include_path is None:
+            return False
+        done = self.include_paths.index(self.progress.include_path)
+        index = self.include_paths.index(include_path)
+        return index < done or (index == done and self.progress.include_complete)
+
+    def resume_after(self, include_path: str) -> str | None:
+        """Return the relative directory an include path's walk resumes after, if any."""
+        if include_path != self.progress.include_path or self.progress.include_complete:
+            return None
+        return self.progress.directory
+
+    def add(self, include_path: str, relative_dir: str) -> None:
+        """Register a file about to be handed to the uploader."""
+        with self._lock:
+            entry = self._open.get(relative_dir)
+            if entry is None:
+                if self._order and not self._order[-1].listed:
+                    self._order[-1].listed = True
+                entry = _Directory(include_path, relative_dir)
+                self._order.append(entry)
+                self._open[relative_dir] = entry
+            entry.outstanding += 1
+
+    def include_listed(self, include_path: str) -> None:
+        """Mark the end of an include path's walk."""
+        with self._lock:
+            if self._order:
+                self._order[-1].listed = True
+            self._order.append(_Directory(include_path, None, listed=True))
+        self.acknowledge([])
+
+    def acknowledge(self, relative_paths: list[str], errors: int | None = None) -> None:
+        """Record that these files are queued for upload, advancing the checkpoint if possible."""
+        if relative_paths:
+            self.state.mark_uploaded(self.share_name, relative_paths)
+
+        with self._lock:
+            for relative_path in relative_paths:
+                entry = self._open.get(os.path.dirname(relative_path) or ".")
+                if entry is not None:
+                    entry.outstanding -= 1
+
+            advanced = False
+            while self._order and self._order[0].listed and self._order[0].outstanding <= 0:
+                entry = self._order.popleft()
+                if entry.directory is None:
+                    self.progress.include_path = entry.include_path
+                    self.progress.directory = None
+                    self.progress.include_complete = True
+                else:
+                    self._open.pop(entry.directory, None)
+                    self.progress.include_path = entry.include_path
+                    self.progress.directory = entry.directory
+                    self.progress.include_complete = False
+                advanced = True
+            if errors is not None:
+                self.progress.errors = errors
+
+        if advanced or relative_paths:
+            self.state.save_progress(self.share_name, self.progress)
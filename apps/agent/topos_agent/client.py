@@ -1,38 +1,158 @@
+import asyncio
+import gzip
+import json
 import logging
+import random
+import time
+from collections.abc import AsyncIterable, Callable
+from urllib.parse import quote
 
 import httpx
 
 from topos_agent.config import AgentSettings
+from topos_agent.metrics import OUTBOX_PENDING, UPLOAD_BATCH_EVENTS, UPLOAD_RETRIES, UPLOAD_SECONDS
+from topos_agent.outbox import Outbox
 from topos_agent.scanner import FileInfo
 
 logger = logging.getLogger(__name__)
 
+# Compact wire format understood by /v0/ingest/events, see encode_compact_events
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_TAGS = {
+    "type": "t",
+    "share_name": "s",
+    "relative_path": "p",
+    "size_bytes": "z",
+    "mtime": "m",
+    "file_type": "f",
+    "content_hash": "c",
+    "acl_hash": "a",
+    "acl_entries": "e",
+}
+ACL_ENTRY_FIELDS = (
+    "principal_external_id",
+    "principal_display_name",
+    "principal_type",
+    "rights",
+    "source",
+)
+
+
+# Retry delays for outbox batches grow exponentially between these bounds, with jitter
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 300.0
+# Beyond this the delay is capped anyway; larger exponents would overflow a float
+RETRY_MAX_EXPONENT = 16
+
+# How often a producer re-checks a full outbox
+OUTBOX_FULL_POLL_SECONDS = 1.0
+
+# Attempts at closing a scan session while staged batches of the API's async ingest apply
+CLOSE_SCAN_ATTEMPTS = 10
+
+
+def is_retryable(status_code: int) -> bool:
+    """Whether a failed request may succeed later: server errors, throttling, timeouts."""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter; half the delay is fixed so retries never bunch at 0."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** min(attempt, RETRY_MAX_EXPONENT))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def encode_compact_events(agent_id: str, events: list[dict]) -> bytes:
+    """
+    Encode events as gzip-compressed NDJSON with short field tags.
+
+    The first line carries the agent id, the share of the first event and
+    each distinct ACL of the batch keyed by its hash. Events on the default
+    share omit it, and events with an ACL hash reference their set instead
+    of repeating its entries. ACL entries become positional arrays.
+    """
+    default_share = events[0].get("share_name") if events else None
+    acl_sets: dict[str, list[list]] = {}
+    compact_events = []
+
+    for event in events:
+        compact = {}
+        for key, value in event.items():
+            if key == "share_name" and value == default_share:
+                continue
+            if key == "acl_entries":
+                value = [[entry[field] for field in ACL_ENTRY_FIELDS] for entry in value]
+                acl_hash = event.get("acl_hash")
+                if acl_hash:
+                    acl_sets.setdefault(acl_hash, value)
+                    continue
+            compact[EVENT_TAGS[key]] = value
+        compact_events.append(compact)
+
+    header = {"agent_id": agent_id, "s": default_share}
+    if acl_sets:
+        header["A"] = acl_sets
+    lines = [json.dumps(header, separators=(",", ":"))]
+    lines.extend(json.dumps(compact, separators=(",", ":")) for compact in compact_events)
+
+    return gzip.compress("\n".join(lines).encode(), compresslevel=6)
+
 
 class ToposClient:
-    """HTTP client for the Topos API."""
+    """
+    HTTP client for the Topos API.
+
+    All requests share one pooled httpx.AsyncClient for the life of the agent,
+    so connections are reused across batches and multiplexed over HTTP/2 when
+    the server negotiates it. Call aclose when done.
+
+    With settings.compact_events, events are sent as gzip-compressed NDJSON
+    with each distinct ACL sent once per batch; if the API rejects that
+    before ever accepting it, the client falls back to plain JSON for the
+    rest of the process.
 
-    def __init__(self, settings: AgentSettings):
+    Events go through a durable outbox: queue_* methods append batches to it
+    and drain_outbox sends them in order, retrying with backoff until the
+    API accepts each one.
+    """
+
+    def __init__(self, settings: AgentSettings, outbox: Outbox | None = None):
         self.settings = settings
+        self.outbox = outbox
         self.base_url = settings.api_base_url.rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {settings.tenant_api_key}",
             "Content-Type": "application/json",
         }
+        self._http: httpx.AsyncClient | None = None
+        self._compact = settings.compact_events
+        self._compact_confirmed = False
+        self._outbox_wakeup = asyncio.Event()
+        self._outbox_sent = asyncio.Condition()  # Notified after each batch is sent
 
-    async def send_events(self, files: list[FileInfo], event_type: str = "FILE_DISCOVERED") -> dict:
-        """
-        Send file events to the Topos API.
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The shared connection pool, created on first use."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                http2=True,
+                timeout=60.0,
+            )
+        return self._http
 
-        Args:
-            files: List of FileInfo objects to send
-            event_type: Type of event (FILE_DISCOVERED, FILE_MODIFIED, FILE_DELETED)
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
-        Returns:
-            Response from the API
-        """
-        events = []
-        for file in files:
-            event = {
+    @staticmethod
+    def build_events(files: list[FileInfo], event_type: str = "FILE_DISCOVERED") -> list[dict]:
+        """Serialise FileInfo objects into ingest events."""
+        return [
+            {
                 "type": event_type,
                 "share_name": file.share_name,
                 "relative_path": file.relative_path,
@@ -52,53 +172,320 @@ class ToposClient:
                     for entry in file.acl_entries
                 ],
             }
-            events.append(event)
+            for file in files
+        ]
+
+    @staticmethod
+    def build_deletions(share_name: str, relative_paths: list[str]) -> list[dict]:
+        """Serialise FILE_DELETED events for paths in a share."""
+        return [
+            {
+                "type": "FILE_DELETED",
+                "share_name": share_name,
+                "relative_path": relative_path,
+            }
+            for relative_path in relative_paths
+        ]
+
+    async def reconcile(self, share_name: str, entries: list[dict]) -> dict:
+        """
+        Ask the API which files of a share it lacks or holds different versions of.
+
+        Args:
+            share_name: Share the files belong to
+            entries: Dicts with relative_path, size_bytes and mtime
+
+        Returns:
+            Response from the API: new and changed paths, and unchanged files
+            with the content and ACL hashes the API holds
+        """
+        response = await self.http.post(
+            "/v0/ingest/reconcile",
+            json={
+                "agent_id": self.settings.agent_id,
+                "share_name": share_name,
+                "entries": entries,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
 
+    async def compare_folders(
+        self, share_name: str, folders: list[dict], scan_session_id: str | None = None
+    ) -> dict:
+        """
+        Ask the API which folders of a share hold files different from what it has.
+
+        Args:
+            share_name: Share the folders belong to
+            folders: Dicts with path, hex digest and file_count
+            scan_session_id: Open scan session of the share, if any
+
+        Returns:
+            Response from the API listing the different folders; files beneath
+            the others count as seen by the scan session
+        """
+        response = await self.http.post(
+            "/v0/ingest/folders/compare",
+            json={
+                "agent_id": self.settings.agent_id,
+                "share_name": share_name,
+                "folders": folders,
+                "scan_session_id": scan_session_id,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def open_scan_session(self, share_name: str) -> str | None:
+        """
+        Open an API scan session before a full scan of a share.
+
+        Returns:
+            The session id, or None if the API does not support scan sessions
+        """
+        response = await self.http.post(
+            "/v0/ingest/scans",
+            json={"agent_id": self.settings.agent_id, "share_name": share_name},
+        )
+        if response.status_code in (404, 405):
+            logger.info("API does not support scan sessions; relying on per-file deletions")
+            return None
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    async def close_scan_session(self, session_id: str) -> dict:
+        """
+        Close a scan session once a complete scan's events are all sent.
+
+        The API marks files the scan did not see as deleted. While batches it
+        staged for asynchronous ingest are still applying it answers 409, so
+        closing is retried with backoff a few times before giving up.
+
+        Returns:
+            Response from the API, with the number of files marked deleted
+        """
+        attempt = 0
+        while True:
+            response = await self.http.post(f"/v0/ingest/scans/{session_id}/close")
+            if response.status_code != 409 or attempt + 1 >= CLOSE_SCAN_ATTEMPTS:
+                response.raise_for_status()
+                return response.json()
+            delay = retry_delay(attempt)
+            logger.info(f"Cannot close scan session {session_id} yet; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def missing_content(self, content_hashes: list[str]) -> list[str]:
+        """Return the content hashes the API has no extracted text for."""
+        response = await self.http.post(
+            "/v0/ingest/content/missing",
+            json={"content_hashes": content_hashes},
+        )
+        response.raise_for_status()
+        return response.json()["content_hashes"]
+
+    async def upload_content(self, content_hash: str, extracted_text: bytes) -> None:
+        """Upload gzip-compressed extracted text for a content hash."""
+        response = await self.http.put(
+            f"/v0/ingest/content/{quote(content_hash, safe=':')}",
+            content=extracted_text,
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        response.raise_for_status()
+
+    async def _post_events(self, events: list[dict]) -> dict:
+        """Post already-serialised events, recording upload metrics under their share."""
+        share = events[0].get("share_name", "") if events else ""
+        start = time.perf_counter()
+        try:
+            result = await self._post_events_once(events)
+        finally:
+            UPLOAD_SECONDS.observe(time.perf_counter() - start, share=share)
+        UPLOAD_BATCH_EVENTS.observe(len(events), share=share)
+        return result
+
+    async def _post_events_once(self, events: list[dict]) -> dict:
+        """Post a list of already-serialised events to the ingest endpoint."""
         payload = {
             "agent_id": self.settings.agent_id,
             "events": events,
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/v0/ingest/events",
-                headers=self.headers,
-                json=payload,
+        # Ask the API to stage the batch and answer 202; older APIs ignore this and apply it
+        headers = {"Prefer": "respond-async"} if self.settings.async_ingest else {}
+
+        if self._compact:
+            response = await self.http.post(
+                "/v0/ingest/events",
+                content=encode_compact_events(self.settings.agent_id, events),
+                headers={
+                    **headers,
+                    "Content-Type": NDJSON_MEDIA_TYPE,
+                    "Content-Encoding": "gzip",
+                },
             )
-            response.raise_for_status()
-            return response.json()
+            # Older APIs answer 415, or 422 when they try to read the body as JSON
+            if response.status_code in (415, 422) and not self._compact_confirmed:
+                logger.warning(
+                    f"API rejected compact events ({response.status_code}); falling back to JSON"
+                )
+                self._compact = False
+            else:
+                response.raise_for_status()
+                self._compact_confirmed = True
+                return response.json()
+
+        response = await self.http.post("/v0/ingest/events", json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def queue_events(self, events: list[dict]) -> None:
+        """
+        Durably add a batch of serialised events to the outbox.
+
+        Waits while the outbox holds settings.outbox_max_batches batches, so a
+        long outage pauses scanning instead of filling the disk.
+        """
+        assert self.outbox is not None, "queueing requires an outbox"
+        while self.outbox.pending() >= self.settings.outbox_max_batches:
+            await asyncio.sleep(OUTBOX_FULL_POLL_SECONDS)
+        self.outbox.append(events)
+        self._outbox_wakeup.set()
 
-    async def send_events_batched(
+    async def queue_events_batched(
         self,
-        files: list[FileInfo],
+        files: AsyncIterable[FileInfo],
         event_type: str = "FILE_DISCOVERED",
-    ) -> tuple[int, int]:
+        on_queued: Callable[[list[FileInfo]], None] | None = None,
+    ) -> int:
         """
-        Send file events in batches.
+        Queue file events in batches as they arrive from the scanner.
+
+        Args:
+            files: FileInfo objects to send
+            event_type: Type of event sent for every file
+            on_queued: Optional callback invoked with each batch once it is durable
 
         Returns:
-            Tuple of (total_processed, total_jobs_created)
+            Number of events queued
         """
-        total_processed = 0
-        total_jobs = 0
+        total_queued = 0
+        batch: list[FileInfo] = []
+
+        async def flush() -> None:
+            nonlocal total_queued
+            await self.queue_events(self.build_events(batch, event_type))
+            total_queued += len(batch)
+            if on_queued is not None:
+                on_queued(batch)
+
+        async for file in files:
+            batch.append(file)
+            if len(batch) >= self.settings.batch_size:
+                await flush()
+                batch = []
+
+        if batch:
+            await flush()
+
+        return total_queued
+
+    async def queue_deletions(self, share_name: str, relative_paths: list[str]) -> int:
+        """Queue FILE_DELETED events for files that no longer exist, in batches."""
         batch_size = self.settings.batch_size
+        for i in range(0, len(relative_paths), batch_size):
+            await self.queue_events(
+                self.build_deletions(share_name, relative_paths[i : i + batch_size])
+            )
+        return len(relative_paths)
+
+    async def wait_outbox_sent(self, timeout: float | None = None) -> bool:
+        """
+        Wait until drain_outbox has sent, or set aside, every batch queued so far.
+
+        Batches queued meanwhile, e.g. by watchers, are not waited for.
+
+        Args:
+            timeout: Seconds to wait at most; None waits for as long as it takes
 
-        for i in range(0, len(files), batch_size):
-            batch = files[i : i + batch_size]
+        Returns:
+            Whether those batches were all sent in time
+        """
+        assert self.outbox is not None, "waiting requires an outbox"
+        last_id = self.outbox.last_id()
+
+        def sent() -> bool:
+            oldest = self.outbox.oldest_pending_id()
+            return oldest is None or oldest > last_id
+
+        try:
+            async with self._outbox_sent:
+                await asyncio.wait_for(self._outbox_sent.wait_for(sent), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def drain_outbox(self) -> None:
+        """
+        Send queued batches in order until cancelled.
+
+        A batch is sent only once the API accepted the one before it, so
+        events apply in the order they were queued: a path's discovery can
+        never land after its deletion, nor an old retried batch after a
+        newer one. Each batch is retried with exponential backoff until the
+        API accepts it; batches it rejects as invalid are set aside as dead
+        letters.
+        """
+        assert self.outbox is not None, "draining requires an outbox"
+        while True:
+            self._outbox_wakeup.clear()
+            OUTBOX_PENDING.set(self.outbox.pending())
+            batches = self.outbox.peek(1)
+            if not batches:
+                await self._outbox_wakeup.wait()
+                continue
+            batch_id, events = batches[0]
+            await self._deliver(batch_id, events)
+            async with self._outbox_sent:
+                self._outbox_sent.notify_all()
+
+    async def _deliver(self, batch_id: int, events: list[dict]) -> None:
+        """Post one outbox batch, retrying with backoff until it is accepted or rejected."""
+        assert self.outbox is not None
+        attempt = 0
+        while True:
             try:
-                result = await self.send_events(batch, event_type)
-                total_processed += result.get("processed", 0)
-                total_jobs += result.get("jobs_created", 0)
-                logger.info(
-                    f"Sent batch {i // batch_size + 1}: "
-                    f"processed={result.get('processed', 0)}, "
-                    f"jobs={result.get('jobs_created', 0)}"
-                )
+                result = await self._post_events(events)
             except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to send batch: {e.response.status_code} - {e.response.text}")
-                raise
+                if not is_retryable(e.response.status_code):
+                    logger.error(
+                        f"API rejected batch {batch_id}: {e.response.status_code} - "
+                        f"{e.response.text}; keeping it in the outbox as a dead letter"
+                    )
+                    self.outbox.record_failure(batch_id, dead=True)
+                    return
+                error = f"HTTP {e.response.status_code}"
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
             except Exception as e:
-                logger.exception(f"Error sending batch: {e}")
-                raise
+                logger.exception(f"Error sending batch {batch_id}: {e}")
+                error = str(e)
+            else:
+                self.outbox.ack(batch_id)
+                if "batch_id" in result:
+                    logger.info(f"Sent batch {batch_id}: staged as {result['batch_id']}")
+                else:
+                    logger.info(
+                        f"Sent batch {batch_id}: "
+                        f"processed={result.get('processed', 0)}, "
+                        f"jobs={result.get('jobs_created', 0)}"
+                    )
+                return
 
-        return total_processed, total_jobs
+            self.outbox.record_failure(batch_id)
+            UPLOAD_RETRIES.inc(share=events[0].get("share_name", "") if events else "")
+            delay = retry_delay(attempt)
+            attempt += 1
+            logger.warning(f"Could not send batch {batch_id} ({error}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
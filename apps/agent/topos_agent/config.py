@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 import yaml
 from pydantic import BaseModel
@@ -14,6 +15,19 @@ class ShareConfig(BaseModel):
     include_paths: list[str] = ["/"]
     exclude_patterns: list[str] = ["*.tmp", "~*", ".DS_Store", "Thumbs.db"]
     max_file_size_bytes: int = 104857600  # 100MB
+    # I/O budget for this share; 0 means unlimited
+    hash_concurrency: int = 16  # Max outstanding file reads (hashing) at once
+    max_read_bytes_per_second: int = 0
+    max_files_per_second: int = 0
+    watch: bool = False  # Send changes as they happen via inotify (Linux only)
+    acl_source: str = "auto"  # auto, posix, cifs or mode (permission bits only)
+    hash_algorithm: Literal["sha256", "blake2b"] = "sha256"
+    # Files at least this large are sample-fingerprinted before a full hash and keep their
+    # recorded hash if the sample is unchanged, so same-size edits between the sampled
+    # blocks go unnoticed; 0 (the default) always fully hashes changed files
+    sample_hash_min_bytes: int = 0
+    # Extract text from new or changed files and upload it, so the API need not read the share
+    extract_text: bool = False
 
 
 class AgentSettings(BaseSettings):
@@ -25,6 +39,55 @@ class AgentSettings(BaseSettings):
     scan_interval_seconds: int = 600
     batch_size: int = 100
 
+    # Send events as gzip-compressed NDJSON, falling back to JSON if unsupported
+    compact_events: bool = True
+
+    # Have the API stage event batches and apply them in the background (202 Accepted)
+    async_ingest: bool = False
+
+    # Open an API scan session for each full scan of a whole share; closing it after a
+    # complete scan has the API mark files the scan did not see as deleted
+    scan_sessions: bool = True
+
+    # Ask the API which files it already has before hashing a share with no local state
+    reconcile_fresh_state: bool = True
+
+    # Compare per-folder digests with the API and skip unchanged folders during full scans
+    compare_folder_digests: bool = True
+
+    # Maximum number of extracted texts being uploaded at once; event batches are sent
+    # one at a time so the API applies them in order
+    max_inflight_batches: int = 4
+
+    # Batches the on-disk outbox may hold before scanning pauses for uploads
+    outbox_max_batches: int = 100000
+
+    # How long closing a scan session, or exiting a single run, waits for queued batches
+    # to be sent; batches not sent by then stay in the outbox
+    outbox_wait_seconds: float = 600.0
+
+    # Maximum number of shares scanned at the same time
+    max_concurrent_shares: int = 10
+
+    # Maximum number of scanned files buffered ahead of the uploader
+    scan_queue_size: int = 1000
+
+    # Size of the thread pool shared by all shares for content hashing
+    hash_workers: int = 32
+
+    # Quiet period used to coalesce bursts of watcher events before sending
+    watch_debounce_seconds: float = 2.0
+
+    # Local database for scan state between runs
+    state_db_path: str = "topos-agent-state.db"
+
+    # Local database holding event batches not yet accepted by the API
+    outbox_db_path: str = "topos-agent-outbox.db"
+
+    # Serve Prometheus metrics on this port while running continuously; 0 disables
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+
     # Shares are loaded from config file
     shares: list[ShareConfig] = []
 
@@ -52,5 +115,37 @@ class AgentSettings(BaseSettings):
                 "scan_interval_seconds", cls.model_fields["scan_interval_seconds"].default
             ),
             batch_size=data.get("batch_size", cls.model_fields["batch_size"].default),
+            compact_events=data.get("compact_events", cls.model_fields["compact_events"].default),
+            async_ingest=data.get("async_ingest", cls.model_fields["async_ingest"].default),
+            scan_sessions=data.get("scan_sessions", cls.model_fields["scan_sessions"].default),
+            reconcile_fresh_state=data.get(
+                "reconcile_fresh_state", cls.model_fields["reconcile_fresh_state"].default
+            ),
+            compare_folder_digests=data.get(
+                "compare_folder_digests", cls.model_fields["compare_folder_digests"].default
+            ),
+            max_inflight_batches=data.get(
+                "max_inflight_batches", cls.model_fields["max_inflight_batches"].default
+            ),
+            outbox_max_batches=data.get(
+                "outbox_max_batches", cls.model_fields["outbox_max_batches"].default
+            ),
+            outbox_wait_seconds=data.get(
+                "outbox_wait_seconds", cls.model_fields["outbox_wait_seconds"].default
+            ),
+            max_concurrent_shares=data.get(
+                "max_concurrent_shares", cls.model_fields["max_concurrent_shares"].default
+            ),
+            scan_queue_size=data.get(
+                "scan_queue_size", cls.model_fields["scan_queue_size"].default
+            ),
+            hash_workers=data.get("hash_workers", cls.model_fields["hash_workers"].default),
+            watch_debounce_seconds=data.get(
+                "watch_debounce_seconds", cls.model_fields["watch_debounce_seconds"].default
+            ),
+            state_db_path=data.get("state_db_path", cls.model_fields["state_db_path"].default),
+            outbox_db_path=data.get("outbox_db_path", cls.model_fields["outbox_db_path"].default),
+            metrics_port=data.get("metrics_port", cls.model_fields["metrics_port"].default),
+            metrics_host=data.get("metrics_host", cls.model_fields["metrics_host"].default),
             shares=shares,
         )
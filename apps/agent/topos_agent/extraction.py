@@ -0,0 +1,98 @@
+import gzip
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Text longer than this is not uploaded; the API extracts such files itself
+MAX_EXTRACTED_TEXT_CHARS = 50 * 1024 * 1024
+
+
+@dataclass
+class ExtractedText:
+    """Title and text extracted from a file."""
+
+    title: str
+    text: str
+
+    def encode(self) -> bytes:
+        """Serialise for upload as gzip-compressed JSON."""
+        data = json.dumps({"title": self.title, "text": self.text}, separators=(",", ":"))
+        return gzip.compress(data.encode(), compresslevel=6)
+
+
+def extract_text_plain(path: str) -> ExtractedText:
+    """Extract content from a plain text file."""
+    for encoding in ("utf-8", "latin-1", "cp1252"):
+        try:
+            with open(path, encoding=encoding) as f:
+                return ExtractedText(title=Path(path).stem, text=f.read())
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Could not decode file with any supported encoding: {path}")
+
+
+def extract_pdf(path: str) -> ExtractedText:
+    """Extract content from a PDF file using pdfminer.six."""
+    from pdfminer.high_level import extract_text  # noqa: PLC0415
+
+    return ExtractedText(title=Path(path).stem, text=extract_text(path))
+
+
+def extract_docx(path: str) -> ExtractedText:
+    """Extract content from a DOCX file using python-docx."""
+    from docx import Document  # noqa: PLC0415
+
+    doc = Document(path)
+    text = "\n".join(p.text for p in doc.paragraphs)
+    return ExtractedText(title=doc.core_properties.title or Path(path).stem, text=text)
+
+
+def extract_pptx(path: str) -> ExtractedText:
+    """Extract content from a PPTX file using python-pptx."""
+    from pptx import Presentation  # noqa: PLC0415
+
+    slides_text = []
+    for slide_num, slide in enumerate(Presentation(path).slides, 1):
+        slide_content = [shape.text for shape in slide.shapes if getattr(shape, "text", "")]
+        if slide_content:
+            slides_text.append(f"[Slide {slide_num}]\n" + "\n".join(slide_content))
+    return ExtractedText(title=Path(path).stem, text="\n\n".join(slides_text))
+
+
+# MIME types the API's ExtractionWorker handles, extracted the same way here
+EXTRACTORS = {
+    "text/plain": extract_text_plain,
+    "text/markdown": extract_text_plain,
+    "application/pdf": extract_pdf,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": extract_docx,
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": extract_pptx,
+}
+
+
+def extract_content(path: str, file_type: str) -> ExtractedText | None:
+    """
+    Extract text from a file for upload, if the agent can.
+
+    The PDF and Office extractors need the agent's optional "extraction"
+    dependencies. Unsupported types, missing dependencies and extraction
+    errors all return None, leaving extraction to the API.
+    """
+    extractor = EXTRACTORS.get(file_type)
+    if extractor is None:
+        return None
+
+    try:
+        extracted = extractor(path)
+    except ImportError as e:
+        logger.debug(f"Cannot extract {file_type} locally ({e}); leaving it to the API")
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to extract content from {path}: {e}")
+        return None
+
+    if len(extracted.text) > MAX_EXTRACTED_TEXT_CHARS:
+        return None
+    return extracted
@@ -1,13 +1,32 @@
 import argparse
 import asyncio
+import json
 import logging
 import signal
 import sys
+import time
+from collections.abc import AsyncIterable, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
 from pathlib import Path
 
+import httpx
+
+from topos_agent.checkpoint import ScanCheckpoint
 from topos_agent.client import ToposClient
-from topos_agent.config import AgentSettings
-from topos_agent.scanner import scan_share
+from topos_agent.config import AgentSettings, ShareConfig
+from topos_agent.metrics import (
+    LAST_SCAN_SECONDS,
+    SCAN_ERRORS,
+    SCAN_FILES,
+    serve_metrics,
+    share_report,
+)
+from topos_agent.outbox import Outbox
+from topos_agent.reconcile import find_unchanged_folders, reconcile_share
+from topos_agent.scanner import FileInfo, ScanStats, describe_paths, scan_share
+from topos_agent.state import ScanStateStore
+from topos_agent.watcher import ChangeSet, ShareWatcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,35 +40,246 @@ class Agent:
 
     def __init__(self, settings: AgentSettings):
         self.settings = settings
-        self.client = ToposClient(settings)
+        self.state = ScanStateStore(settings.state_db_path)
+        self.outbox = Outbox(settings.outbox_db_path)
+        self.client = ToposClient(settings, self.outbox)
+        self.hash_pool = ThreadPoolExecutor(
+            max_workers=settings.hash_workers, thread_name_prefix="topos-hash"
+        )
         self.running = False
+        self.rescan_requested = asyncio.Event()
+        self.scan_task: asyncio.Task | None = None
 
     async def scan_and_send(self) -> None:
-        """Perform a full scan of all configured shares and send events."""
+        """Perform a full scan of all configured shares concurrently and send events."""
         logger.info("Starting scan cycle")
 
-        for share_config in self.settings.shares:
-            try:
-                # Scan the share
-                files = scan_share(share_config)
-
-                if not files:
-                    logger.info(f"No files found in share {share_config.name}")
-                    continue
-
-                # Send events to API
-                processed, jobs = await self.client.send_events_batched(files)
-                logger.info(
-                    f"Share {share_config.name}: "
-                    f"sent {len(files)} files, "
-                    f"processed={processed}, "
-                    f"jobs_created={jobs}"
-                )
-            except Exception as e:
-                logger.exception(f"Error scanning share {share_config.name}: {e}")
+        # A slow filer only holds up its own share, within each share's I/O budget
+        limit = asyncio.Semaphore(max(self.settings.max_concurrent_shares, 1))
+
+        async def scan_limited(share_config: ShareConfig) -> None:
+            async with limit:
+                await self.scan_and_send_share(share_config)
+
+        await asyncio.gather(*(scan_limited(share) for share in self.settings.shares))
 
         logger.info("Scan cycle complete")
 
+    async def scan_and_send_share(self, share_config: ShareConfig) -> ScanStats:
+        """
+        Perform a full scan of one share and send its events.
+
+        Returns:
+            Counters of the scan; errors are logged rather than raised
+        """
+        stats = ScanStats()
+        before = share_report(share_config.name)
+        start = time.perf_counter()
+        try:
+            # Everything the API records as seen from here on counts as present
+            scan_session = await self.open_scan_session(share_config)
+            dead_letters = self.outbox.dead_letters()
+
+            # Without local state, learn from the API which files need hashing
+            has_state = self.state.has_files(share_config.name)
+            if self.settings.reconcile_fresh_state and not has_state:
+                await reconcile_share(
+                    share_config, self.state, self.client, self.settings.batch_size
+                )
+
+            # With it, skip folders whose files the API already has unchanged
+            skip_folders: set[str] = set()
+            if self.settings.compare_folder_digests and has_state:
+                skip_folders = await find_unchanged_folders(
+                    share_config, self.state, self.client, scan_session
+                )
+
+            # Stream scanned files straight into the upload outbox, checkpointing
+            # each durably queued batch so an interrupted scan can resume
+            checkpoint = ScanCheckpoint(self.state, share_config.name, share_config.include_paths)
+
+            def on_queued(batch: list[FileInfo]) -> None:
+                checkpoint.acknowledge([f.relative_path for f in batch], stats.errors)
+
+            async with aclosing(
+                scan_share(
+                    share_config,
+                    self.state,
+                    self.settings.scan_queue_size,
+                    self.hash_pool,
+                    stats,
+                    checkpoint=checkpoint,
+                    skip_folders=skip_folders,
+                )
+            ) as files:
+                if share_config.extract_text:
+                    files = self.with_extracted_text(files)
+                queued = await self.client.queue_events_batched(files, on_queued=on_queued)
+
+            deleted = await self.send_scan_deletions(share_config, stats)
+            tombstoned = 0
+            if scan_session is not None and stats.complete:
+                tombstoned = await self.close_scan_session(scan_session, dead_letters)
+            if stats.finished:
+                self.state.finish_scan(share_config.name)
+
+            logger.info(
+                f"Share {share_config.name}: queued={queued}, deleted={deleted}, "
+                f"unseen_deleted_by_api={tombstoned}, outbox={self.outbox.pending()} batches"
+            )
+        except Exception as e:
+            logger.exception(f"Error scanning share {share_config.name}: {e}")
+
+        self.report_scan(share_config.name, stats, before, time.perf_counter() - start)
+        return stats
+
+    def report_scan(
+        self, share_name: str, stats: ScanStats, before: dict[str, float], seconds: float
+    ) -> None:
+        """
+        Record a scan in the agent's metrics and log its per-phase report as JSON.
+
+        Phase times are summed over hashing threads, so they can exceed the
+        scan's wall-clock seconds. Upload figures cover batches sent while the
+        scan ran, which may include earlier scans' batches.
+        """
+        SCAN_FILES.inc(stats.files_found, share=share_name, outcome="found")
+        SCAN_FILES.inc(stats.files_hashed, share=share_name, outcome="hashed")
+        SCAN_FILES.inc(stats.files_skipped, share=share_name, outcome="skipped")
+        SCAN_ERRORS.inc(stats.errors, share=share_name)
+        LAST_SCAN_SECONDS.set(seconds, share=share_name)
+
+        after = share_report(share_name)
+        report: dict[str, str | float] = {"share": share_name, "seconds": round(seconds, 3)}
+        for name, value in after.items():
+            delta = round(value - before[name], 3)
+            report[name] = int(delta) if float(delta).is_integer() else delta
+        logger.info(f"Scan report {json.dumps(report)}")
+
+    async def with_extracted_text(self, files: AsyncIterable[FileInfo]) -> AsyncIterator[FileInfo]:
+        """Pass scanned files through, uploading their extracted text in batches first."""
+        batch: list[FileInfo] = []
+        async for file in files:
+            batch.append(file)
+            if len(batch) >= self.settings.batch_size:
+                await self.upload_extracted_text(batch)
+                for queued in batch:
+                    yield queued
+                batch = []
+
+        if batch:
+            await self.upload_extracted_text(batch)
+            for queued in batch:
+                yield queued
+
+    async def upload_extracted_text(self, files: list[FileInfo]) -> int:
+        """
+        Upload text extracted from files, once per content hash the API lacks.
+
+        Runs before the files' events are sent, so extraction jobs find the
+        text. On failure the API falls back to extracting from the share.
+
+        Returns:
+            Number of texts uploaded
+        """
+        texts = {f.content_hash: f.extracted_text for f in files if f.extracted_text}
+        for file in files:
+            file.extracted_text = None
+        if not texts:
+            return 0
+
+        concurrency = max(self.settings.max_inflight_batches, 1)
+        try:
+            missing = await self.client.missing_content(list(texts))
+            for i in range(0, len(missing), concurrency):
+                await asyncio.gather(
+                    *(
+                        self.client.upload_content(content_hash, texts[content_hash])
+                        for content_hash in missing[i : i + concurrency]
+                    )
+                )
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not upload extracted text ({e}); leaving extraction to the API")
+            return 0
+        return len(missing)
+
+    async def send_scan_deletions(self, share_config: ShareConfig, stats: ScanStats) -> int:
+        """
+        Queue FILE_DELETED for recorded files the latest scan did not see.
+
+        Only a complete scan can prove absence; after listing errors or an
+        unavailable mount, nothing is reported deleted.
+        """
+        if not stats.complete:
+            logger.warning(
+                f"Scan of share {share_config.name} was incomplete "
+                f"({stats.errors} errors); skipping deletion detection"
+            )
+            return 0
+
+        deleted = self.state.unseen_paths(share_config.name)
+        if not deleted:
+            return 0
+
+        await self.client.queue_deletions(share_config.name, deleted)
+        self.state.delete(share_config.name, deleted)
+        return len(deleted)
+
+    async def open_scan_session(self, share_config: ShareConfig) -> str | None:
+        """
+        Return the API scan session of this scan of a share, opening one if needed.
+
+        Only shares scanned from their root get one, since closing it treats
+        every file of the share the scan did not see as deleted. A resumed
+        scan keeps the session it opened before.
+        """
+        if not self.settings.scan_sessions or not any(
+            path.strip("/") == "" for path in share_config.include_paths
+        ):
+            return None
+
+        session_id = self.state.scan_session(share_config.name)
+        if session_id is not None:
+            return session_id
+        try:
+            session_id = await self.client.open_scan_session(share_config.name)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not open a scan session for share {share_config.name}: {e}")
+            return None
+        if session_id is not None:
+            self.state.set_scan_session(share_config.name, session_id)
+        return session_id
+
+    async def close_scan_session(self, session_id: str, dead_letters: int) -> int:
+        """
+        Close a complete scan's API session once all its events are sent.
+
+        If the API rejected any batch meanwhile, some seen files may not be
+        recorded as seen, so the session is left open instead. So it is if
+        the scan's batches are not sent within settings.outbox_wait_seconds;
+        the next complete scan then detects deletions instead.
+
+        Returns:
+            Number of files the API marked deleted
+        """
+        if not await self.client.wait_outbox_sent(self.settings.outbox_wait_seconds):
+            logger.warning(
+                f"Batches of the scan were not sent within {self.settings.outbox_wait_seconds}s; "
+                f"leaving scan session {session_id} open"
+            )
+            return 0
+        if self.outbox.dead_letters() > dead_letters:
+            logger.warning(
+                f"Batches were rejected during the scan; leaving scan session {session_id} open"
+            )
+            return 0
+        try:
+            result = await self.client.close_scan_session(session_id)
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not close scan session {session_id}: {e}")
+            return 0
+        return result.get("files_deleted") or 0
+
     async def run(self) -> None:
         """Run the agent continuously."""
         self.running = True
@@ -58,26 +288,144 @@ class Agent:
             f"(scan interval: {self.settings.scan_interval_seconds}s)"
         )
 
-        while self.running:
-            try:
-                await self.scan_and_send()
-            except Exception as e:
-                logger.exception(f"Error in scan cycle: {e}")
+        watch_tasks = [
+            asyncio.create_task(self.watch_share(share_config))
+            for share_config in self.settings.shares
+            if share_config.watch
+        ]
+        background_tasks = [asyncio.create_task(self.client.drain_outbox())]
+        if self.settings.metrics_port:
+            background_tasks.append(
+                asyncio.create_task(
+                    serve_metrics(self.settings.metrics_host, self.settings.metrics_port)
+                )
+            )
+
+        try:
+            while self.running:
+                self.rescan_requested.clear()
+                self.scan_task = asyncio.create_task(self.scan_and_send())
+                try:
+                    await self.scan_task
+                except asyncio.CancelledError:
+                    if self.running:
+                        raise
+                    logger.info("Scan cycle interrupted; it resumes from its checkpoint")
+                except Exception as e:
+                    logger.exception(f"Error in scan cycle: {e}")
+
+                if self.running:
+                    logger.info(f"Sleeping for {self.settings.scan_interval_seconds} seconds")
+                    try:
+                        await asyncio.wait_for(
+                            self.rescan_requested.wait(),
+                            timeout=self.settings.scan_interval_seconds,
+                        )
+                        logger.info("Rescan requested by watcher")
+                    except TimeoutError:
+                        pass
+        finally:
+            # Batches still in the outbox are sent after the next start
+            for task in [*watch_tasks, *background_tasks]:
+                task.cancel()
+            await asyncio.gather(*watch_tasks, *background_tasks, return_exceptions=True)
+
+    async def watch_share(self, share_config: ShareConfig) -> None:
+        """Send changes in a share as they happen, between periodic scans."""
+        watcher = ShareWatcher(share_config, self.settings.watch_debounce_seconds)
+        try:
+            await watcher.start()
+        except OSError as e:
+            logger.warning(
+                f"Watch mode unavailable for share {share_config.name} ({e}); "
+                f"relying on periodic scans"
+            )
+            watcher.close()
+            return
+
+        try:
+            async with aclosing(watcher.changes()) as changes:
+                async for change_set in changes:
+                    try:
+                        await self.send_changes(share_config, change_set)
+                    except Exception as e:
+                        logger.exception(
+                            f"Error sending changes for share {share_config.name}: {e}"
+                        )
+                        self.rescan_requested.set()
+        finally:
+            watcher.close()
+
+    async def send_changes(self, share_config: ShareConfig, change_set: ChangeSet) -> None:
+        """Describe one batch of watcher changes and queue it in the outbox."""
+        if change_set.overflowed:
+            self.rescan_requested.set()
+
+        loop = asyncio.get_running_loop()
+        files, missing = await loop.run_in_executor(
+            self.hash_pool,
+            describe_paths,
+            share_config,
+            sorted(change_set.changed),
+            self.state,
+        )
+
+        # A vanished directory takes every recorded file beneath it along
+        deleted = set(change_set.deleted) | set(missing)
+        for relative_path in list(deleted):
+            deleted.update(self.state.paths_under(share_config.name, relative_path))
+
+        # Queued behind any scan batches for the same paths, so the API applies
+        # them in order, and kept on disk through API outages and restarts
+        batch_size = self.settings.batch_size
+        for i in range(0, len(files), batch_size):
+            await self.upload_extracted_text(files[i : i + batch_size])
+            await self.client.queue_events(
+                self.client.build_events(files[i : i + batch_size], "FILE_MODIFIED")
+            )
+
+        if deleted:
+            await self.client.queue_deletions(share_config.name, sorted(deleted))
+            self.state.delete(share_config.name, sorted(deleted))
 
-            if self.running:
-                logger.info(f"Sleeping for {self.settings.scan_interval_seconds} seconds")
-                await asyncio.sleep(self.settings.scan_interval_seconds)
+        logger.info(
+            f"Share {share_config.name}: queued {len(files)} modified and "
+            f"{len(deleted)} deleted files from watcher"
+        )
 
     def stop(self) -> None:
         """Stop the agent."""
         self.running = False
         logger.info("Agent stopping")
+        # Abandon the current scan; queued batches are already checkpointed
+        if self.scan_task is not None and not self.scan_task.done():
+            self.scan_task.get_loop().call_soon_threadsafe(self.scan_task.cancel)
+
+    def close(self) -> None:
+        """Release local resources held by the agent."""
+        self.hash_pool.shutdown(cancel_futures=True)
+        self.outbox.close()
+        self.state.close()
 
 
 async def run_once(settings: AgentSettings) -> None:
     """Run a single scan cycle."""
     agent = Agent(settings)
-    await agent.scan_and_send()
+    drain_task = asyncio.create_task(agent.client.drain_outbox())
+    try:
+        await agent.scan_and_send()
+        # Exit once everything queued, including earlier leftovers, is sent; whatever
+        # is not sent in time stays in the outbox for the next run
+        if not await agent.client.wait_outbox_sent(settings.outbox_wait_seconds):
+            logger.warning(
+                f"{agent.outbox.pending()} batches not sent within "
+                f"{settings.outbox_wait_seconds}s; they are sent on the next run"
+            )
+    finally:
+        drain_task.cancel()
+        await asyncio.gather(drain_task, return_exceptions=True)
+        await agent.client.aclose()
+        agent.close()
 
 
 async def run_continuous(settings: AgentSettings) -> None:
@@ -92,7 +440,11 @@ async def run_continuous(settings: AgentSettings) -> None:
     signal.signal(signal.SIGINT, handle_shutdown)
     signal.signal(signal.SIGTERM, handle_shutdown)
 
-    await agent.run()
+    try:
+        await agent.run()
+    finally:
+        await agent.client.aclose()
+        agent.close()
 
 
 def main() -> None:
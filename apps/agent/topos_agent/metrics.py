@@ -0,0 +1,276 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upload round trips, from a fast LAN API to one that is struggling
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Events per uploaded batch
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+LabelValues = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Metric(ABC):
+    """
+    A named metric with a fixed set of labels, safe to update from any thread.
+
+    Values are keyed by label values, passed as keyword arguments.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(labels[name] for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> Iterator[tuple[str, LabelValues, str, float]]:
+        """Yield (suffix, label values, extra label, value) for the exposition format."""
+
+    def render(self) -> list[str]:
+        """Render the metric in Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.label_names, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. seconds spent or bytes read."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Add amount to the labelled value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current labelled value."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Add the seconds spent in the block to the labelled value."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            yield "", values, "", value
+
+
+class Gauge(Counter):
+    """A value that is set, e.g. the duration of the latest scan."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Replace the labelled value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation."""
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def totals(self, **labels: str) -> tuple[int, float]:
+        """Number and sum of the labelled observations."""
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            if counts is None:
+                return 0, 0.0
+            return int(sum(counts[:-1])), counts[-1]
+
+    def samples(self) -> Iterator[tuple[str, LabelValues, str, float]]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for values, counts in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts, strict=False):
+                cumulative += count
+                yield "_bucket", values, f'le="{_format_value(bound)}"', cumulative
+            total = cumulative + counts[len(self.buckets)]
+            yield "_bucket", values, 'le="+Inf"', total
+            yield "_sum", values, "", counts[-1]
+            yield "_count", values, "", total
+
+
+REGISTRY: list[Metric] = []
+
+SCAN_PHASE_SECONDS = Counter(
+    "topos_agent_scan_phase_seconds_total",
+    "Time spent in each scan phase: walk, stat, acl, hash, extract, and throttle waits "
+    "on the share's I/O budget (read waits are also counted in hash)",
+    ["share", "phase"],
+)
+SCAN_FILES = Counter(
+    "topos_agent_scan_files_total",
+    "Files found, hashed and skipped by scans",
+    ["share", "outcome"],
+)
+SCAN_ERRORS = Counter(
+    "topos_agent_scan_errors_total", "Directories or files scans could not read", ["share"]
+)
+HASHED_BYTES = Counter(
+    "topos_agent_hashed_bytes_total", "Bytes read to hash file contents", ["share"]
+)
+LAST_SCAN_SECONDS = Gauge(
+    "topos_agent_last_scan_seconds", "Duration of the latest scan of each share", ["share"]
+)
+UPLOAD_SECONDS = Histogram(
+    "topos_agent_upload_seconds", "Latency of event batch uploads", ["share"], LATENCY_BUCKETS
+)
+UPLOAD_BATCH_EVENTS = Histogram(
+    "topos_agent_upload_batch_events", "Events per uploaded batch", ["share"], BATCH_SIZE_BUCKETS
+)
+UPLOAD_RETRIES = Counter(
+    "topos_agent_upload_retries_total", "Failed batch uploads that will be retried", ["share"]
+)
+OUTBOX_PENDING = Gauge("topos_agent_outbox_pending_batches", "Batches waiting in the outbox")
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed_iter(items: Iterable[T], counter: Counter, **labels: str) -> Iterator[T]:
+    """Pass items through, adding the time spent producing each one to counter."""
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            counter.inc(time.perf_counter() - start, **labels)
+            return
+        counter.inc(time.perf_counter() - start, **labels)
+        yield item
+
+
+def share_report(share: str) -> dict[str, float]:
+    """Current totals for one share, diffed before and after a scan for its report."""
+    report = {
+        f"{phase}_seconds": SCAN_PHASE_SECONDS.value(share=share, phase=phase)
+        for phase in ("walk", "stat", "acl", "hash", "extract", "throttle")
+    }
+    for outcome in ("found", "hashed", "skipped"):
+        report[f"files_{outcome}"] = SCAN_FILES.value(share=share, outcome=outcome)
+    report["errors"] = SCAN_ERRORS.value(share=share)
+    report["hashed_bytes"] = HASHED_BYTES.value(share=share)
+    report["uploads"], report["upload_seconds"] = UPLOAD_SECONDS.totals(share=share)
+    report["uploaded_events"] = UPLOAD_BATCH_EVENTS.totals(share=share)[1]
+    report["upload_retries"] = UPLOAD_RETRIES.value(share=share)
+    return report
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """
+    Serve GET /metrics over plain HTTP until cancelled.
+
+    Only meant for a local Prometheus scraper; every other request gets 404.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readline()
+            # Skip the headers; nothing in them matters here
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", render_metrics().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {PROMETHEUS_CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError) as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    try:
+        server = await asyncio.start_server(handle, host, port)
+    except OSError as e:
+        logger.error(f"Could not serve metrics on {host}:{port}: {e}")
+        return
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
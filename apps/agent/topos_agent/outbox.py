@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    events BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class Outbox:
+    """
+    Durable queue of event batches waiting to be sent to the API.
+
+    Each batch is stored as zlib-compressed JSON and stays on disk until it
+    is acknowledged, so batches survive API outages and agent restarts.
+    Batches the API rejects outright are kept as dead letters for inspection
+    rather than retried forever.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self._pending = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[
+            0
+        ]
+        if self._pending:
+            logger.info(f"Outbox has {self._pending} batches left from a previous run")
+
+    def append(self, events: list[dict]) -> int:
+        """Durably add a batch of serialised events and return its id."""
+        data = zlib.compress(json.dumps(events, separators=(",", ":")).encode())
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (events, created_at) VALUES (?, ?)", (data, time.time())
+            )
+            self._conn.commit()
+            self._pending += 1
+        return cursor.lastrowid
+
+    def peek(self, limit: int) -> list[tuple[int, list[dict]]]:
+        """Return up to limit of the oldest pending batches as (id, events), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, events FROM outbox WHERE dead = 0 ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(batch_id, json.loads(zlib.decompress(data))) for batch_id, data in rows]
+
+    def ack(self, batch_id: int) -> None:
+        """Remove a batch the API accepted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (batch_id,))
+            self._conn.commit()
+            self._pending -= 1
+
+    def record_failure(self, batch_id: int, dead: bool = False) -> None:
+        """Count a failed delivery attempt, optionally giving up on the batch."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, dead = ? WHERE id = ?",
+                (dead, batch_id),
+            )
+            self._conn.commit()
+            if dead:
+                self._pending -= 1
+
+    def last_id(self) -> int:
+        """Return the id of the most recently added batch, or 0 if there never was one."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+
+    def oldest_pending_id(self) -> int | None:
+        """Return the id of the oldest batch still to be sent, if any."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(id) FROM outbox WHERE dead = 0").fetchone()
+        return row[0]
+
+    def pending(self) -> int:
+        """Return the number of batches still to be sent."""
+        return self._pending
+
+    def dead_letters(self) -> int:
+        """Return the number of batches the API rejected."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            self._conn.close()
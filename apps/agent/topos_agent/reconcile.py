@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from itertools import islice, pairwise
+
+import httpx
+
+from topos_agent.client import ToposClient
+from topos_agent.config import ShareConfig
+from topos_agent.scanner import iter_share_stats
+from topos_agent.state import FileState, ScanStateStore
+
+logger = logging.getLogger(__name__)
+
+# Must match the API: folder digests are sums of file entry digests modulo 2**256
+DIGEST_MODULUS = 2**256
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Folders sent per comparison request
+COMPARE_BATCH_SIZE = 1000
+
+
+def file_entry_digest(
+    relative_path: str, size_bytes: int, mtime: datetime, content_hash: str
+) -> int:
+    """Digest one file's path, size, mtime and content hash, exactly as the API does."""
+    if mtime.tzinfo is None:
+        mtime = mtime.replace(tzinfo=UTC)
+    mtime_us = (mtime - EPOCH) // timedelta(microseconds=1)
+    entry = f"{relative_path}\0{size_bytes}\0{mtime_us}\0{content_hash}"
+    return int.from_bytes(hashlib.sha256(entry.encode()).digest(), "big")
+
+
+def parent_folders(relative_path: str) -> list[str]:
+    """Return every folder containing a path, from the share root ("") down."""
+    parts = relative_path.split("/")[:-1]
+    return [""] + ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+@dataclass
+class FolderDigests:
+    """Digests of the files beneath each folder of a share, as far as known locally."""
+
+    digests: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    file_counts: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    children: dict[str, set[str]] = field(default_factory=lambda: defaultdict(set))
+    # Folders holding a file changed since the last scan, which must be rescanned
+    dirty: set[str] = field(default_factory=set)
+
+
+def compute_folder_digests(config: ShareConfig, state: ScanStateStore) -> FolderDigests:
+    """
+    Walk a share reading metadata only and digest each folder from the state store.
+
+    A file counts with its recorded content hash while its size, mtime, inode
+    and ctime are unchanged; otherwise every folder above it is dirty, as its
+    content or ACL may have changed. This is blocking.
+    """
+    result = FolderDigests()
+    for relative_path, stat in iter_share_stats(config):
+        folders = parent_folders(relative_path)
+        for parent, child in pairwise(folders):
+            result.children[parent].add(child)
+
+        cached = state.get(config.name, relative_path)
+        if (
+            cached is None
+            or not cached.content_hash
+            or not cached.matches(stat)
+            or not cached.acl_matches(stat)
+        ):
+            result.dirty.update(folders)
+            continue
+
+        digest = file_entry_digest(
+            relative_path,
+            stat.st_size,
+            datetime.fromtimestamp(stat.st_mtime),
+            cached.content_hash,
+        )
+        for folder in folders:
+            result.digests[folder] = (result.digests[folder] + digest) % DIGEST_MODULUS
+            result.file_counts[folder] += 1
+    return result
+
+
+async def find_unchanged_folders(
+    config: ShareConfig,
+    state: ScanStateStore,
+    client: ToposClient,
+    scan_session_id: str | None = None,
+) -> set[str]:
+    """
+    Find the folders of a share whose files the API already has, unchanged.
+
+    Local folder digests are compared with the API's top-down, descending
+    only into folders that differ, so the number of requests grows with what
+    changed rather than with the size of the share. The API counts files
+    beneath matching folders as seen by scan_session_id, if given, and the
+    full scan can skip them.
+
+    Returns:
+        Relative paths of matching folders ("" for the whole share); none of
+        them lies beneath another
+    """
+    local = await asyncio.to_thread(compute_folder_digests, config, state)
+    unchanged: set[str] = set()
+    level = [""]
+
+    while level:
+        # Dirty folders differ regardless; only the others need asking about
+        candidates = [folder for folder in level if folder not in local.dirty]
+        different = set(level) - set(candidates)
+        for i in range(0, len(candidates), COMPARE_BATCH_SIZE):
+            folders = [
+                {
+                    "path": folder,
+                    "digest": f"{local.digests[folder]:064x}",
+                    "file_count": local.file_counts[folder],
+                }
+                for folder in candidates[i : i + COMPARE_BATCH_SIZE]
+            ]
+            try:
+                result = await client.compare_folders(config.name, folders, scan_session_id)
+            except httpx.HTTPError as e:
+                logger.warning(
+                    f"Could not compare folders of share {config.name} with the API ({e}); "
+                    f"scanning all of them"
+                )
+                return set()
+            different.update(result.get("different", []))
+
+        unchanged.update(folder for folder in level if folder not in different)
+        level = sorted(child for folder in different for child in local.children[folder])
+
+    logger.info(
+        f"Share {config.name}: {len(unchanged)} folders unchanged since the API last saw them"
+    )
+    return unchanged
+
+
+async def reconcile_share(
+    config: ShareConfig,
+    state: ScanStateStore,
+    client: ToposClient,
+    batch_size: int,
+) -> int:
+    """
+    Seed an empty scan state with the content hashes the API already holds.
+
+    Walks the share reading metadata only and sends path, size and mtime to
+    the API in batches. Files the API reports unchanged are recorded with its
+    content hash, so the following full scan only hashes files that are new
+    or changed. ACLs are not seeded and are read as usual by that scan.
+
+    Reconciliation is only an optimisation: if the API cannot answer, the
+    full scan hashes everything as it would have anyway.
+
+    Returns:
+        Number of files seeded
+    """
+    files = iter_share_stats(config)
+    seeded = 0
+    reconciled = 0
+
+    while True:
+        batch = await asyncio.to_thread(list, islice(files, batch_size))
+        if not batch:
+            break
+
+        entries = [
+            {
+                "relative_path": relative_path,
+                "size_bytes": stat.st_size,
+                "mtime": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            }
+            for relative_path, stat in batch
+        ]
+        try:
+            result = await client.reconcile(config.name, entries)
+        except httpx.HTTPError as e:
+            logger.warning(
+                f"Could not reconcile share {config.name} with the API ({e}); hashing the rest"
+            )
+            break
+
+        stats = dict(batch)
+        for file in result.get("unchanged", []):
+            stat = stats.get(file["relative_path"])
+            # A hash from another algorithm would be recomputed anyway
+            if stat is None or not file["content_hash"].startswith(f"{config.hash_algorithm}:"):
+                continue
+            state.put(
+                config.name,
+                file["relative_path"],
+                FileState(
+                    size_bytes=stat.st_size,
+                    mtime_ns=stat.st_mtime_ns,
+                    inode=stat.st_ino,
+                    content_hash=file["content_hash"],
+                ),
+            )
+            seeded += 1
+        reconciled += len(batch)
+
+    state.commit()
+    logger.info(
+        f"Reconciled {reconciled} files of share {config.name} with the API; "
+        f"{seeded} need no hashing"
+    )
+    return seeded
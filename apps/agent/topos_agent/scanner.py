@@ -1,29 +1,38 @@
+import asyncio
 import fnmatch
+import functools
 import hashlib
 import logging
 import mimetypes
 import os
+import re
+import threading
+from collections.abc import AsyncIterator, Callable, Collection, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
+from stat import S_ISDIR, S_ISREG
 
+from topos_agent.acl import AclEntry, AclReader, compute_acl_hash
+from topos_agent.checkpoint import ScanCheckpoint
 from topos_agent.config import ShareConfig
+from topos_agent.extraction import extract_content
+from topos_agent.metrics import HASHED_BYTES, SCAN_PHASE_SECONDS, timed_iter
+from topos_agent.state import FileState, ScanStateStore
+from topos_agent.throttle import RateLimiter
 
 logger = logging.getLogger(__name__)
 
 # Initialize mimetypes
 mimetypes.init()
 
+# Read size used when hashing file contents; large reads amortise SMB round trips
+HASH_READ_SIZE = 1024 * 1024
 
-@dataclass
-class AclEntry:
-    """Represents an ACL entry for a file."""
-
-    principal_external_id: str
-    principal_display_name: str
-    principal_type: str = "USER"
-    rights: str = "R"
-    source: str = "FILE"
+# Sample fingerprint: head, tail and this many evenly spaced interior blocks
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_INTERIOR_BLOCKS = 3
 
 
 @dataclass
@@ -38,146 +47,689 @@ class FileInfo:
     content_hash: str
     acl_hash: str
     acl_entries: list[AclEntry] = field(default_factory=list)
+    # Text extracted for upload, gzip-compressed JSON; see ShareConfig.extract_text
+    extracted_text: bytes | None = None
+    bytes_hashed: int = 0  # Bytes read to hash the contents, only the sample if it sufficed
+
 
+@dataclass
+class ScanStats:
+    """Counters for a single scan of a share."""
+
+    files_found: int = 0
+    files_hashed: int = 0
+    bytes_hashed: int = 0  # Bytes read to hash files, counting only the sample if it sufficed
+    files_skipped: int = 0  # Already uploaded before a resume, or in folders the API has
+    errors: int = 0  # Directories or files that could not be read
+    finished: bool = False  # The walk reached the end of every include path
+
+    @property
+    def complete(self) -> bool:
+        """Whether every file in the share was seen, so absent files are really gone."""
+        return self.finished and self.errors == 0
+
+
+def compute_file_hash(
+    path: str,
+    chunk_size: int = HASH_READ_SIZE,
+    algorithm: str = "sha256",
+    limiter: RateLimiter | None = None,
+) -> str:
+    """
+    Compute a hash of file contents, prefixed with the algorithm name.
 
-def compute_file_hash(path: str, chunk_size: int = 8192) -> str:
-    """Compute SHA256 hash of file contents."""
-    sha256 = hashlib.sha256()
+    With a limiter, each chunk read is charged against its bytes-per-second budget.
+    """
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
     try:
-        with open(path, "rb") as f:
-            while chunk := f.read(chunk_size):
-                sha256.update(chunk)
-        return f"sha256:{sha256.hexdigest()}"
+        with open(path, "rb", buffering=0) as f:
+            while n := f.readinto(buffer):
+                digest.update(view[:n])
+                if limiter is not None:
+                    limiter.acquire(n)
+        return f"{algorithm}:{digest.hexdigest()}"
     except Exception as e:
         logger.warning(f"Could not hash file {path}: {e}")
         return ""
 
 
-def compute_acl_hash(acl_entries: list[AclEntry]) -> str:
-    """Compute hash of ACL entries for change detection."""
-    if not acl_entries:
-        return "sha256:empty"
-
-    # Sort entries for consistent hashing
-    sorted_entries = sorted(
-        acl_entries,
-        key=lambda e: (e.principal_external_id, e.rights, e.source),
-    )
+def compute_sample_hash(
+    path: str,
+    size: int,
+    block_size: int = SAMPLE_BLOCK_SIZE,
+    limiter: RateLimiter | None = None,
+) -> str:
+    """
+    Fingerprint a file from its size and a few sampled blocks.
 
-    content = "|".join(f"{e.principal_external_id}:{e.rights}:{e.source}" for e in sorted_entries)
-    return f"sha256:{hashlib.sha256(content.encode()).hexdigest()}"
+    Reads the head, the tail and SAMPLE_INTERIOR_BLOCKS evenly spaced blocks,
+    so the cost is constant regardless of file size. A matching fingerprint
+    does not prove the contents are unchanged, only that an edit would have to
+    avoid every sampled block and keep the size.
+    """
+    digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=16)
+    step = size // (SAMPLE_INTERIOR_BLOCKS + 1)
+    offsets = [0, *(step * i for i in range(1, SAMPLE_INTERIOR_BLOCKS + 1))]
+    offsets.append(max(size - block_size, 0))
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            for offset in offsets:
+                block = os.pread(fd, block_size, offset)
+                digest.update(block)
+                if limiter is not None:
+                    limiter.acquire(len(block))
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not sample file {path}: {e}")
+        return ""
+    return f"sample:{digest.hexdigest()}"
 
 
 def get_mime_type(path: str) -> str:
     """Get MIME type for a file."""
-    mime_type, _ = mimetypes.guess_type(path)
+    return _mime_type_for_extension(os.path.splitext(path)[1])
+
+
+@functools.lru_cache(maxsize=1024)
+def _mime_type_for_extension(extension: str) -> str:
+    """Guess a MIME type from a file extension, cached since shares reuse a few."""
+    mime_type, _ = mimetypes.guess_type(f"file{extension}")
     return mime_type or "application/octet-stream"
 
 
-def get_acl_entries(path: str) -> list[AclEntry]:
+def compile_exclude_patterns(patterns: list[str]) -> re.Pattern[str] | None:
     """
-    Get ACL entries for a file.
+    Compile glob exclude patterns into a single regex matched against names.
 
-    For v0, this is a simplified implementation that returns placeholder entries.
-    In production, you would use platform-specific ACL APIs or parse getfacl output.
+    Returns None when there are no patterns, so callers can skip matching.
     """
-    # Placeholder: return a simple entry based on file owner
-    try:
-        stat = os.stat(path)
-        uid = stat.st_uid
-
-        # Create a placeholder principal based on UID
-        return [
-            AclEntry(
-                principal_external_id=f"uid:{uid}",
-                principal_display_name=f"User {uid}",
-                principal_type="USER",
-                rights="RW",
-                source="FILE",
-            )
-        ]
-    except Exception as e:
-        logger.warning(f"Could not get ACL for {path}: {e}")
-        return []
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
 
 
-def should_exclude(path: str, patterns: list[str]) -> bool:
-    """Check if a path should be excluded based on patterns."""
-    basename = os.path.basename(path)
-    for pattern in patterns:
-        if fnmatch.fnmatch(basename, pattern):
-            return True
-        if fnmatch.fnmatch(path, pattern):
-            return True
-    return False
+def _walk_key(scan_root: str, directory: str) -> tuple[str, ...]:
+    """Position of a directory in walk order: its path components below scan_root."""
+    relative = os.path.relpath(directory, scan_root)
+    return () if relative == "." else tuple(relative.split(os.sep))
 
 
-def scan_share(config: ShareConfig) -> list[FileInfo]:
+def walk_files(
+    scan_root: str,
+    exclude: re.Pattern[str] | None = None,
+    onerror: Callable[[OSError], None] | None = None,
+    resume_after: str | None = None,
+    *,
+    prune: Collection[str] = (),
+) -> Iterator[tuple[str, os.DirEntry[str]]]:
     """
-    Scan a share and return information about all files.
+    Walk a directory tree with os.scandir, yielding regular files.
 
-    Args:
-        config: Share configuration
+    Unlike os.walk followed by os.stat, the DirEntry is handed to the caller so
+    its cached stat result can be reused. Symlinked directories are not
+    followed and excluded names are pruned before descending. As with
+    os.walk, onerror is called with any OSError raised while listing.
+
+    Entries are visited in sorted depth-first order, so the walk is
+    deterministic and can be resumed: with resume_after, every directory up
+    to and including that one in walk order is skipped. Directories in prune
+    are skipped along with their subtrees.
+
+    Yields:
+        Tuples of (directory path, DirEntry) for each file
+    """
+    stack = [scan_root]
+    resume_key = _walk_key(scan_root, resume_after) if resume_after is not None else None
+
+    while stack:
+        directory = stack.pop()
+        if directory in prune:
+            continue
+        files_done = False
+        if resume_key is not None:
+            key = _walk_key(scan_root, directory)
+            if key <= resume_key:
+                if key != resume_key[: len(key)]:
+                    continue  # Walked before the resume point, along with its subtree
+                # The resume point or an ancestor: only later subdirectories remain
+                files_done = True
+
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Could not list directory {directory}: {e}")
+            if onerror is not None:
+                onerror(e)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if exclude is not None and exclude.match(entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not files_done and entry.is_file():
+                    yield directory, entry
+            except OSError as e:
+                logger.warning(f"Could not inspect {entry.path}: {e}")
+                if onerror is not None:
+                    onerror(e)
+
+        # Reverse so directories are visited in sorted order
+        stack.extend(reversed(subdirs))
+
+
+def record_file_state(
+    file_info: FileInfo,
+    stat: os.stat_result,
+    state: ScanStateStore,
+    sample_hash: str = "",
+) -> None:
+    """Record a described file's stat tuple, content hash, sample fingerprint and ACL."""
+    state.put_acl(file_info.acl_hash, file_info.acl_entries)
+    state.put(
+        file_info.share_name,
+        file_info.relative_path,
+        FileState(
+            size_bytes=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+            content_hash=file_info.content_hash,
+            ctime_ns=stat.st_ctime_ns,
+            acl_hash=file_info.acl_hash,
+            sample_hash=sample_hash,
+        ),
+    )
+
+
+def hash_file_info(
+    config: ShareConfig,
+    file_info: FileInfo,
+    full_path: str,
+    stat: os.stat_result,
+    state: ScanStateStore | None,
+    *,
+    read_limiter: RateLimiter | None = None,
+) -> FileInfo:
+    """
+    Hash a file's contents, record the result and return the completed FileInfo.
+
+    Files of at least config.sample_hash_min_bytes are sampled first; if the
+    sample fingerprint and size match the recorded ones, e.g. after a touch or
+    a copy that preserved contents, the recorded full hash is reused. With
+    config.extract_text, text is also extracted for upload. Reads are charged
+    against read_limiter, if given.
+    """
+    sample_hash = ""
+    if config.sample_hash_min_bytes and stat.st_size >= config.sample_hash_min_bytes:
+        with SCAN_PHASE_SECONDS.time(share=config.name, phase="hash"):
+            sample_hash = compute_sample_hash(full_path, stat.st_size, limiter=read_limiter)
+        file_info.bytes_hashed = min(stat.st_size, SAMPLE_BLOCK_SIZE * (SAMPLE_INTERIOR_BLOCKS + 2))
+        HASHED_BYTES.inc(file_info.bytes_hashed, share=config.name)
+        previous = state.get(config.name, file_info.relative_path) if state is not None else None
+        if (
+            sample_hash
+            and previous is not None
+            and previous.sample_hash == sample_hash
+            and previous.content_hash.startswith(f"{config.hash_algorithm}:")
+        ):
+            logger.debug(f"Sample fingerprint unchanged, skipping full hash: {full_path}")
+            file_info.content_hash = previous.content_hash
+
+    if not file_info.content_hash:
+        with SCAN_PHASE_SECONDS.time(share=config.name, phase="hash"):
+            file_info.content_hash = compute_file_hash(
+                full_path, algorithm=config.hash_algorithm, limiter=read_limiter
+            )
+        file_info.bytes_hashed += stat.st_size
+        HASHED_BYTES.inc(stat.st_size, share=config.name)
+
+    if config.extract_text and file_info.content_hash:
+        if read_limiter is not None:
+            read_limiter.acquire(stat.st_size)
+        with SCAN_PHASE_SECONDS.time(share=config.name, phase="extract"):
+            extracted = extract_content(full_path, file_info.file_type)
+        if extracted is not None:
+            file_info.extracted_text = extracted.encode()
+
+    if state is None:
+        return file_info
+    if not file_info.content_hash:
+        # Still present, so keep it out of the deleted set
+        state.mark_seen(file_info.share_name, file_info.relative_path)
+    else:
+        record_file_state(file_info, stat, state, sample_hash)
+    return file_info
+
+
+def describe_file(
+    config: ShareConfig,
+    full_path: str,
+    relative_path: str,
+    stat: os.stat_result,
+    state: ScanStateStore | None,
+    *,
+    acl_reader: AclReader,
+) -> tuple[FileInfo, bool]:
+    """
+    Build a FileInfo from metadata, reusing the recorded hash and ACL if possible.
+
+    The content hash is reused while size, mtime and inode are unchanged, and
+    the ACL while ctime is unchanged, so an untouched file costs no reads.
 
     Returns:
-        List of FileInfo objects for all discovered files
+        Tuple of (file_info, needs_hash); when needs_hash is True the caller
+        must complete the FileInfo with hash_file_info
     """
-    files: list[FileInfo] = []
+    cached = state.get(config.name, relative_path) if state is not None else None
+    content_hash = None
+    if (
+        cached is not None
+        and cached.matches(stat)
+        and cached.content_hash.startswith(f"{config.hash_algorithm}:")
+    ):
+        content_hash = cached.content_hash
+
+    acl_entries = None
+    if cached is not None and cached.acl_matches(stat):
+        acl_entries = state.get_acl(cached.acl_hash)
+    acl_reused = acl_entries is not None
+    if acl_entries is None:
+        with SCAN_PHASE_SECONDS.time(share=config.name, phase="acl"):
+            acl_entries = acl_reader.read(full_path, stat)
+
+    file_info = FileInfo(
+        share_name=config.name,
+        relative_path=relative_path,
+        size_bytes=stat.st_size,
+        mtime=datetime.fromtimestamp(stat.st_mtime),
+        file_type=get_mime_type(full_path),
+        content_hash=content_hash or "",
+        acl_hash=cached.acl_hash if acl_reused else compute_acl_hash(acl_entries),
+        acl_entries=acl_entries,
+    )
+
+    if content_hash is not None:
+        if acl_reused:
+            state.mark_seen(config.name, relative_path)
+        else:
+            record_file_state(file_info, stat, state, cached.sample_hash)
+    return file_info, content_hash is None
+
+
+def iter_share_files(
+    config: ShareConfig,
+    state: ScanStateStore | None = None,
+    hash_pool: Executor | None = None,
+    stats: ScanStats | None = None,
+    checkpoint: ScanCheckpoint | None = None,
+    *,
+    skip_folders: Collection[str] = (),
+) -> Iterator[FileInfo]:
+    """
+    Walk a share and yield information about each file as it is processed.
+
+    Files that need hashing are submitted to hash_pool, with at most
+    config.hash_concurrency outstanding at a time, and yielded as they
+    complete. Without a pool, files are hashed inline on the calling thread.
+    Files described and bytes read are throttled to the share's
+    max_files_per_second and max_read_bytes_per_second budgets.
+
+    This is blocking; use scan_share to consume it from the event loop.
+
+    Args:
+        config: Share configuration
+        state: Optional scan state store; unchanged files skip hashing
+        hash_pool: Optional executor used to hash files concurrently
+        stats: Optional counters updated as the scan progresses
+        checkpoint: Optional scan checkpoint, used together with state; an
+            interrupted scan resumes from it and yielded files are registered
+            with it until the uploader acknowledges them
+        skip_folders: Relative folders ("" for the whole share) the API already
+            has unchanged; they are not walked and their recorded files are
+            marked as seen
+
+    Yields:
+        FileInfo objects for each discovered file, not necessarily in walk order
+    """
+    if stats is None:
+        stats = ScanStats()
+    in_flight: set[Future[FileInfo]] = set()
     mount_point = Path(config.mount_point)
 
     if not mount_point.exists():
         logger.error(f"Mount point does not exist: {mount_point}")
-        return files
+        stats.errors += 1
+        return
 
     logger.info(f"Scanning share {config.name} at {mount_point}")
+    exclude = compile_exclude_patterns(config.exclude_patterns)
+    acl_reader = AclReader(config.acl_source)
+    file_limiter = RateLimiter.per_second(config.max_files_per_second)
+    read_limiter = RateLimiter.per_second(config.max_read_bytes_per_second)
+    if state is not None:
+        _scan_id, progress = state.begin_scan(config.name)
+        if checkpoint is not None:
+            checkpoint.resume(progress)
+            stats.errors += checkpoint.progress.errors
+        for folder in skip_folders:
+            stats.files_skipped += state.mark_folder_seen(config.name, folder)
+    prune = {os.path.join(mount_point, folder) for folder in skip_folders if folder}
+
+    def onerror(e: OSError) -> None:
+        if not isinstance(e, FileNotFoundError):
+            stats.errors += 1
+
+    def collect(futures: set[Future[FileInfo]]) -> Iterator[FileInfo]:
+        for future in futures:
+            try:
+                file_info = future.result()
+            except Exception as e:
+                logger.exception(f"Error hashing file: {e}")
+                stats.errors += 1
+                continue
+            stats.files_found += 1
+            stats.bytes_hashed += file_info.bytes_hashed
+            yield file_info
 
-    for include_path in config.include_paths:
-        scan_root = mount_point / include_path.lstrip("/")
-
-        if not scan_root.exists():
-            logger.warning(f"Include path does not exist: {scan_root}")
-            continue
+    try:
+        for include_path in config.include_paths:
+            scan_root = mount_point / include_path.lstrip("/")
+            include_folder = include_path.strip("/")
+            if any(
+                not folder or include_folder == folder or include_folder.startswith(f"{folder}/")
+                for folder in skip_folders
+            ):
+                continue
+
+            resume_after = None
+            if checkpoint is not None:
+                if checkpoint.include_completed(include_path):
+                    continue
+                resume_dir = checkpoint.resume_after(include_path)
+                if resume_dir is not None:
+                    resume_after = os.path.join(mount_point, resume_dir)
 
-        for root, dirs, filenames in os.walk(scan_root):
-            # Filter out excluded directories
-            dirs[:] = [d for d in dirs if not should_exclude(d, config.exclude_patterns)]
+            if not scan_root.exists():
+                logger.warning(f"Include path does not exist: {scan_root}")
+                stats.errors += 1
+                continue
 
-            for filename in filenames:
-                if should_exclude(filename, config.exclude_patterns):
-                    continue
+            relative_dir = ""
+            current_dir = None
 
-                full_path = os.path.join(root, filename)
+            walk = walk_files(str(scan_root), exclude, onerror, resume_after, prune=prune)
+            for directory, entry in timed_iter(
+                walk, SCAN_PHASE_SECONDS, share=config.name, phase="walk"
+            ):
+                full_path = entry.path
 
                 # Skip if too large
                 try:
-                    stat = os.stat(full_path)
+                    with SCAN_PHASE_SECONDS.time(share=config.name, phase="stat"):
+                        stat = entry.stat()
                     if stat.st_size > config.max_file_size_bytes:
                         logger.debug(f"Skipping large file: {full_path}")
                         continue
                 except OSError as e:
                     logger.warning(f"Could not stat file {full_path}: {e}")
+                    onerror(e)
+                    continue
+
+                # Compute relative path from mount point, once per directory
+                if directory != current_dir:
+                    current_dir = directory
+                    relative_dir = os.path.relpath(directory, mount_point)
+                relative_path = (
+                    entry.name if relative_dir == "." else os.path.join(relative_dir, entry.name)
+                )
+
+                if (
+                    checkpoint is not None
+                    and checkpoint.resumed
+                    and state.uploaded_unchanged(config.name, relative_path, stat)
+                ):
+                    stats.files_skipped += 1
                     continue
 
-                # Compute relative path from mount point
-                relative_path = os.path.relpath(full_path, mount_point)
+                if file_limiter is not None:
+                    file_limiter.acquire()
 
                 # Get file info
                 try:
-                    acl_entries = get_acl_entries(full_path)
-
-                    file_info = FileInfo(
-                        share_name=config.name,
-                        relative_path=relative_path,
-                        size_bytes=stat.st_size,
-                        mtime=datetime.fromtimestamp(stat.st_mtime),
-                        file_type=get_mime_type(full_path),
-                        content_hash=compute_file_hash(full_path),
-                        acl_hash=compute_acl_hash(acl_entries),
-                        acl_entries=acl_entries,
+                    file_info, needs_hash = describe_file(
+                        config, full_path, relative_path, stat, state, acl_reader=acl_reader
                     )
-                    files.append(file_info)
                 except Exception as e:
                     logger.exception(f"Error processing file {full_path}: {e}")
+                    stats.errors += 1
+                    continue
+
+                if checkpoint is not None:
+                    checkpoint.add(include_path, relative_dir)
+
+                if not needs_hash:
+                    stats.files_found += 1
+                    yield file_info
+                    continue
+
+                stats.files_hashed += 1
+                if hash_pool is None:
+                    file_info = hash_file_info(
+                        config, file_info, full_path, stat, state, read_limiter=read_limiter
+                    )
+                    stats.files_found += 1
+                    stats.bytes_hashed += file_info.bytes_hashed
+                    yield file_info
+                    continue
+
+                # Bound outstanding reads for this share
+                while len(in_flight) >= config.hash_concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from collect(done)
+
+                in_flight.add(
+                    hash_pool.submit(
+                        hash_file_info,
+                        config,
+                        file_info,
+                        full_path,
+                        stat,
+                        state,
+                        read_limiter=read_limiter,
+                    )
+                )
+
+            if checkpoint is not None:
+                checkpoint.include_listed(include_path)
+
+        if in_flight:
+            done, in_flight = wait(in_flight)
+            yield from collect(done)
+    finally:
+        # Do not leave queued reads behind if the consumer stopped early
+        for future in in_flight:
+            future.cancel()
+        for limiter in (file_limiter, read_limiter):
+            if limiter is not None:
+                SCAN_PHASE_SECONDS.inc(limiter.slept_seconds, share=config.name, phase="throttle")
+
+    if state is not None:
+        state.commit()
+
+    stats.finished = True
+    logger.info(
+        f"Found {stats.files_found} files in share {config.name} "
+        f"({stats.files_hashed} hashed, {stats.files_skipped} already sent, "
+        f"{stats.errors} errors)"
+    )
+
+
+def iter_share_stats(config: ShareConfig) -> Iterator[tuple[str, os.stat_result]]:
+    """
+    Walk a share reading metadata only, without hashing or reading ACLs.
+
+    Files are selected exactly as by iter_share_files. This is blocking.
+
+    Yields:
+        Tuples of (relative path, stat result) for each file
+    """
+    mount_point = config.mount_point
+    exclude = compile_exclude_patterns(config.exclude_patterns)
+    file_limiter = RateLimiter.per_second(config.max_files_per_second)
 
-    logger.info(f"Found {len(files)} files in share {config.name}")
-    return files
+    for include_path in config.include_paths:
+        scan_root = os.path.join(mount_point, include_path.lstrip("/"))
+        for _directory, entry in walk_files(scan_root, exclude):
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                logger.warning(f"Could not stat file {entry.path}: {e}")
+                continue
+            if stat.st_size > config.max_file_size_bytes:
+                continue
+            if file_limiter is not None:
+                file_limiter.acquire()
+            yield os.path.relpath(entry.path, mount_point), stat
+
+
+def describe_paths(
+    config: ShareConfig,
+    relative_paths: Iterable[str],
+    state: ScanStateStore | None = None,
+) -> tuple[list[FileInfo], list[str]]:
+    """
+    Describe specific paths within a share, e.g. those reported by a watcher.
+
+    Directories are walked so that every file beneath them is described.
+    Paths that are excluded, too large or not regular files are skipped.
+
+    Returns:
+        Tuple of (described files, relative paths that no longer exist)
+    """
+    mount_point = config.mount_point
+    exclude = compile_exclude_patterns(config.exclude_patterns)
+    acl_reader = AclReader(config.acl_source)
+    read_limiter = RateLimiter.per_second(config.max_read_bytes_per_second)
+    files: list[FileInfo] = []
+    missing: list[str] = []
+
+    def describe(full_path: str, relative_path: str, stat: os.stat_result) -> None:
+        if stat.st_size > config.max_file_size_bytes:
+            return
+        try:
+            file_info, needs_hash = describe_file(
+                config, full_path, relative_path, stat, state, acl_reader=acl_reader
+            )
+            if needs_hash:
+                file_info = hash_file_info(
+                    config, file_info, full_path, stat, state, read_limiter=read_limiter
+                )
+        except Exception as e:
+            logger.exception(f"Error processing file {full_path}: {e}")
+            return
+        files.append(file_info)
+
+    for relative_path in relative_paths:
+        if exclude is not None and exclude.match(os.path.basename(relative_path)):
+            continue
+
+        full_path = os.path.join(mount_point, relative_path)
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            missing.append(relative_path)
+            continue
+        except OSError as e:
+            logger.warning(f"Could not stat file {full_path}: {e}")
+            continue
+
+        if S_ISDIR(stat.st_mode):
+            for _directory, entry in walk_files(full_path, exclude):
+                try:
+                    entry_stat = entry.stat()
+                except OSError as e:
+                    logger.warning(f"Could not stat file {entry.path}: {e}")
+                    continue
+                describe(entry.path, os.path.relpath(entry.path, mount_point), entry_stat)
+        elif S_ISREG(stat.st_mode):
+            describe(full_path, relative_path, stat)
+
+    if state is not None:
+        state.commit()
+
+    return files, missing
+
+
+async def scan_share(
+    config: ShareConfig,
+    state: ScanStateStore | None = None,
+    queue_size: int = 1000,
+    hash_pool: Executor | None = None,
+    stats: ScanStats | None = None,
+    *,
+    checkpoint: ScanCheckpoint | None = None,
+    skip_folders: Collection[str] = (),
+) -> AsyncIterator[FileInfo]:
+    """
+    Scan a share, yielding FileInfo objects as soon as they are ready.
+
+    Walking and hashing run in a worker thread that feeds a bounded queue,
+    so memory stays flat regardless of share size and a slow consumer
+    applies backpressure to the walk.
+
+    Args:
+        config: Share configuration
+        state: Optional scan state store; unchanged files skip hashing
+        queue_size: Maximum number of scanned files buffered ahead of the consumer
+        hash_pool: Optional executor used to hash files concurrently
+        stats: Optional counters updated as the scan progresses
+        checkpoint: Optional scan checkpoint to resume from and register files with
+        skip_folders: Relative folders the API already has unchanged, not walked
+
+    Yields:
+        FileInfo objects for each discovered file
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[FileInfo | BaseException | None] = asyncio.Queue(maxsize=queue_size)
+    cancelled = threading.Event()
+
+    def put(item: FileInfo | BaseException | None) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        try:
+            for file_info in iter_share_files(
+                config, state, hash_pool, stats, checkpoint, skip_folders=skip_folders
+            ):
+                if cancelled.is_set():
+                    return
+                put(file_info)
+        except BaseException as e:
+            put(e)
+            return
+        put(None)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the consumer stopped early
+        cancelled.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+        await producer
@@ -0,0 +1,416 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+
+from topos_agent.acl import AclEntry
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_state (
+    share_name TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    last_seen_scan INTEGER NOT NULL DEFAULT 0,
+    ctime_ns INTEGER NOT NULL DEFAULT 0,
+    acl_hash TEXT NOT NULL DEFAULT '',
+    sample_hash TEXT NOT NULL DEFAULT '',
+    uploaded_scan INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (share_name, relative_path)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS share_scan (
+    share_name TEXT PRIMARY KEY,
+    scan_id INTEGER NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 1,
+    errors INTEGER NOT NULL DEFAULT 0,
+    include_path TEXT,
+    directory TEXT,
+    include_complete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS api_scan_session (
+    share_name TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS acl_set (
+    acl_hash TEXT PRIMARY KEY,
+    entries TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release, applied to existing databases on open
+ADDED_COLUMNS = [
+    ("file_state", "last_seen_scan", "INTEGER NOT NULL DEFAULT 0"),
+    ("file_state", "ctime_ns", "INTEGER NOT NULL DEFAULT 0"),
+    ("file_state", "acl_hash", "TEXT NOT NULL DEFAULT ''"),
+    ("file_state", "sample_hash", "TEXT NOT NULL DEFAULT ''"),
+    ("file_state", "uploaded_scan", "INTEGER NOT NULL DEFAULT 0"),
+    ("share_scan", "finished", "INTEGER NOT NULL DEFAULT 1"),
+    ("share_scan", "errors", "INTEGER NOT NULL DEFAULT 0"),
+    ("share_scan", "include_path", "TEXT"),
+    ("share_scan", "directory", "TEXT"),
+    ("share_scan", "include_complete", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+# Number of pending writes after which the store commits on its own
+COMMIT_EVERY = 1000
+
+
+@dataclass
+class FileState:
+    """What the agent last recorded for a file."""
+
+    size_bytes: int
+    mtime_ns: int
+    inode: int
+    content_hash: str
+    ctime_ns: int = 0
+    acl_hash: str = ""
+    sample_hash: str = ""  # Fingerprint of sampled blocks, recorded for large files
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Check whether a fresh stat result describes the same file contents."""
+        return (
+            self.size_bytes == stat.st_size
+            and self.mtime_ns == stat.st_mtime_ns
+            and self.inode == stat.st_ino
+        )
+
+    def acl_matches(self, stat: os.stat_result) -> bool:
+        """Check whether the recorded ACL still applies; permission changes bump ctime."""
+        return (
+            bool(self.acl_hash) and self.ctime_ns == stat.st_ctime_ns and self.inode == stat.st_ino
+        )
+
+
+@dataclass
+class ScanProgress:
+    """Checkpoint of an unfinished full scan of a share."""
+
+    include_path: str | None = None  # Include path the checkpoint falls in
+    directory: str | None = None  # Last directory, in walk order, fully uploaded
+    include_complete: bool = False  # Every directory of include_path was uploaded
+    errors: int = 0  # Errors counted before the checkpoint
+
+
+class ScanStateStore:
+    """
+    Persistent local record of file stat tuples and content hashes.
+
+    Keyed by share name and relative path. A file whose size, mtime and inode
+    are unchanged since the last scan reuses its recorded hash instead of
+    being read again. Likewise a file whose ctime is unchanged reuses its
+    recorded ACL, stored once per distinct ACL in the acl_set table.
+
+    Each full scan of a share gets an increasing scan id, and every file the
+    scan sees is stamped with it, so files left with an older id after a
+    complete scan are the ones that were deleted. A scan stays open until
+    finish_scan is called, so one interrupted by a restart is resumed under
+    the same id from its last saved ScanProgress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._scan_ids: dict[str, int] = {}
+        self._acl_sets: dict[str, list[AclEntry]] = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self) -> None:
+        for table, column, definition in ADDED_COLUMNS:
+            columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                logger.info(f"Adding column {table}.{column} to scan state database")
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _scan_id(self, share_name: str) -> int:
+        """Return the current scan id for a share; caller must hold the lock."""
+        scan_id = self._scan_ids.get(share_name)
+        if scan_id is None:
+            row = self._conn.execute(
+                "SELECT scan_id FROM share_scan WHERE share_name = ?", (share_name,)
+            ).fetchone()
+            scan_id = row[0] if row else 0
+            self._scan_ids[share_name] = scan_id
+        return scan_id
+
+    def begin_scan(self, share_name: str) -> tuple[int, ScanProgress | None]:
+        """
+        Start a full scan of a share, resuming the previous one if it never finished.
+
+        Returns:
+            Tuple of (scan_id, progress); progress is None for a fresh scan
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT finished, errors, include_path, directory, include_complete "
+                "FROM share_scan WHERE share_name = ?",
+                (share_name,),
+            ).fetchone()
+            if row is not None and not row[0]:
+                return self._scan_id(share_name), ScanProgress(
+                    include_path=row[2],
+                    directory=row[3],
+                    include_complete=bool(row[4]),
+                    errors=row[1],
+                )
+
+            scan_id = self._scan_id(share_name) + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO share_scan (share_name, scan_id, finished) "
+                "VALUES (?, ?, 0)",
+                (share_name, scan_id),
+            )
+            self._conn.commit()
+            self._pending = 0
+            self._scan_ids[share_name] = scan_id
+        return scan_id, None
+
+    def save_progress(self, share_name: str, progress: ScanProgress) -> None:
+        """Durably record how far the current scan of a share has got."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE share_scan SET errors = ?, include_path = ?, directory = ?, "
+                "include_complete = ? WHERE share_name = ?",
+                (
+                    progress.errors,
+                    progress.include_path,
+                    progress.directory,
+                    progress.include_complete,
+                    share_name,
+                ),
+            )
+            self._conn.commit()
+            self._pending = 0
+
+    def finish_scan(self, share_name: str) -> None:
+        """Close the current scan of a share so the next one starts afresh."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE share_scan SET finished = 1, errors = 0, include_path = NULL, "
+                "directory = NULL, include_complete = 0 WHERE share_name = ?",
+                (share_name,),
+            )
+            self._conn.execute("DELETE FROM api_scan_session WHERE share_name = ?", (share_name,))
+            self._conn.commit()
+            self._pending = 0
+
+    def scan_session(self, share_name: str) -> str | None:
+        """
+        Return the API scan session of the current scan of a share, if one was opened.
+
+        Kept until finish_scan, so a resumed scan closes the session it opened
+        before the restart, which also covers the files it uploaded then.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id FROM api_scan_session WHERE share_name = ?", (share_name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_scan_session(self, share_name: str, session_id: str) -> None:
+        """Durably record the API scan session opened for the current scan of a share."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO api_scan_session (share_name, session_id) VALUES (?, ?)",
+                (share_name, session_id),
+            )
+            self._conn.commit()
+            self._pending = 0
+
+    def mark_uploaded(self, share_name: str, relative_paths: list[str]) -> None:
+        """Record that these files were durably queued for upload during the current scan."""
+        with self._lock:
+            scan_id = self._scan_id(share_name)
+            self._conn.executemany(
+                "UPDATE file_state SET uploaded_scan = ? "
+                "WHERE share_name = ? AND relative_path = ?",
+                [(scan_id, share_name, path) for path in relative_paths],
+            )
+            self._after_write()
+
+    def uploaded_unchanged(self, share_name: str, relative_path: str, stat: os.stat_result) -> bool:
+        """Whether the current scan already uploaded this file and it is unchanged since."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size_bytes, mtime_ns, inode, content_hash, ctime_ns, acl_hash, "
+                "uploaded_scan FROM file_state WHERE share_name = ? AND relative_path = ?",
+                (share_name, relative_path),
+            ).fetchone()
+            scan_id = self._scan_id(share_name)
+        if row is None or row[6] != scan_id:
+            return False
+        recorded = FileState(*row[:6])
+        return recorded.matches(stat) and recorded.acl_matches(stat)
+
+    def mark_seen(self, share_name: str, relative_path: str) -> None:
+        """Record that the current scan saw a file without re-recording its state."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE file_state SET last_seen_scan = ? "
+                "WHERE share_name = ? AND relative_path = ?",
+                (self._scan_id(share_name), share_name, relative_path),
+            )
+            self._after_write()
+
+    def mark_folder_seen(self, share_name: str, folder: str) -> int:
+        """
+        Record that the current scan saw every file beneath a folder ("" for all).
+
+        Returns:
+            Number of files marked
+        """
+        with self._lock:
+            scan_id = self._scan_id(share_name)
+            if folder:
+                # Paths beneath folder sort between "folder/" and "folder0", as "0" follows "/"
+                cursor = self._conn.execute(
+                    "UPDATE file_state SET last_seen_scan = ? WHERE share_name = ? "
+                    "AND relative_path >= ? AND relative_path < ?",
+                    (scan_id, share_name, f"{folder}/", f"{folder}0"),
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE file_state SET last_seen_scan = ? WHERE share_name = ?",
+                    (scan_id, share_name),
+                )
+            self._after_write()
+        return cursor.rowcount
+
+    def has_files(self, share_name: str) -> bool:
+        """Whether any file of a share has been recorded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM file_state WHERE share_name = ? LIMIT 1", (share_name,)
+            ).fetchone()
+        return row is not None
+
+    def unseen_paths(self, share_name: str) -> list[str]:
+        """Return recorded files the current scan of a share did not see."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT relative_path FROM file_state WHERE share_name = ? AND last_seen_scan < ?",
+                (share_name, self._scan_id(share_name)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, share_name: str, relative_path: str) -> FileState | None:
+        """Return the recorded state for a file, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size_bytes, mtime_ns, inode, content_hash, ctime_ns, acl_hash, sample_hash "
+                "FROM file_state "
+                "WHERE share_name = ? AND relative_path = ?",
+                (share_name, relative_path),
+            ).fetchone()
+        if row is None:
+            return None
+        return FileState(*row)
+
+    def put(self, share_name: str, relative_path: str, state: FileState) -> None:
+        """Record the current state for a file."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_state "
+                "(share_name, relative_path, size_bytes, mtime_ns, inode, content_hash, "
+                "last_seen_scan, ctime_ns, acl_hash, sample_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    share_name,
+                    relative_path,
+                    state.size_bytes,
+                    state.mtime_ns,
+                    state.inode,
+                    state.content_hash,
+                    self._scan_id(share_name),
+                    state.ctime_ns,
+                    state.acl_hash,
+                    state.sample_hash,
+                ),
+            )
+            self._after_write()
+
+    def get_acl(self, acl_hash: str) -> list[AclEntry] | None:
+        """Return the ACL entries recorded under a hash, if any."""
+        entries = self._acl_sets.get(acl_hash)
+        if entries is not None:
+            return entries
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entries FROM acl_set WHERE acl_hash = ?", (acl_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        entries = [AclEntry(**entry) for entry in json.loads(row[0])]
+        self._acl_sets[acl_hash] = entries
+        return entries
+
+    def put_acl(self, acl_hash: str, entries: list[AclEntry]) -> None:
+        """Record the entries of an ACL, once per distinct hash."""
+        if acl_hash in self._acl_sets:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO acl_set (acl_hash, entries) VALUES (?, ?)",
+                (acl_hash, json.dumps([asdict(entry) for entry in entries])),
+            )
+            self._after_write()
+        self._acl_sets[acl_hash] = entries
+
+    def _after_write(self) -> None:
+        """Commit once enough writes are pending; caller must hold the lock."""
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def paths_under(self, share_name: str, directory: str) -> list[str]:
+        """Return recorded relative paths anywhere below a directory."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT relative_path FROM file_state "
+                "WHERE share_name = ? AND relative_path >= ? AND relative_path < ?",
+                # '0' sorts immediately after '/', bounding the subtree
+                (share_name, f"{directory}/", f"{directory}0"),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, share_name: str, relative_paths: list[str]) -> None:
+        """Forget recorded state for files that no longer exist."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM file_state WHERE share_name = ? AND relative_path = ?",
+                [(share_name, path) for path in relative_paths],
+            )
+            self._conn.commit()
+            self._pending = 0
+
+    def commit(self) -> None:
+        """Flush pending writes to disk."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Commit and close the underlying database."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
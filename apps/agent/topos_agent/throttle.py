@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket limiting some quantity per second.
+
+    Tokens refill continuously at rate per second, up to one second's worth.
+    A request larger than the bucket is granted but leaves it in debt, so
+    callers asking for big chunks are slowed to the average rate rather than
+    blocked forever.
+    """
+
+    def __init__(self, rate: float):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.slept_seconds = 0.0  # Total time callers have waited
+
+    @classmethod
+    def per_second(cls, rate: float) -> "RateLimiter | None":
+        """Return a limiter for a configured rate, or None when 0 means unlimited."""
+        return cls(rate) if rate > 0 else None
+
+    def acquire(self, amount: float = 1) -> None:
+        """Take amount tokens, sleeping until the bucket can cover them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            deficit = -self._tokens
+            if deficit > 0:
+                self.slept_seconds += deficit / self.rate
+
+        # Sleep outside the lock; later callers queue behind the debt we left
+        if deficit > 0:
+            time.sleep(deficit / self.rate)
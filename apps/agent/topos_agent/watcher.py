@@ -0,0 +1,272 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import threading
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from topos_agent.config import ShareConfig
+from topos_agent.scanner import compile_exclude_patterns
+
+logger = logging.getLogger(__name__)
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+CHANGED_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+DELETED_MASK = IN_MOVED_FROM | IN_DELETE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+# Longest a burst of events may delay a flush, as a multiple of the debounce window
+MAX_DELAY_FACTOR = 10
+
+
+@dataclass
+class ChangeSet:
+    """Coalesced changes observed in a share since the last flush."""
+
+    changed: set[str] = field(default_factory=set)  # Relative paths to re-describe
+    deleted: set[str] = field(default_factory=set)  # Relative paths that went away
+    overflowed: bool = False  # Events were dropped; a full rescan is needed
+
+    def __bool__(self) -> bool:
+        return bool(self.changed or self.deleted or self.overflowed)
+
+
+def _load_libc() -> ctypes.CDLL:
+    """Load libc with the inotify entry points, or raise OSError."""
+    if not sys.platform.startswith("linux"):
+        raise OSError("inotify is only available on Linux")
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class ShareWatcher:
+    """
+    Watch a mounted share with inotify and report coalesced changes.
+
+    Every directory under the share's include paths gets its own watch, and
+    new directories are watched as they appear. Events are buffered until the
+    share has been quiet for debounce_seconds, then yielded as a ChangeSet.
+    Directory trees are walked to add watches in a worker thread, so a large
+    share does not stall the event loop.
+
+    inotify only reports changes made through this host's view of the
+    filesystem. On network mounts whose server does not forward change
+    notifications, periodic scans remain the source of truth.
+    """
+
+    def __init__(self, config: ShareConfig, debounce_seconds: float = 2.0):
+        self.config = config
+        self.debounce_seconds = debounce_seconds
+        self.mount_point = str(Path(config.mount_point))
+        self._exclude = compile_exclude_patterns(config.exclude_patterns)
+        self._libc: ctypes.CDLL | None = None
+        self._fd = -1
+        self._watches: dict[int, str] = {}
+        self._watches_lock = threading.Lock()  # Trees are watched from worker threads
+        self._pending = ChangeSet()
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._wakeup = asyncio.Event()
+
+    async def start(self) -> None:
+        """
+        Create the inotify instance and watch every directory in the share.
+
+        Raises:
+            OSError: If inotify is unavailable or the watch limit is exhausted
+        """
+        self._libc = _load_libc()
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._fd = fd
+
+        for include_path in self.config.include_paths:
+            root = os.path.join(self.mount_point, include_path.lstrip("/"))
+            if await asyncio.to_thread(os.path.isdir, root):
+                await asyncio.to_thread(self._watch_tree, root)
+
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        logger.info(
+            f"Watching share {self.config.name}: {len(self._watches)} directories under inotify"
+        )
+
+    def close(self) -> None:
+        """Stop watching and release the inotify descriptor."""
+        if self._fd < 0:
+            return
+        for task in self._tasks:
+            task.cancel()
+        asyncio.get_running_loop().remove_reader(self._fd)
+        with self._watches_lock:
+            os.close(self._fd)
+            self._fd = -1
+            self._watches.clear()
+
+    async def changes(self) -> AsyncIterator[ChangeSet]:
+        """Yield coalesced change sets until the watcher is closed."""
+        loop = asyncio.get_running_loop()
+        max_delay = self.debounce_seconds * MAX_DELAY_FACTOR
+
+        while self._fd >= 0:
+            await self._wakeup.wait()
+
+            # Wait for a quiet period so bursts collapse into one flush
+            started = loop.time()
+            while loop.time() - started < max_delay:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.debounce_seconds)
+                except TimeoutError:
+                    break
+
+            self._wakeup.clear()
+            change_set, self._pending = self._pending, ChangeSet()
+            if change_set:
+                yield change_set
+
+    def _add_watch(self, directory: str) -> None:
+        assert self._libc is not None
+        with self._watches_lock:
+            if self._fd < 0:
+                raise OSError(f"Watcher of share {self.config.name} is closed")
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"Could not watch {directory}: {os.strerror(errno)}")
+            self._watches[wd] = directory
+
+    def _watch_tree(self, root: str) -> None:
+        """Watch a directory and every non-excluded directory beneath it; blocks on I/O."""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                self._add_watch(directory)
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if self._exclude is not None and self._exclude.match(entry.name):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def _unwatch_tree(self, root: str) -> None:
+        """Drop watches for a directory that moved away, since their paths are stale."""
+        assert self._libc is not None
+        prefix = root + os.sep
+        with self._watches_lock:
+            for wd, directory in list(self._watches.items()):
+                if directory == root or directory.startswith(prefix):
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                    del self._watches[wd]
+
+    async def _watch_new_tree(self, path: str, relative_path: str) -> None:
+        """Watch a directory that appeared, then describe it again in full."""
+        try:
+            await asyncio.to_thread(self._watch_tree, path)
+        except OSError as e:
+            logger.warning(f"{e}; falling back to periodic scans for new files")
+            self._pending.overflowed = True
+        # Files created before their directory was watched produced no events
+        self._pending.deleted.discard(relative_path)
+        self._pending.changed.add(relative_path)
+        self._wakeup.set()
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.mount_point)
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._handle_events(data)
+
+        if self._pending:
+            self._wakeup.set()
+
+    def _handle_events(self, data: bytes) -> None:
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"inotify queue overflowed for share {self.config.name}")
+                self._pending.overflowed = True
+                continue
+
+            if mask & IN_IGNORED:
+                with self._watches_lock:
+                    self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            if self._exclude is not None and self._exclude.match(name):
+                continue
+
+            path = os.path.join(directory, name)
+            relative_path = self._relative(path)
+
+            if mask & DELETED_MASK:
+                if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                    self._unwatch_tree(path)
+                self._pending.changed.discard(relative_path)
+                self._pending.deleted.add(relative_path)
+            elif mask & CHANGED_MASK:
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    task = asyncio.get_running_loop().create_task(
+                        self._watch_new_tree(path, relative_path)
+                    )
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                self._pending.deleted.discard(relative_path)
+                self._pending.changed.add(relative_path)
@@ -0,0 +1,153 @@
+"""Store ACLs once per distinct acl_hash instead of per file
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "005"
+down_revision: str | None = "004"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "acl_set",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("acl_hash", sa.Text(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("tenant_id", "acl_hash", name="uq_acl_set_hash"),
+    )
+
+    op.create_table(
+        "acl_set_entry",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("acl_set_id", sa.UUID(), nullable=False),
+        sa.Column("principal_id", sa.UUID(), nullable=False),
+        sa.Column("rights", sa.Text(), nullable=False),
+        sa.Column("source", sa.Text(), nullable=False),
+        sa.Column("can_read", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["acl_set_id"], ["acl_set.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["principal_id"], ["principal.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_acl_set_entry_set", "acl_set_entry", ["acl_set_id"])
+    op.create_index("ix_acl_set_entry_principal", "acl_set_entry", ["tenant_id", "principal_id"])
+
+    op.add_column("file", sa.Column("acl_set_id", sa.UUID(), nullable=True))
+    op.create_foreign_key("fk_file_acl_set", "file", "acl_set", ["acl_set_id"], ["id"])
+    op.create_index("ix_file_acl_set", "file", ["acl_set_id"])
+
+    # Files whose ACL is not known yet have no acl_hash rather than an empty one
+    op.alter_column("file", "acl_hash", existing_type=sa.Text(), nullable=True)
+    op.execute("UPDATE file SET acl_hash = NULL WHERE acl_hash = ''")
+
+    # One set per distinct ACL, copied from one file that has it
+    op.execute("""
+        CREATE TEMPORARY TABLE acl_set_source ON COMMIT DROP AS
+        SELECT DISTINCT ON (f.tenant_id, f.acl_hash)
+            gen_random_uuid() AS acl_set_id, f.tenant_id, f.acl_hash, f.id AS file_id
+        FROM file f
+        WHERE f.acl_hash IS NOT NULL
+          AND EXISTS (SELECT 1 FROM file_acl_entry e WHERE e.file_id = f.id)
+        ORDER BY f.tenant_id, f.acl_hash, f.id
+    """)
+    op.execute("""
+        INSERT INTO acl_set (id, tenant_id, acl_hash)
+        SELECT acl_set_id, tenant_id, acl_hash FROM acl_set_source
+    """)
+    op.execute("""
+        INSERT INTO acl_set_entry (id, tenant_id, acl_set_id, principal_id, rights, source, can_read)
+        SELECT gen_random_uuid(), e.tenant_id, s.acl_set_id, e.principal_id, e.rights, e.source,
+               true
+        FROM acl_set_source s
+        JOIN file_acl_entry e ON e.file_id = s.file_id
+    """)
+    op.execute("""
+        UPDATE file f SET acl_set_id = s.id
+        FROM acl_set s
+        WHERE s.tenant_id = f.tenant_id AND s.acl_hash = f.acl_hash
+    """)
+
+    op.drop_index("ix_file_effective_access_file", table_name="file_effective_access")
+    op.drop_table("file_effective_access")
+    op.drop_table("file_acl_entry")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "file_acl_entry",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("file_id", sa.UUID(), nullable=False),
+        sa.Column("principal_id", sa.UUID(), nullable=False),
+        sa.Column("rights", sa.Text(), nullable=False),
+        sa.Column("source", sa.Text(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["file_id"], ["file.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["principal_id"], ["principal.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "file_effective_access",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("file_id", sa.UUID(), nullable=False),
+        sa.Column("principal_id", sa.UUID(), nullable=False),
+        sa.Column("can_read", sa.Boolean(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["file_id"], ["file.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["principal_id"], ["principal.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "tenant_id", "file_id", "principal_id", name="uq_file_effective_access"
+        ),
+    )
+    op.create_index(
+        "ix_file_effective_access_file", "file_effective_access", ["tenant_id", "file_id"]
+    )
+
+    op.execute("""
+        INSERT INTO file_acl_entry (id, tenant_id, file_id, principal_id, rights, source)
+        SELECT gen_random_uuid(), f.tenant_id, f.id, e.principal_id, e.rights, e.source
+        FROM file f
+        JOIN acl_set_entry e ON e.acl_set_id = f.acl_set_id
+    """)
+    op.execute("""
+        INSERT INTO file_effective_access (id, tenant_id, file_id, principal_id, can_read)
+        SELECT gen_random_uuid(), f.tenant_id, f.id, e.principal_id, bool_or(e.can_read)
+        FROM file f
+        JOIN acl_set_entry e ON e.acl_set_id = f.acl_set_id
+        GROUP BY f.tenant_id, f.id, e.principal_id
+    """)
+
+    op.execute("UPDATE file SET acl_hash = '' WHERE acl_hash IS NULL")
+    op.alter_column("file", "acl_hash", existing_type=sa.Text(), nullable=False)
+    op.drop_index("ix_file_acl_set", table_name="file")
+    op.drop_constraint("fk_file_acl_set", "file", type_="foreignkey")
+    op.drop_column("file", "acl_set_id")
+    op.drop_index("ix_acl_set_entry_principal", table_name="acl_set_entry")
+    op.drop_index("ix_acl_set_entry_set", table_name="acl_set_entry")
+    op.drop_table("acl_set_entry")
+    op.drop_table("acl_set")
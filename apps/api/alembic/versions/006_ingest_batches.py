@@ -0,0 +1,54 @@
+"""Add the staging table for asynchronous ingest
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "006"
+down_revision: str | None = "005"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_batch",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("agent_id", sa.Text(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "PENDING", "IN_PROGRESS", "SUCCEEDED", "FAILED", name="jobstatus", create_type=False
+            ),
+            nullable=False,
+            server_default="PENDING",
+        ),
+        sa.Column("event_count", sa.Integer(), nullable=False),
+        sa.Column("payload_gzip", sa.LargeBinary(), nullable=True),
+        sa.Column("jobs_created", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_ingest_batch_pending", "ingest_batch", ["status", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ingest_batch_pending", table_name="ingest_batch")
+    op.drop_table("ingest_batch")
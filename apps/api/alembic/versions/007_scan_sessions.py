@@ -0,0 +1,55 @@
+"""Add scan sessions, their matched folders and the content purge job type
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision: str = "007"
+down_revision: str | None = "006"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scan_session",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tenant_id", sa.UUID(), nullable=False),
+        sa.Column("share_id", sa.UUID(), nullable=False),
+        sa.Column("agent_id", sa.Text(), nullable=False),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("files_deleted", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenant.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["share_id"], ["share.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_scan_session_share", "scan_session", ["tenant_id", "share_id"])
+
+    op.create_table(
+        "scan_session_folder",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("scan_session_id", sa.UUID(), nullable=False),
+        sa.Column("path", sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(["scan_session_id"], ["scan_session.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("scan_session_id", "path", name="uq_scan_session_folder_path"),
+    )
+
+    op.execute("ALTER TYPE jobtype ADD VALUE 'PURGE_CONTENT'")
+
+
+def downgrade() -> None:
+    # Postgres cannot drop an enum value; PURGE_CONTENT stays in jobtype
+    op.execute("DELETE FROM job WHERE job_type = 'PURGE_CONTENT'")
+    op.drop_table("scan_session_folder")
+    op.drop_index("ix_scan_session_share", table_name="scan_session")
+    op.drop_table("scan_session")
@@ -1,34 +1,158 @@
+import json
 import logging
-import os
+import zlib
 from datetime import datetime
-from uuid import uuid4
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from pydantic import ValidationError
+from sqlalchemy import delete, func, select, update
 
 from app.auth import TenantContext, get_tenant_context
-from app.models import (
-    File,
-    FileAclEntry,
-    FileEffectiveAccess,
-    FileEvent,
-    FileEventType,
-    Job,
-    JobType,
-    Principal,
-    PrincipalType,
-    Share,
-)
+from app.config import settings
+from app.models import ContentBlob, File, IngestBatch, JobStatus, ScanSession, Share
 from app.schemas import (
-    AclEntryInput,
-    FileEventInput,
+    ContentHashesRequest,
+    ContentHashesResponse,
+    ExtractedTextInput,
+    FolderCompareRequest,
+    FolderCompareResponse,
+    IngestBatchResponse,
     IngestEventsRequest,
     IngestEventsResponse,
+    ReconciledFile,
+    ReconcileRequest,
+    ReconcileResponse,
+    ScanSessionOpenRequest,
+    ScanSessionResponse,
+)
+from app.services.blob_store import store_extracted
+from app.services.extraction import ExtractedDocument
+from app.services.folder_digest import get_folder_digests
+from app.services.ingest import as_utc, ingest_file_events, stage_ingest_batch
+from app.services.scan_sessions import (
+    close_scan_session,
+    open_scan_session,
+    record_matched_folders,
 )
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Compact encoding: a header line with agent_id, a default share and the batch's
+# ACL sets, then one event per line with short field tags. ACL entries, inline
+# or in a set, are positional arrays.
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_TAGS = {
+    "t": "type",
+    "s": "share_name",
+    "p": "relative_path",
+    "z": "size_bytes",
+    "m": "mtime",
+    "f": "file_type",
+    "c": "content_hash",
+    "a": "acl_hash",
+    "e": "acl_entries",
+}
+ACL_ENTRY_FIELDS = (
+    "principal_external_id",
+    "principal_display_name",
+    "principal_type",
+    "rights",
+    "source",
+)
+
+# Upper bound on a decompressed request body, guarding against gzip bombs
+MAX_INGEST_BODY_BYTES = 256 * 1024 * 1024
+
+
+def parse_compact_events(body: bytes) -> IngestEventsRequest:
+    """Decode a compact NDJSON events body into an IngestEventsRequest."""
+    lines = body.splitlines()
+    header = json.loads(lines[0])
+    default_share = header.get("s")
+    acl_sets = {
+        acl_hash: [dict(zip(ACL_ENTRY_FIELDS, entry, strict=True)) for entry in entries]
+        for acl_hash, entries in header.get("A", {}).items()
+    }
+
+    events = []
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+        event = {EVENT_TAGS[tag]: value for tag, value in json.loads(line).items()}
+        event.setdefault("share_name", default_share)
+        if event.get("acl_entries") is not None:
+            event["acl_entries"] = [
+                dict(zip(ACL_ENTRY_FIELDS, entry, strict=True)) for entry in event["acl_entries"]
+            ]
+        events.append(event)
+
+    return IngestEventsRequest.model_validate(
+        {"agent_id": header["agent_id"], "events": events, "acl_sets": acl_sets}
+    )
+
+
+def decompress_gzip(body: bytes) -> bytes:
+    """Decompress a gzip request body, refusing bodies that inflate beyond the limit."""
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    try:
+        body = decompressor.decompress(body, MAX_INGEST_BODY_BYTES)
+    except zlib.error as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid gzip body: {e}",
+        ) from e
+    if decompressor.unconsumed_tail:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Decompressed body too large",
+        )
+    return body
+
+
+async def read_ingest_request(request: Request) -> IngestEventsRequest:
+    """
+    Parse an events body in any supported encoding.
+
+    Accepts plain JSON (IngestEventsRequest) or compact NDJSON, either of
+    which may be gzip-compressed. Anything else gets 415 so agents can fall
+    back to plain JSON.
+    """
+    body = await request.body()
+
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding == "gzip":
+        body = decompress_gzip(body)
+    elif encoding != "identity":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported content encoding: {encoding}",
+        )
+
+    media_type = request.headers.get("content-type", "application/json")
+    media_type = media_type.split(";")[0].strip().lower()
+    try:
+        if media_type == "application/json":
+            return IngestEventsRequest.model_validate_json(body)
+        if media_type == NDJSON_MEDIA_TYPE:
+            return parse_compact_events(body)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False, include_input=False),
+        ) from e
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Malformed events body: {e}",
+        ) from e
+
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail=f"Unsupported content type: {media_type}",
+    )
+
 
 async def get_or_create_share(
     ctx: TenantContext,
@@ -50,260 +174,400 @@ async def get_or_create_share(
     return share
 
 
-async def get_or_create_principal(
-    ctx: TenantContext,
-    external_id: str,
-    display_name: str | None,
-    principal_type: str,
-) -> Principal:
-    """Get or create a principal by external ID."""
-    result = await ctx.session.execute(
-        select(Principal).where(
-            Principal.tenant_id == ctx.tenant_id,
-            Principal.external_id == external_id,
+def prefers_async(prefer: str | None) -> bool:
+    """Whether a Prefer header (RFC 7240) asks for an asynchronous response."""
+    if not prefer:
+        return False
+    return any(
+        preference.split(";")[0].strip().lower() == "respond-async"
+        for preference in prefer.split(",")
+    )
+
+
+def batch_response(batch: IngestBatch) -> IngestBatchResponse:
+    return IngestBatchResponse(
+        batch_id=batch.id,
+        status=batch.status,
+        events=batch.event_count,
+        jobs_created=batch.jobs_created,
+        error=batch.last_error,
+        created_at=batch.created_at,
+        updated_at=batch.updated_at,
+    )
+
+
+@router.post(
+    "/events",
+    response_model=IngestEventsResponse | IngestBatchResponse,
+    responses={status.HTTP_202_ACCEPTED: {"model": IngestBatchResponse}},
+)
+async def ingest_events(
+    response: Response,
+    request: IngestEventsRequest = Depends(read_ingest_request),
+    ctx: TenantContext = Depends(get_tenant_context),
+    prefer: str | None = Header(default=None),
+) -> IngestEventsResponse | IngestBatchResponse:
+    """
+    Ingest file events from an agent.
+    Creates/updates files and schedules extraction jobs as needed.
+
+    Bodies may be JSON or compact NDJSON, optionally gzip-compressed. The
+    batch is applied with a fixed number of set-based statements; events for
+    unknown shares are skipped.
+
+    With "Prefer: respond-async" the validated batch is only staged and 202
+    is returned with its batch id; the ingest worker applies staged batches
+    in order, and GET /batches/{batch_id} reports when it has.
+    """
+    if prefers_async(prefer):
+        batch = await stage_ingest_batch(ctx.session, ctx.tenant_id, request)
+        await ctx.session.commit()
+        logger.info(
+            f"Staged {len(request.events)} events from agent {request.agent_id} as batch {batch.id}"
         )
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Preference-Applied"] = "respond-async"
+        response.headers["Location"] = f"/v0/ingest/batches/{batch.id}"
+        return batch_response(batch)
+
+    total_jobs = await ingest_file_events(
+        ctx.session, ctx.tenant_id, request.events, request.acl_sets
+    )
+    await ctx.session.commit()
+
+    logger.info(
+        f"Processed {len(request.events)} events from agent {request.agent_id}, "
+        f"created {total_jobs} jobs"
+    )
+
+    return IngestEventsResponse(
+        processed=len(request.events),
+        jobs_created=total_jobs,
     )
-    principal = result.scalar_one_or_none()
 
-    if not principal:
-        ptype = (
-            PrincipalType(principal_type)
-            if principal_type in [t.value for t in PrincipalType]
-            else PrincipalType.USER
+
+@router.get("/batches/{batch_id}", response_model=IngestBatchResponse)
+async def get_ingest_batch(
+    batch_id: UUID,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> IngestBatchResponse:
+    """Report the status of a batch staged for asynchronous ingest."""
+    result = await ctx.session.execute(
+        select(IngestBatch).where(
+            IngestBatch.tenant_id == ctx.tenant_id,
+            IngestBatch.id == batch_id,
         )
-        principal = Principal(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            type=ptype,
-            external_id=external_id,
-            display_name=display_name or external_id,
+    )
+    batch = result.scalar_one_or_none()
+    if batch is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingest batch {batch_id} not found",
         )
-        ctx.session.add(principal)
-        await ctx.session.flush()
+    return batch_response(batch)
 
-    return principal
 
-
-async def process_acl_entries(
-    ctx: TenantContext,
-    file: File,
-    acl_entries: list[AclEntryInput],
+@router.delete("/batches/{batch_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def discard_failed_batch(
+    batch_id: UUID,
+    ctx: TenantContext = Depends(get_tenant_context),
 ) -> None:
-    """Process ACL entries for a file - delete old ones and insert new."""
-    # Delete existing ACL entries for this file
-    await ctx.session.execute(delete(FileAclEntry).where(FileAclEntry.file_id == file.id))
+    """
+    Discard a batch that failed for good, acknowledging its events are lost.
+
+    A failed batch keeps its agent's scan sessions from closing, since
+    files it reported would look unseen; discarding it lets them close.
+    Failed batches are not retried, as applying them after newer ones would
+    undo newer changes; the agent's next scan sends the files again.
+    """
+    result = await ctx.session.execute(
+        select(IngestBatch.status).where(
+            IngestBatch.tenant_id == ctx.tenant_id,
+            IngestBatch.id == batch_id,
+        )
+    )
+    batch_status = result.scalar_one_or_none()
+    if batch_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ingest batch {batch_id} not found",
+        )
+    if batch_status != JobStatus.FAILED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Ingest batch {batch_id} is {batch_status.value}; only failed batches "
+            f"can be discarded",
+        )
     await ctx.session.execute(
-        delete(FileEffectiveAccess).where(FileEffectiveAccess.file_id == file.id)
+        delete(IngestBatch).where(
+            IngestBatch.id == batch_id, IngestBatch.status == JobStatus.FAILED
+        )
+    )
+    await ctx.session.commit()
+    logger.warning(f"Discarded failed ingest batch {batch_id}")
+
+
+def scan_response(scan: ScanSession, share_name: str) -> ScanSessionResponse:
+    return ScanSessionResponse(
+        session_id=scan.id,
+        share_name=share_name,
+        started_at=scan.started_at,
+        closed_at=scan.closed_at,
+        files_deleted=scan.files_deleted,
     )
 
-    # Create new ACL entries
-    for entry in acl_entries:
-        principal = await get_or_create_principal(
-            ctx,
-            entry.principal_external_id,
-            entry.principal_display_name,
-            entry.principal_type,
+
+@router.post("/scans", response_model=ScanSessionResponse, status_code=status.HTTP_201_CREATED)
+async def open_scan(
+    request: ScanSessionOpenRequest,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> ScanSessionResponse:
+    """
+    Open a scan session before a full scan of a share.
+
+    Every file the scan reports, that reconcile marks as seen or that lies
+    beneath a folder the session's comparisons matched counts as present;
+    closing the session marks the rest deleted.
+    """
+    share = await get_or_create_share(ctx, request.share_name)
+    scan = await open_scan_session(ctx.session, ctx.tenant_id, share.id, request.agent_id)
+    await ctx.session.commit()
+    logger.info(f"Agent {request.agent_id} opened scan session {scan.id} of share {share.name}")
+    return scan_response(scan, share.name)
+
+
+@router.post("/scans/{session_id}/close", response_model=ScanSessionResponse)
+async def close_scan(
+    session_id: UUID,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> ScanSessionResponse:
+    """
+    Close a scan session once a complete scan's events have all been sent.
+
+    Live files of the share not seen since the session opened are marked
+    deleted with one set-based UPDATE, and the documents of the share's
+    deleted files are queued for purging. Only close sessions of scans that
+    listed the whole share. Closing again returns the first result; 409
+    means batches the session's agent staged for asynchronous ingest during
+    the scan are still pending or have failed. Failed batches must be
+    discarded, see discard_failed_batch, before the session can close.
+    """
+    result = await ctx.session.execute(
+        select(ScanSession, Share.name)
+        .join(Share, Share.id == ScanSession.share_id)
+        .where(ScanSession.tenant_id == ctx.tenant_id, ScanSession.id == session_id)
+        .with_for_update(of=ScanSession)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Scan session {session_id} not found",
         )
+    scan, share_name = row
+    if scan.closed_at is not None:
+        return scan_response(scan, share_name)
 
-        # Create ACL entry
-        acl_entry = FileAclEntry(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            file_id=file.id,
-            principal_id=principal.id,
-            rights=entry.rights,
-            source=entry.source,
+    # Events the agent staged during the scan must be applied first, or their files look
+    # unseen; other agents' batches do not hold the session up
+    result = await ctx.session.execute(
+        select(IngestBatch.status, func.count(IngestBatch.id))
+        .where(
+            IngestBatch.tenant_id == ctx.tenant_id,
+            IngestBatch.agent_id == scan.agent_id,
+            IngestBatch.created_at >= scan.started_at,
+            IngestBatch.status.in_([JobStatus.PENDING, JobStatus.FAILED]),
         )
-        ctx.session.add(acl_entry)
-
-        # Create effective access (for v0, anyone with any rights can read)
-        effective = FileEffectiveAccess(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            file_id=file.id,
-            principal_id=principal.id,
-            can_read=True,
+        .group_by(IngestBatch.status)
+    )
+    staged = dict(result.tuples().all())
+    if staged.get(JobStatus.FAILED):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{staged[JobStatus.FAILED]} ingest batches staged during this scan failed; "
+            f"discard them with DELETE /v0/ingest/batches/{{batch_id}} to close the session",
+        )
+    if staged.get(JobStatus.PENDING):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{staged[JobStatus.PENDING]} staged ingest batches are not applied yet; "
+            f"retry later",
         )
-        ctx.session.add(effective)
 
+    await close_scan_session(ctx.session, scan)
+    await ctx.session.commit()
+    return scan_response(scan, share_name)
 
-async def process_file_event(
-    ctx: TenantContext,
-    event: FileEventInput,
-) -> int:
-    """
-    Process a single file event and return number of jobs created.
+
+@router.post("/reconcile", response_model=ReconcileResponse)
+async def reconcile_files(
+    request: ReconcileRequest,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> ReconcileResponse:
     """
-    jobs_created = 0
-    share = await get_or_create_share(ctx, event.share_name)
-    now = datetime.utcnow()
+    Compare an agent's file metadata with the files already recorded.
 
-    # Look for existing file
+    Lets an agent without local state learn which files it must hash and
+    send: entries are classified as new or changed by path, size and mtime,
+    and unchanged ones are returned with the recorded hashes so the agent
+    can adopt them. Unchanged files are marked as seen.
+    """
+    share = await get_or_create_share(ctx, request.share_name)
     result = await ctx.session.execute(
-        select(File).where(
+        select(
+            File.id,
+            File.relative_path,
+            File.size_bytes,
+            File.mtime,
+            File.content_hash,
+            File.acl_hash,
+            File.deleted,
+        ).where(
             File.tenant_id == ctx.tenant_id,
             File.share_id == share.id,
-            File.relative_path == event.relative_path,
+            File.relative_path.in_([entry.relative_path for entry in request.entries]),
         )
     )
-    existing_file = result.scalar_one_or_none()
-
-    if event.type == FileEventType.FILE_DELETED:
-        if existing_file:
-            existing_file.deleted = True
-            existing_file.last_seen_at = now
-            # Record event
-            file_event = FileEvent(
-                id=uuid4(),
-                tenant_id=ctx.tenant_id,
-                file_id=existing_file.id,
-                share_id=share.id,
-                event_type=event.type,
-                payload={"relative_path": event.relative_path},
-            )
-            ctx.session.add(file_event)
-        return 0
-
-    # FILE_DISCOVERED or FILE_MODIFIED
-    if not existing_file:
-        # New file
-        file = File(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            share_id=share.id,
-            relative_path=event.relative_path,
-            name=os.path.basename(event.relative_path),
-            size_bytes=event.size_bytes or 0,
-            mtime=event.mtime or now,
-            file_type=event.file_type or "application/octet-stream",
-            content_hash=event.content_hash or "",
-            acl_hash=event.acl_hash or "",
-            last_seen_at=now,
-            deleted=False,
-        )
-        ctx.session.add(file)
-        await ctx.session.flush()
-
-        # Process ACLs
-        if event.acl_entries:
-            await process_acl_entries(ctx, file, event.acl_entries)
-
-        # Record event
-        file_event = FileEvent(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            file_id=file.id,
-            share_id=share.id,
-            event_type=event.type,
-            payload={
-                "relative_path": event.relative_path,
-                "size_bytes": event.size_bytes,
-                "file_type": event.file_type,
-            },
-        )
-        ctx.session.add(file_event)
-
-        # Create extraction job
-        job = Job(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            job_type=JobType.EXTRACT_CONTENT,
-            file_id=file.id,
-        )
-        ctx.session.add(job)
-        jobs_created = 1
-
-    else:
-        # Existing file - check for changes
-        content_changed = event.content_hash and event.content_hash != existing_file.content_hash
-        acl_changed = event.acl_hash and event.acl_hash != existing_file.acl_hash
-
-        if not content_changed and not acl_changed:
-            # No changes, just update last_seen
-            existing_file.last_seen_at = now
-            existing_file.deleted = False
-            return 0
-
-        # Update file metadata
-        if event.size_bytes is not None:
-            existing_file.size_bytes = event.size_bytes
-        if event.mtime is not None:
-            existing_file.mtime = event.mtime
-        if event.file_type is not None:
-            existing_file.file_type = event.file_type
-        if event.content_hash is not None:
-            existing_file.content_hash = event.content_hash
-        if event.acl_hash is not None:
-            existing_file.acl_hash = event.acl_hash
-        existing_file.last_seen_at = now
-        existing_file.deleted = False
-
-        # Determine event type
-        if content_changed:
-            recorded_type = FileEventType.FILE_MODIFIED
+    recorded = {row.relative_path: row for row in result}
+
+    new, changed, unchanged, seen_ids = [], [], [], []
+    for entry in request.entries:
+        row = recorded.get(entry.relative_path)
+        if row is None or row.deleted:
+            new.append(entry.relative_path)
+        elif (
+            not row.content_hash
+            or row.size_bytes != entry.size_bytes
+            or as_utc(row.mtime) != as_utc(entry.mtime)
+        ):
+            changed.append(entry.relative_path)
         else:
-            recorded_type = FileEventType.ACL_CHANGED
-
-        # Process ACLs if changed
-        if acl_changed and event.acl_entries:
-            await process_acl_entries(ctx, existing_file, event.acl_entries)
-
-        # Record event
-        file_event = FileEvent(
-            id=uuid4(),
-            tenant_id=ctx.tenant_id,
-            file_id=existing_file.id,
-            share_id=share.id,
-            event_type=recorded_type,
-            payload={
-                "relative_path": event.relative_path,
-                "content_changed": content_changed,
-                "acl_changed": acl_changed,
-            },
-        )
-        ctx.session.add(file_event)
-
-        # Create extraction job only if content changed
-        if content_changed:
-            job = Job(
-                id=uuid4(),
-                tenant_id=ctx.tenant_id,
-                job_type=JobType.EXTRACT_CONTENT,
-                file_id=existing_file.id,
+            unchanged.append(
+                ReconciledFile(
+                    relative_path=entry.relative_path,
+                    content_hash=row.content_hash,
+                    acl_hash=row.acl_hash,
+                )
             )
-            ctx.session.add(job)
-            jobs_created = 1
+            seen_ids.append(row.id)
 
-    return jobs_created
+    if seen_ids:
+        await ctx.session.execute(
+            update(File).where(File.id.in_(seen_ids)).values(last_seen_at=datetime.utcnow())
+        )
+    await ctx.session.commit()
 
+    logger.info(
+        f"Reconciled {len(request.entries)} files from agent {request.agent_id}: "
+        f"{len(new)} new, {len(changed)} changed, {len(unchanged)} unchanged"
+    )
 
-@router.post("/events", response_model=IngestEventsResponse)
-async def ingest_events(
-    request: IngestEventsRequest,
+    return ReconcileResponse(new=new, changed=changed, unchanged=unchanged)
+
+
+@router.post("/folders/compare", response_model=FolderCompareResponse)
+async def compare_folders(
+    request: FolderCompareRequest,
     ctx: TenantContext = Depends(get_tenant_context),
-) -> IngestEventsResponse:
+) -> FolderCompareResponse:
     """
-    Ingest file events from an agent.
-    Creates/updates files and schedules extraction jobs as needed.
+    Compare an agent's folder digests with those of the recorded files.
+
+    A folder digest covers every file beneath it, so agents compare top-down
+    and only descend into folders reported as different. With a scan
+    session, matching folders are recorded for it and their files count as
+    seen when it closes, as if the agent had sent them.
     """
-    total_jobs = 0
+    share = await get_or_create_share(ctx, request.share_name)
+    scan = None
+    if request.scan_session_id is not None:
+        scan = await ctx.session.get(ScanSession, request.scan_session_id)
+        if scan is None or scan.tenant_id != ctx.tenant_id or scan.share_id != share.id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Scan session {request.scan_session_id} of share {share.name} not found",
+            )
+        if scan.closed_at is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Scan session {scan.id} is already closed",
+            )
 
-    for event in request.events:
-        try:
-            jobs = await process_file_event(ctx, event)
-            total_jobs += jobs
-        except Exception as e:
-            logger.exception(f"Error processing event for {event.relative_path}: {e}")
-            # Continue processing other events
+    recorded = await get_folder_digests(
+        ctx.session, ctx.tenant_id, share.id, [folder.path for folder in request.folders]
+    )
 
+    different = []
+    matched = []
+    for folder in request.folders:
+        if recorded.get(folder.path) == (int(folder.digest, 16), folder.file_count):
+            matched.append(folder.path)
+        else:
+            different.append(folder.path)
+    if scan is not None:
+        await record_matched_folders(ctx.session, scan, matched)
     await ctx.session.commit()
 
     logger.info(
-        f"Processed {len(request.events)} events from agent {request.agent_id}, "
-        f"created {total_jobs} jobs"
+        f"Compared {len(request.folders)} folders from agent {request.agent_id}: "
+        f"{len(different)} different"
     )
 
-    return IngestEventsResponse(
-        processed=len(request.events),
-        jobs_created=total_jobs,
+    return FolderCompareResponse(different=different)
+
+
+@router.post("/content/missing", response_model=ContentHashesResponse)
+async def find_missing_content(
+    request: ContentHashesRequest,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> ContentHashesResponse:
+    """
+    Return the content hashes for which no extracted text is stored yet.
+
+    Uploads are kept in the blob store; without it none are wanted.
+    """
+    if not settings.blob_store_enabled:
+        return ContentHashesResponse(content_hashes=[])
+    result = await ctx.session.execute(
+        select(ContentBlob.content_hash).where(
+            ContentBlob.tenant_id == ctx.tenant_id,
+            ContentBlob.content_hash.in_(request.content_hashes),
+        )
+    )
+    uploaded = set(result.scalars())
+    return ContentHashesResponse(
+        content_hashes=[h for h in dict.fromkeys(request.content_hashes) if h not in uploaded]
+    )
+
+
+@router.put("/content/{content_hash}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_extracted_text(
+    content_hash: str,
+    request: Request,
+    ctx: TenantContext = Depends(get_tenant_context),
+) -> None:
+    """
+    Store text an agent extracted from files with the given content hash.
+
+    The body is ExtractedTextInput as JSON, optionally gzip-compressed.
+    The text goes to the blob store, where extraction jobs for any file
+    with this content hash find it instead of reading the share.
+    """
+    body = await request.body()
+    if request.headers.get("content-encoding", "identity").strip().lower() == "gzip":
+        body = decompress_gzip(body)
+    try:
+        extracted = ExtractedTextInput.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False, include_context=False, include_input=False),
+        ) from e
+
+    await store_extracted(
+        ctx.session,
+        ctx.tenant_id,
+        content_hash,
+        ExtractedDocument(title=extracted.title, text=extracted.text),
     )
+    await ctx.session.commit()
@@ -68,7 +68,10 @@ async def find_sensitive_content(
         .join(DocumentExposure, DocumentExposure.document_id == Document.id)
         .join(File, File.id == Document.file_id)
         .join(Share, Share.id == File.share_id)
-        .where(Document.tenant_id == ctx.tenant_id)
+        .where(
+            Document.tenant_id == ctx.tenant_id,
+            File.deleted == False,  # noqa: E712
+        )
     )
 
     # Apply scope filters
@@ -163,6 +166,7 @@ async def search_chunks(
         .where(
             Chunk.tenant_id == ctx.tenant_id,
             Chunk.text.ilike(search_term),
+            File.deleted == False,  # noqa: E712
         )
     )
 
@@ -214,25 +218,38 @@ async def get_dashboard_metrics(
     )
     total_files = result.scalar() or 0
 
-    # Total documents
+    # Total documents, like everything below counting only those of live files
     result = await ctx.session.execute(
-        select(func.count(Document.id)).where(Document.tenant_id == ctx.tenant_id)
+        select(func.count(Document.id))
+        .join(File, File.id == Document.file_id)
+        .where(
+            Document.tenant_id == ctx.tenant_id,
+            File.deleted == False,  # noqa: E712
+        )
     )
     total_documents = result.scalar() or 0
 
     # Documents with findings
     result = await ctx.session.execute(
-        select(func.count(func.distinct(SensitivityFinding.document_id))).where(
-            SensitivityFinding.tenant_id == ctx.tenant_id
+        select(func.count(func.distinct(SensitivityFinding.document_id)))
+        .join(Document, Document.id == SensitivityFinding.document_id)
+        .join(File, File.id == Document.file_id)
+        .where(
+            SensitivityFinding.tenant_id == ctx.tenant_id,
+            File.deleted == False,  # noqa: E712
         )
     )
     documents_with_findings = result.scalar() or 0
 
     # High exposure documents
     result = await ctx.session.execute(
-        select(func.count(DocumentExposure.id)).where(
+        select(func.count(DocumentExposure.id))
+        .join(Document, Document.id == DocumentExposure.document_id)
+        .join(File, File.id == Document.file_id)
+        .where(
             DocumentExposure.tenant_id == ctx.tenant_id,
             DocumentExposure.exposure_level == "HIGH",
+            File.deleted == False,  # noqa: E712
         )
     )
     high_exposure_documents = result.scalar() or 0
@@ -243,7 +260,12 @@ async def get_dashboard_metrics(
             SensitivityFinding.sensitivity_type,
             func.count(SensitivityFinding.id),
         )
-        .where(SensitivityFinding.tenant_id == ctx.tenant_id)
+        .join(Document, Document.id == SensitivityFinding.document_id)
+        .join(File, File.id == Document.file_id)
+        .where(
+            SensitivityFinding.tenant_id == ctx.tenant_id,
+            File.deleted == False,  # noqa: E712
+        )
         .group_by(SensitivityFinding.sensitivity_type)
     )
     findings_by_type = {row[0].value: row[1] for row in result.fetchall()}
@@ -254,7 +276,12 @@ async def get_dashboard_metrics(
             DocumentExposure.exposure_level,
             func.count(DocumentExposure.id),
         )
-        .where(DocumentExposure.tenant_id == ctx.tenant_id)
+        .join(Document, Document.id == DocumentExposure.document_id)
+        .join(File, File.id == Document.file_id)
+        .where(
+            DocumentExposure.tenant_id == ctx.tenant_id,
+            File.deleted == False,  # noqa: E712
+        )
         .group_by(DocumentExposure.exposure_level)
     )
     documents_by_exposure = {row[0].value: row[1] for row in result.fetchall()}
@@ -361,6 +388,7 @@ async def search_chunks_v0(
         .where(
             Chunk.tenant_id == ctx.tenant_id,
             Chunk.text.ilike(search_term),
+            File.deleted == False,  # noqa: E712
         )
     )
 
@@ -604,6 +632,7 @@ async def answer_with_evidence(
         .where(
             Chunk.tenant_id == ctx.tenant_id,
             Chunk.text.ilike(search_term),
+            File.deleted == False,  # noqa: E712
         )
     )
 
@@ -18,6 +18,22 @@ class Settings(BaseSettings):
     worker_poll_interval_seconds: float = 2.0
     worker_max_attempts: int = 3
 
+    # Staged ingest batches of one tenant the ingest worker applies together
+    ingest_worker_max_batches: int = 20
+
+    # Principal IDs cached per API process for ACL ingest, by tenant and external ID
+    principal_cache_size: int = 100000
+
+    # Content-addressed store of extracted text, keyed by content hash
+    blob_store_enabled: bool = True
+    blob_store_path: str = "/var/lib/topos/blobs"
+    blob_store_compression_level: int = 6
+    # Unreferenced blobs, e.g. uploaded text no job has used yet, are kept this long
+    blob_store_unused_hours: float = 168.0
+    blob_store_sweep_interval_seconds: float = 3600.0
+    # Blob files without an index row, e.g. from rolled-back stores, are looked for this often
+    blob_store_orphan_sweep_interval_seconds: float = 86400.0
+
     # Broad groups for exposure calculation
     broad_group_names: list[str] = [
         "Domain Users",
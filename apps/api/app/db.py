@@ -1,4 +1,5 @@
 from collections.abc import AsyncGenerator
+from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
@@ -20,3 +21,8 @@ async_session_factory = async_sessionmaker(
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_factory() as session:
         yield session
+
+
+def advisory_lock_key(value: UUID) -> int:
+    """Postgres advisory lock key of a row ID, e.g. to serialise work on one tenant or share."""
+    return int.from_bytes(value.bytes[:8], "big", signed=True)
@@ -12,6 +12,8 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
+    Numeric,
     Text,
     UniqueConstraint,
 )
@@ -60,6 +62,7 @@ class JobType(str, enum.Enum):
     CLASSIFY_DOCUMENT = "CLASSIFY_DOCUMENT"
     EXTRACT_SEMANTICS = "EXTRACT_SEMANTICS"
     COMPUTE_DIFF = "COMPUTE_DIFF"
+    PURGE_CONTENT = "PURGE_CONTENT"
 
 
 class DocType(str, enum.Enum):
@@ -167,7 +170,8 @@ class File(Base):
     mtime: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     file_type: Mapped[str] = mapped_column(Text, nullable=False)
     content_hash: Mapped[str] = mapped_column(Text, nullable=False)
-    acl_hash: Mapped[str] = mapped_column(Text, nullable=False)
+    acl_hash: Mapped[str | None] = mapped_column(Text, nullable=True)
+    acl_set_id: Mapped[UUID | None] = mapped_column(ForeignKey("acl_set.id"), nullable=True)
     last_seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     created_at: Mapped[datetime] = mapped_column(
@@ -177,17 +181,96 @@ class File(Base):
     __table_args__ = (
         UniqueConstraint("tenant_id", "share_id", "relative_path", name="uq_file_path"),
         Index("ix_file_tenant_share", "tenant_id", "share_id"),
+        Index("ix_file_acl_set", "acl_set_id"),
     )
 
     # Relationships
     share: Mapped["Share"] = relationship(back_populates="files")
-    acl_entries: Mapped[list["FileAclEntry"]] = relationship(
-        back_populates="file", cascade="all, delete"
+    acl_set: Mapped["AclSet | None"] = relationship()
+    documents: Mapped[list["Document"]] = relationship(back_populates="file", cascade="all, delete")
+
+
+class ScanSession(Base):
+    """A full scan of a share by an agent; closing it marks files the scan did not see deleted."""
+
+    __tablename__ = "scan_session"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
     )
-    effective_access: Mapped[list["FileEffectiveAccess"]] = relationship(
-        back_populates="file", cascade="all, delete"
+    share_id: Mapped[UUID] = mapped_column(
+        ForeignKey("share.id", ondelete="CASCADE"), nullable=False
     )
-    documents: Mapped[list["Document"]] = relationship(back_populates="file", cascade="all, delete")
+    agent_id: Mapped[str] = mapped_column(Text, nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    files_deleted: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    __table_args__ = (Index("ix_scan_session_share", "tenant_id", "share_id"),)
+
+
+class ScanSessionFolder(Base):
+    """A folder whose digest matched during a scan session, so its files count as seen."""
+
+    __tablename__ = "scan_session_folder"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    scan_session_id: Mapped[UUID] = mapped_column(
+        ForeignKey("scan_session.id", ondelete="CASCADE"), nullable=False
+    )
+    path: Mapped[str] = mapped_column(Text, nullable=False)  # "" for the share root
+
+    __table_args__ = (
+        UniqueConstraint("scan_session_id", "path", name="uq_scan_session_folder_path"),
+    )
+
+
+class FolderDigest(Base):
+    """Digest of the live files beneath a folder of a share, compared with agents' digests."""
+
+    __tablename__ = "folder_digest"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
+    )
+    share_id: Mapped[UUID] = mapped_column(
+        ForeignKey("share.id", ondelete="CASCADE"), nullable=False
+    )
+    path: Mapped[str] = mapped_column(Text, nullable=False)  # Relative to the share, "" for root
+    digest: Mapped[int] = mapped_column(Numeric(78, 0), nullable=False)  # Sum mod 2**256
+    file_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=datetime.utcnow
+    )
+
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "share_id", "path", name="uq_folder_digest_path"),
+    )
+
+
+class ContentBlob(Base):
+    """Index entry of a blob kept in the server's content-addressed store."""
+
+    __tablename__ = "content_blob"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
+    )
+    content_hash: Mapped[str] = mapped_column(Text, nullable=False)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)  # Before compression
+    stored_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)  # On disk
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Current documents
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=datetime.utcnow
+    )
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=datetime.utcnow
+    )
+
+    __table_args__ = (UniqueConstraint("tenant_id", "content_hash", name="uq_content_blob_hash"),)
 
 
 # ============================================================================
@@ -241,46 +324,52 @@ class GroupMembership(Base):
     )
 
 
-class FileAclEntry(Base):
-    __tablename__ = "file_acl_entry"
+class AclSet(Base):
+    """A distinct ACL, stored once per tenant and acl_hash and shared by every file with it."""
+
+    __tablename__ = "acl_set"
 
     id: Mapped[UUID] = mapped_column(primary_key=True)
     tenant_id: Mapped[UUID] = mapped_column(
         ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
     )
-    file_id: Mapped[UUID] = mapped_column(ForeignKey("file.id", ondelete="CASCADE"), nullable=False)
-    principal_id: Mapped[UUID] = mapped_column(ForeignKey("principal.id"), nullable=False)
-    rights: Mapped[str] = mapped_column(Text, nullable=False)  # 'R', 'RW', 'FULL'
-    source: Mapped[str] = mapped_column(Text, nullable=False)  # 'FILE' | 'INHERITED'
+    acl_hash: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, default=datetime.utcnow
     )
 
+    __table_args__ = (UniqueConstraint("tenant_id", "acl_hash", name="uq_acl_set_hash"),)
+
     # Relationships
-    file: Mapped["File"] = relationship(back_populates="acl_entries")
+    entries: Mapped[list["AclSetEntry"]] = relationship(
+        back_populates="acl_set", cascade="all, delete"
+    )
+
 
+class AclSetEntry(Base):
+    """One ACL entry of a set, with the read access it grants."""
 
-class FileEffectiveAccess(Base):
-    __tablename__ = "file_effective_access"
+    __tablename__ = "acl_set_entry"
 
     id: Mapped[UUID] = mapped_column(primary_key=True)
     tenant_id: Mapped[UUID] = mapped_column(
         ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
     )
-    file_id: Mapped[UUID] = mapped_column(ForeignKey("file.id", ondelete="CASCADE"), nullable=False)
+    acl_set_id: Mapped[UUID] = mapped_column(
+        ForeignKey("acl_set.id", ondelete="CASCADE"), nullable=False
+    )
     principal_id: Mapped[UUID] = mapped_column(ForeignKey("principal.id"), nullable=False)
+    rights: Mapped[str] = mapped_column(Text, nullable=False)  # 'R', 'RW', 'FULL'
+    source: Mapped[str] = mapped_column(Text, nullable=False)  # 'FILE' | 'INHERITED'
     can_read: Mapped[bool] = mapped_column(Boolean, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, default=datetime.utcnow
-    )
 
     __table_args__ = (
-        UniqueConstraint("tenant_id", "file_id", "principal_id", name="uq_file_effective_access"),
-        Index("ix_file_effective_access_file", "tenant_id", "file_id"),
+        Index("ix_acl_set_entry_set", "acl_set_id"),
+        Index("ix_acl_set_entry_principal", "tenant_id", "principal_id"),
     )
 
     # Relationships
-    file: Mapped["File"] = relationship(back_populates="effective_access")
+    acl_set: Mapped["AclSet"] = relationship(back_populates="entries")
 
 
 # ============================================================================
@@ -477,6 +566,35 @@ class Job(Base):
     __table_args__ = (Index("ix_job_pending", "status", "created_at"),)
 
 
+class IngestBatch(Base):
+    """An agent's event batch accepted for asynchronous ingest, applied by IngestWorker."""
+
+    __tablename__ = "ingest_batch"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True)
+    tenant_id: Mapped[UUID] = mapped_column(
+        ForeignKey("tenant.id", ondelete="CASCADE"), nullable=False
+    )
+    agent_id: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[JobStatus] = mapped_column(
+        Enum(JobStatus), nullable=False, default=JobStatus.PENDING
+    )
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Gzipped IngestEventsRequest JSON, cleared once the batch is applied
+    payload_gzip: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    jobs_created: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=datetime.utcnow
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    __table_args__ = (Index("ix_ingest_batch_pending", "status", "created_at"),)
+
+
 class FileEvent(Base):
     __tablename__ = "file_event"
 
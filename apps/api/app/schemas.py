@@ -3,7 +3,13 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field
 
-from app.models import ExposureLevel, FileEventType, SensitivityLevel, SensitivityType
+from app.models import (
+    ExposureLevel,
+    FileEventType,
+    JobStatus,
+    SensitivityLevel,
+    SensitivityType,
+)
 
 # ============================================================================
 # Admin Schemas
@@ -77,6 +83,8 @@ class FileEventInput(BaseModel):
 class IngestEventsRequest(BaseModel):
     agent_id: str
     events: list[FileEventInput]
+    # Distinct ACLs of the batch keyed by acl_hash; events referencing one may omit acl_entries
+    acl_sets: dict[str, list[AclEntryInput]] = Field(default_factory=dict)
 
 
 class IngestEventsResponse(BaseModel):
@@ -84,6 +92,87 @@ class IngestEventsResponse(BaseModel):
     jobs_created: int
 
 
+class IngestBatchResponse(BaseModel):
+    """A batch accepted for asynchronous ingest and how far it has got."""
+
+    batch_id: UUID
+    status: JobStatus
+    events: int
+    jobs_created: int | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class ScanSessionOpenRequest(BaseModel):
+    agent_id: str
+    share_name: str
+
+
+class ScanSessionResponse(BaseModel):
+    session_id: UUID
+    share_name: str
+    started_at: datetime
+    closed_at: datetime | None = None
+    files_deleted: int | None = None  # Files the scan did not see, marked deleted on close
+
+
+class ReconcileEntry(BaseModel):
+    relative_path: str
+    size_bytes: int
+    mtime: datetime
+
+
+class ReconcileRequest(BaseModel):
+    agent_id: str
+    share_name: str
+    entries: list[ReconcileEntry] = Field(max_length=10000)
+
+
+class ReconciledFile(BaseModel):
+    relative_path: str
+    content_hash: str
+    acl_hash: str | None
+
+
+class ReconcileResponse(BaseModel):
+    new: list[str]  # Paths the API has no live record of
+    changed: list[str]  # Paths whose size or mtime differ from the API's record
+    unchanged: list[ReconciledFile]  # Matching paths, with the hashes the API holds
+
+
+class ContentHashesRequest(BaseModel):
+    content_hashes: list[str] = Field(max_length=10000)
+
+
+class ContentHashesResponse(BaseModel):
+    content_hashes: list[str]
+
+
+class ExtractedTextInput(BaseModel):
+    title: str
+    text: str
+
+
+class FolderDigestInput(BaseModel):
+    path: str  # Relative to the share, "" for the root
+    # 256-bit hex digest of every file beneath the folder
+    digest: str = Field(pattern=r"^[0-9a-fA-F]{64}$")
+    file_count: int
+
+
+class FolderCompareRequest(BaseModel):
+    agent_id: str
+    share_name: str
+    folders: list[FolderDigestInput] = Field(max_length=10000)
+    # Open scan session of the share; matching folders' files count as seen by it
+    scan_session_id: UUID | None = None
+
+
+class FolderCompareResponse(BaseModel):
+    different: list[str]  # Folders whose files differ; the others are unchanged
+
+
 # ============================================================================
 # Query Schemas
 # ============================================================================
@@ -0,0 +1,298 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import zlib
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import advisory_lock_key
+from app.models import ContentBlob
+from app.services.extraction import ExtractedDocument
+
+logger = logging.getLogger(__name__)
+
+# Blob index rows removed per statement by sweep_blobs
+SWEEP_BATCH_SIZE = 1000
+
+
+class BlobStore:
+    """
+    Content-addressed store of compressed blobs on local disk.
+
+    Blobs are keyed by tenant and content hash and spread over two levels of
+    directories. Writes go to a temporary file that is renamed into place,
+    so readers never see a partial blob and concurrent writers of the same
+    content are harmless. The database keeps an index of stored blobs with
+    reference counts; see store_extracted, add_reference, sweep_blobs and
+    sweep_orphan_files.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def name(content_hash: str) -> str:
+        """File name of a blob; content hashes are re-hashed so any string is a safe name."""
+        return hashlib.sha256(content_hash.encode()).hexdigest()
+
+    def path(self, tenant_id: UUID, content_hash: str) -> str:
+        """Location of a blob."""
+        name = self.name(content_hash)
+        return os.path.join(self.root, str(tenant_id), name[:2], name[2:4], f"{name}.z")
+
+    def read(self, tenant_id: UUID, content_hash: str) -> bytes | None:
+        """Return a blob's contents, or None if it is not stored here."""
+        try:
+            with open(self.path(tenant_id, content_hash), "rb") as f:
+                return zlib.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def write(self, tenant_id: UUID, content_hash: str, data: bytes) -> int:
+        """Store a blob, returning its compressed size."""
+        compressed = zlib.compress(data, settings.blob_store_compression_level)
+        self.write_compressed(tenant_id, content_hash, compressed)
+        return len(compressed)
+
+    def write_compressed(self, tenant_id: UUID, content_hash: str, compressed: bytes) -> None:
+        """Store a blob already compressed with zlib."""
+        path = self.path(tenant_id, content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, tenant_id: UUID, content_hash: str) -> None:
+        """Remove a blob if present."""
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path(tenant_id, content_hash))
+
+    def iter_files(self, modified_before: float) -> Iterator[tuple[UUID, str]]:
+        """
+        Yield (tenant_id, path) of blob and temporary files not modified since a time.
+
+        Args:
+            modified_before: Unix timestamp; newer files are skipped
+
+        Returns:
+            Iterator over files in no particular order
+        """
+        for tenant_dir in os.scandir(self.root) if os.path.isdir(self.root) else ():
+            try:
+                tenant_id = UUID(tenant_dir.name)
+            except ValueError:
+                continue
+            for dirpath, _dirnames, filenames in os.walk(tenant_dir.path):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        if os.stat(path).st_mtime < modified_before:
+                            yield tenant_id, path
+                    except FileNotFoundError:
+                        continue
+
+
+def blob_lock_key(tenant_id: UUID, name: str) -> int:
+    """Advisory lock key of a blob file, see BlobStore.name."""
+    return advisory_lock_key(tenant_id) ^ int.from_bytes(
+        bytes.fromhex(name[:16]), "big", signed=True
+    )
+
+
+blob_store = BlobStore(settings.blob_store_path)
+
+
+async def load_extracted(
+    session: AsyncSession,
+    tenant_id: UUID,
+    content_hash: str,
+) -> ExtractedDocument | None:
+    """Return previously extracted text for a content hash, if the store has it."""
+    if not settings.blob_store_enabled or not content_hash:
+        return None
+    data = await asyncio.to_thread(blob_store.read, tenant_id, content_hash)
+    if data is None:
+        return None
+
+    await session.execute(
+        update(ContentBlob)
+        .where(ContentBlob.tenant_id == tenant_id, ContentBlob.content_hash == content_hash)
+        .values(last_used_at=datetime.utcnow())
+    )
+    return ExtractedDocument.model_validate_json(data)
+
+
+async def store_extracted(
+    session: AsyncSession,
+    tenant_id: UUID,
+    content_hash: str,
+    extracted: ExtractedDocument,
+) -> None:
+    """
+    Keep extracted text for a content hash so it is never parsed again.
+
+    Used for text extracted here and text uploaded by agents alike; storing
+    the same content again only refreshes it.
+
+    The blob's advisory lock, then its index row, are locked before the file
+    is written and until the transaction ends, so neither sweep_blobs nor
+    sweep_orphan_files can unlink the file under a store. If the transaction
+    rolls back, a newly written file is left without a row until
+    sweep_orphan_files removes it.
+    """
+    if not settings.blob_store_enabled or not content_hash:
+        return
+    data = extracted.model_dump_json().encode()
+    compressed = await asyncio.to_thread(zlib.compress, data, settings.blob_store_compression_level)
+    stored_bytes = len(compressed)
+    await session.execute(
+        select(func.pg_advisory_xact_lock(blob_lock_key(tenant_id, blob_store.name(content_hash))))
+    )
+
+    now = datetime.utcnow()
+    stmt = insert(ContentBlob).values(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        content_hash=content_hash,
+        size_bytes=len(data),
+        stored_bytes=stored_bytes,
+        refcount=0,
+        created_at=now,
+        last_used_at=now,
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            constraint="uq_content_blob_hash",
+            set_={"stored_bytes": stored_bytes, "last_used_at": now},
+        )
+    )
+    await asyncio.to_thread(blob_store.write_compressed, tenant_id, content_hash, compressed)
+
+
+async def add_reference(
+    session: AsyncSession,
+    tenant_id: UUID,
+    content_hash: str,
+    delta: int,
+) -> None:
+    """
+    Adjust how many files' current documents use a stored blob.
+
+    Blobs left without references are removed later by sweep_blobs, once
+    the change is committed and they stayed unused for a while. Hashes
+    that were never stored are ignored.
+    """
+    if not settings.blob_store_enabled or not content_hash:
+        return
+    await session.execute(
+        update(ContentBlob)
+        .where(ContentBlob.tenant_id == tenant_id, ContentBlob.content_hash == content_hash)
+        .values(refcount=ContentBlob.refcount + delta, last_used_at=datetime.utcnow())
+    )
+
+
+async def sweep_blobs(session: AsyncSession) -> int:
+    """
+    Remove blobs unreferenced and unused for settings.blob_store_unused_hours.
+
+    Uploaded text waits unreferenced until extraction jobs use it, hence the
+    grace period. Files are unlinked while the deleted rows are still locked,
+    so a concurrent store_extracted of the same content waits for the commit
+    and then writes its file again. If the commit fails, the rows are kept
+    without files, which is only a cache miss until they are swept again.
+
+    Returns:
+        Number of blobs removed
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=settings.blob_store_unused_hours)
+    unused = (
+        select(ContentBlob.id)
+        .where(ContentBlob.refcount <= 0, ContentBlob.last_used_at < cutoff)
+        .limit(SWEEP_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    removed = 0
+    while True:
+        result = await session.execute(
+            delete(ContentBlob)
+            .where(ContentBlob.id.in_(unused.scalar_subquery()), ContentBlob.refcount <= 0)
+            .returning(ContentBlob.tenant_id, ContentBlob.content_hash)
+        )
+        blobs = result.all()
+        for tenant_id, content_hash in blobs:
+            await asyncio.to_thread(blob_store.delete, tenant_id, content_hash)
+        await session.commit()
+        if not blobs:
+            return removed
+
+        removed += len(blobs)
+        logger.info(f"Removed {len(blobs)} unreferenced blobs")
+
+
+async def sweep_orphan_files(session: AsyncSession) -> int:
+    """
+    Remove blob files without an index row, e.g. left by rolled-back stores.
+
+    Only files unmodified for settings.blob_store_unused_hours are candidates.
+    Each is unlinked under its advisory lock after checking that it was not
+    rewritten since it was listed, so a store in progress or committed since
+    the index was read keeps its file. Abandoned temporary files are removed
+    as well.
+
+    Returns:
+        Number of files removed
+    """
+    cutoff = time.time() - settings.blob_store_unused_hours * 3600
+    candidates: dict[UUID, list[str]] = {}
+    removed = 0
+    for tenant_id, path in await asyncio.to_thread(list, blob_store.iter_files(cutoff)):
+        if path.endswith(".tmp"):
+            with contextlib.suppress(FileNotFoundError):
+                await asyncio.to_thread(os.unlink, path)
+                removed += 1
+        else:
+            candidates.setdefault(tenant_id, []).append(path)
+
+    for tenant_id, paths in candidates.items():
+        indexed = set()
+        result = await session.stream(
+            select(ContentBlob.content_hash).where(ContentBlob.tenant_id == tenant_id)
+        )
+        async for (content_hash,) in result:
+            indexed.add(blob_store.name(content_hash))
+        orphans = [path for path in paths if os.path.basename(path)[:-2] not in indexed]
+
+        for start in range(0, len(orphans), SWEEP_BATCH_SIZE):
+            for path in orphans[start : start + SWEEP_BATCH_SIZE]:
+                key = blob_lock_key(tenant_id, os.path.basename(path)[:-2])
+                locked = await session.execute(select(func.pg_try_advisory_xact_lock(key)))
+                if not locked.scalar_one():
+                    continue
+                try:
+                    if os.stat(path).st_mtime >= cutoff:
+                        continue
+                    await asyncio.to_thread(os.unlink, path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+            # Release the advisory locks taken for this batch
+            await session.commit()
+
+    if removed:
+        logger.info(f"Removed {removed} blob files without an index row")
+    return removed
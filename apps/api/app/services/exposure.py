@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from uuid import UUID
 
 from sqlalchemy import func, select
@@ -5,14 +6,64 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.models import (
+    AclSetEntry,
     ExposureLevel,
-    FileEffectiveAccess,
+    File,
     Principal,
     SensitivityFinding,
     SensitivityLevel,
     SensitivityType,
 )
 
+# ACL sets whose read access is kept in memory; a set never changes once written
+ACL_SET_ACCESS_CACHE_SIZE = 10000
+
+_acl_set_access: OrderedDict[UUID, tuple[int, list[str]]] = OrderedDict()
+
+
+async def get_acl_set_access(
+    session: AsyncSession,
+    tenant_id: UUID,
+    acl_set_id: UUID,
+) -> tuple[int, list[str]]:
+    """
+    Summarise who can read the files sharing an ACL set.
+
+    Returns:
+        Tuple of (number of principals with read access, broad groups among them)
+    """
+    access = _acl_set_access.get(acl_set_id)
+    if access is not None:
+        _acl_set_access.move_to_end(acl_set_id)
+        return access
+
+    result = await session.execute(
+        select(func.count(AclSetEntry.principal_id.distinct())).where(
+            AclSetEntry.tenant_id == tenant_id,
+            AclSetEntry.acl_set_id == acl_set_id,
+            AclSetEntry.can_read == True,  # noqa: E712
+        )
+    )
+    principal_count = result.scalar() or 0
+
+    result = await session.execute(
+        select(Principal.display_name)
+        .distinct()
+        .join(AclSetEntry, AclSetEntry.principal_id == Principal.id)
+        .where(
+            AclSetEntry.tenant_id == tenant_id,
+            AclSetEntry.acl_set_id == acl_set_id,
+            AclSetEntry.can_read == True,  # noqa: E712
+            Principal.display_name.in_(settings.broad_group_names),
+        )
+    )
+    access = (principal_count, [row[0] for row in result.fetchall()])
+
+    _acl_set_access[acl_set_id] = access
+    while len(_acl_set_access) > ACL_SET_ACCESS_CACHE_SIZE:
+        _acl_set_access.popitem(last=False)
+    return access
+
 
 async def compute_exposure(
     session: AsyncSession,
@@ -23,18 +74,21 @@ async def compute_exposure(
     """
     Compute exposure score and level for a document.
 
+    Access is summarised per ACL set, so files sharing an ACL share the work.
+
     Returns:
         Tuple of (exposure_level, exposure_score, access_summary)
     """
-    # Count principals with read access
     result = await session.execute(
-        select(func.count(FileEffectiveAccess.id)).where(
-            FileEffectiveAccess.tenant_id == tenant_id,
-            FileEffectiveAccess.file_id == file_id,
-            FileEffectiveAccess.can_read == True,  # noqa: E712
-        )
+        select(File.acl_set_id).where(File.tenant_id == tenant_id, File.id == file_id)
     )
-    principal_count = result.scalar() or 0
+    acl_set_id = result.scalar()
+    if acl_set_id is None:
+        principal_count, found_broad_groups = 0, []
+    else:
+        principal_count, found_broad_groups = await get_acl_set_access(
+            session, tenant_id, acl_set_id
+        )
 
     # Compute principal breadth score
     if principal_count <= 10:
@@ -47,23 +101,6 @@ async def compute_exposure(
         principal_breadth_score = 80
         principal_count_bucket = ">100"
 
-    # Check for broad groups
-    broad_group_names = settings.broad_group_names
-    result = await session.execute(
-        select(Principal.display_name)
-        .join(
-            FileEffectiveAccess,
-            FileEffectiveAccess.principal_id == Principal.id,
-        )
-        .where(
-            FileEffectiveAccess.tenant_id == tenant_id,
-            FileEffectiveAccess.file_id == file_id,
-            FileEffectiveAccess.can_read == True,  # noqa: E712
-            Principal.display_name.in_(broad_group_names),
-        )
-    )
-    found_broad_groups = [row[0] for row in result.fetchall()]
-
     if found_broad_groups:
         principal_breadth_score += 20
 
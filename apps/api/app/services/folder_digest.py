@@ -0,0 +1,213 @@
+import hashlib
+from collections import defaultdict
+from datetime import UTC, datetime, timedelta
+from uuid import UUID, uuid4
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import advisory_lock_key
+from app.models import File, FolderDigest
+
+# Folder digests are sums of file entry digests modulo 2**256, so one file's
+# change is applied to each ancestor folder without re-reading its siblings
+DIGEST_MODULUS = 2**256
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Rows written per statement when building a share's digests
+BUILD_BATCH_SIZE = 1000
+
+
+def file_entry_digest(
+    relative_path: str, size_bytes: int, mtime: datetime, content_hash: str
+) -> int:
+    """
+    Digest one file's path, size, mtime and content hash.
+
+    Naive mtimes are taken as UTC, as they are stored, and compared at
+    microsecond precision. Agents compute the same value for their files.
+    """
+    if mtime.tzinfo is None:
+        mtime = mtime.replace(tzinfo=UTC)
+    mtime_us = (mtime - EPOCH) // timedelta(microseconds=1)
+    entry = f"{relative_path}\0{size_bytes}\0{mtime_us}\0{content_hash}"
+    return int.from_bytes(hashlib.sha256(entry.encode()).digest(), "big")
+
+
+def parent_folders(relative_path: str) -> list[str]:
+    """Return every folder containing a path, from the share root ("") down."""
+    parts = relative_path.split("/")[:-1]
+    return [""] + ["/".join(parts[: i + 1]) for i in range(len(parts))]
+
+
+class FolderDigestChanges:
+    """
+    Accumulate the folder digest changes caused by a batch of file events.
+
+    Each live file contributes its entry digest to every folder above it;
+    record the digest a file had before an event and the one it has after.
+    """
+
+    def __init__(self) -> None:
+        # share_id -> folder -> [digest delta, file count delta]
+        self.shares: dict[UUID, dict[str, list[int]]] = defaultdict(
+            lambda: defaultdict(lambda: [0, 0])
+        )
+
+    def record(
+        self,
+        share_id: UUID,
+        relative_path: str,
+        before: int | None,
+        after: int | None,
+    ) -> None:
+        """Record a file changing digest; None means the file was not live."""
+        if before == after:
+            return
+        digest_delta = (after or 0) - (before or 0)
+        count_delta = (after is not None) - (before is not None)
+        folders = self.shares[share_id]
+        for folder in parent_folders(relative_path):
+            change = folders[folder]
+            change[0] = (change[0] + digest_delta) % DIGEST_MODULUS
+            change[1] += count_delta
+
+
+async def lock_share_digests(session: AsyncSession, share_id: UUID) -> None:
+    """
+    Hold a share's folder digests until the transaction ends.
+
+    Builds and applied changes of one share take this lock, so a build reads
+    the files only after concurrent changes committed or before they apply.
+    """
+    await session.execute(select(func.pg_advisory_xact_lock(advisory_lock_key(share_id))))
+
+
+async def digests_built(session: AsyncSession, tenant_id: UUID, share_id: UUID) -> bool:
+    """Return whether a share's digests were built, i.e. its root row exists."""
+    result = await session.execute(
+        select(FolderDigest.id).where(
+            FolderDigest.tenant_id == tenant_id,
+            FolderDigest.share_id == share_id,
+            FolderDigest.path == "",
+        )
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def apply_folder_digest_changes(
+    session: AsyncSession,
+    tenant_id: UUID,
+    changes: FolderDigestChanges,
+) -> None:
+    """
+    Apply accumulated changes to the stored folder digests.
+
+    Shares whose digests were never built are skipped; they are built from
+    the file table in full the first time an agent compares them. Shares
+    are locked in a fixed order so concurrent batches cannot deadlock.
+    """
+    now = datetime.utcnow()
+    for share_id, share_changes in sorted(changes.shares.items()):
+        folders = {folder: change for folder, change in share_changes.items() if change != [0, 0]}
+        if not folders:
+            continue
+
+        await lock_share_digests(session, share_id)
+        if not await digests_built(session, tenant_id, share_id):
+            continue
+
+        stmt = insert(FolderDigest).values(
+            [
+                {
+                    "id": uuid4(),
+                    "tenant_id": tenant_id,
+                    "share_id": share_id,
+                    "path": folder,
+                    "digest": digest_delta,
+                    "file_count": count_delta,
+                    "updated_at": now,
+                }
+                for folder, (digest_delta, count_delta) in sorted(folders.items())
+            ]
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_folder_digest_path",
+                set_={
+                    "digest": func.mod(FolderDigest.digest + stmt.excluded.digest, DIGEST_MODULUS),
+                    "file_count": FolderDigest.file_count + stmt.excluded.file_count,
+                    "updated_at": now,
+                },
+            )
+        )
+
+
+async def build_folder_digests(session: AsyncSession, tenant_id: UUID, share_id: UUID) -> None:
+    """Compute every folder digest of a share from its live files, unless another request did."""
+    await lock_share_digests(session, share_id)
+    if await digests_built(session, tenant_id, share_id):
+        return
+
+    digests: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+    result = await session.stream(
+        select(File.relative_path, File.size_bytes, File.mtime, File.content_hash).where(
+            File.tenant_id == tenant_id,
+            File.share_id == share_id,
+            File.deleted == False,  # noqa: E712
+        )
+    )
+    async for row in result:
+        digest = file_entry_digest(row.relative_path, row.size_bytes, row.mtime, row.content_hash)
+        for folder in parent_folders(row.relative_path):
+            entry = digests[folder]
+            entry[0] = (entry[0] + digest) % DIGEST_MODULUS
+            entry[1] += 1
+
+    # The root row marks the share as built, even when it has no files
+    if "" not in digests:
+        digests[""] = [0, 0]
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid4(),
+            "tenant_id": tenant_id,
+            "share_id": share_id,
+            "path": folder,
+            "digest": digest,
+            "file_count": file_count,
+            "updated_at": now,
+        }
+        for folder, (digest, file_count) in sorted(digests.items())
+    ]
+    for i in range(0, len(rows), BUILD_BATCH_SIZE):
+        await session.execute(insert(FolderDigest).values(rows[i : i + BUILD_BATCH_SIZE]))
+
+
+async def get_folder_digests(
+    session: AsyncSession,
+    tenant_id: UUID,
+    share_id: UUID,
+    paths: list[str],
+) -> dict[str, tuple[int, int]]:
+    """
+    Return the stored (digest, file_count) of the given folders of a share.
+
+    Builds the share's digests first if they were never built. Folders
+    without live files are absent from the result.
+    """
+    if not await digests_built(session, tenant_id, share_id):
+        await build_folder_digests(session, tenant_id, share_id)
+
+    result = await session.execute(
+        select(FolderDigest.path, FolderDigest.digest, FolderDigest.file_count).where(
+            FolderDigest.tenant_id == tenant_id,
+            FolderDigest.share_id == share_id,
+            FolderDigest.path.in_(paths),
+            FolderDigest.file_count > 0,
+        )
+    )
+    return {row.path: (int(row.digest), row.file_count) for row in result}
@@ -0,0 +1,665 @@
+import gzip
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    AclSet,
+    AclSetEntry,
+    File,
+    FileEvent,
+    FileEventType,
+    IngestBatch,
+    Job,
+    JobStatus,
+    JobType,
+    Share,
+)
+from app.schemas import AclEntryInput, FileEventInput, IngestEventsRequest
+from app.services.folder_digest import (
+    FolderDigestChanges,
+    apply_folder_digest_changes,
+    file_entry_digest,
+)
+from app.services.principals import resolve_principals
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT, keeping statements well under Postgres' bind parameter limit
+INSERT_BATCH_SIZE = 1000
+
+# Keys of files within a batch
+FileKey = tuple[UUID, str]  # (share_id, relative_path)
+
+# Mutable File columns written by ingest; everything but the key and created_at
+FILE_COLUMNS = (
+    "name",
+    "size_bytes",
+    "mtime",
+    "file_type",
+    "content_hash",
+    "acl_hash",
+    "acl_set_id",
+    "last_seen_at",
+    "deleted",
+)
+
+
+# What Postgres can store: no NUL characters in text, int8 sizes, and keys that
+# fit a btree index entry, which is limited to about 2.7 kB
+MAX_BIGINT = 2**63 - 1
+MAX_PATH_BYTES = 2048
+MAX_HASH_LENGTH = 256
+
+
+def text_problem(name: str, value: str | None) -> str | None:
+    """Return why a text field cannot be stored, or None if it can."""
+    if value is not None and "\x00" in value:
+        return f"{name} contains a NUL character"
+    return None
+
+
+def acl_entries_problem(entries: list[AclEntryInput]) -> str | None:
+    """Return why ACL entries cannot be stored, or None if they can."""
+    for entry in entries:
+        for name in ("principal_external_id", "principal_display_name", "rights", "source"):
+            problem = text_problem(name, getattr(entry, name))
+            if problem:
+                return problem
+        if len(entry.principal_external_id.encode()) > MAX_PATH_BYTES:
+            return "principal_external_id is too long"
+    return None
+
+
+def event_problem(event: FileEventInput) -> str | None:
+    """
+    Return why an event cannot be stored, or None if it can.
+
+    Such events would fail the batch's bulk statements, and with them every
+    other event of the batch, each time the agent retried it.
+    """
+    for name in ("share_name", "relative_path", "file_type", "content_hash", "acl_hash"):
+        problem = text_problem(name, getattr(event, name))
+        if problem:
+            return problem
+    if not event.relative_path:
+        return "relative_path is empty"
+    if len(event.relative_path.encode()) > MAX_PATH_BYTES:
+        return "relative_path is too long"
+    for name in ("content_hash", "acl_hash"):
+        if len(getattr(event, name) or "") > MAX_HASH_LENGTH:
+            return f"{name} is too long"
+    if event.size_bytes is not None and not 0 <= event.size_bytes <= MAX_BIGINT:
+        return "size_bytes is out of range"
+    if event.acl_entries is not None:
+        return acl_entries_problem(event.acl_entries)
+    return None
+
+
+def hash_algorithm(content_hash: str) -> str:
+    """Return the algorithm prefix of a content hash, e.g. "sha256" or "blake2b"."""
+    return content_hash.partition(":")[0] if ":" in content_hash else ""
+
+
+@dataclass
+class FileRecord:
+    """A file's row as ingest sees it, updated in memory as a batch is applied."""
+
+    id: UUID
+    share_id: UUID
+    relative_path: str
+    name: str
+    size_bytes: int
+    mtime: datetime
+    file_type: str
+    content_hash: str
+    acl_hash: str | None  # None until the file's ACL set is known
+    acl_set_id: UUID | None
+    last_seen_at: datetime
+    deleted: bool
+    dirty: bool = False  # Must be written back
+
+    @property
+    def key(self) -> FileKey:
+        return self.share_id, self.relative_path
+
+    def digest(self) -> int | None:
+        """Folder digest entry of the file, or None if it is not live."""
+        if self.deleted:
+            return None
+        return file_entry_digest(self.relative_path, self.size_bytes, self.mtime, self.content_hash)
+
+    def values(self) -> dict:
+        """Column values for an upsert."""
+        row = {"id": self.id, "share_id": self.share_id, "relative_path": self.relative_path}
+        row.update({column: getattr(self, column) for column in FILE_COLUMNS})
+        return row
+
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC, the way they are stored, so they compare with stored ones."""
+    return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+
+def content_hash_changed(existing_file: FileRecord, event: FileEventInput) -> bool:
+    """
+    Decide whether an event reports new content for an existing file.
+
+    Digests from different algorithms cannot be compared, e.g. after an agent
+    switches its hash algorithm, so size and mtime decide in that case.
+    """
+    if not event.content_hash or event.content_hash == existing_file.content_hash:
+        return False
+    if hash_algorithm(event.content_hash) == hash_algorithm(existing_file.content_hash):
+        return True
+    if not existing_file.content_hash:
+        return True
+    return (event.size_bytes is not None and event.size_bytes != existing_file.size_bytes) or (
+        event.mtime is not None and as_utc(event.mtime) != as_utc(existing_file.mtime)
+    )
+
+
+def compute_acl_hash(acl_entries: list[AclEntryInput]) -> str:
+    """Hash ACL entries the way agents do, for inline ACLs sent without an acl_hash."""
+    if not acl_entries:
+        return "sha256:empty"
+    sorted_entries = sorted(
+        acl_entries,
+        key=lambda e: (e.principal_external_id, e.rights, e.source),
+    )
+    content = "|".join(f"{e.principal_external_id}:{e.rights}:{e.source}" for e in sorted_entries)
+    return f"sha256:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+class AclSetResolver:
+    """
+    Find the ACL set of each event in a batch.
+
+    Events carry their entries inline or reference one of the request's
+    acl_sets by acl_hash. An ACL is stored once per tenant and acl_hash, so
+    a hash already stored needs no entries; the entries of the batch's new
+    sets are written together, see BulkIngest.write_acl_sets.
+    """
+
+    def __init__(self, acl_sets: dict[str, list[AclEntryInput]]):
+        self.acl_sets = acl_sets
+        # Entries of each set the batch references, None where the batch lacks them
+        self.wanted: dict[str, list[AclEntryInput] | None] = {}
+
+    def acl_set(self, event: FileEventInput) -> str | None:
+        """Return the acl_hash of the event's ACL set, or None if it carries no ACL."""
+        if event.acl_entries is not None:
+            acl_hash = event.acl_hash or compute_acl_hash(event.acl_entries)
+            self.wanted[acl_hash] = event.acl_entries
+            return acl_hash
+        if not event.acl_hash:
+            return None
+        if self.wanted.get(event.acl_hash) is None:
+            self.wanted[event.acl_hash] = self.acl_sets.get(event.acl_hash)
+        return event.acl_hash
+
+
+async def insert_rows(session: AsyncSession, model: type, rows: list[dict], **conflict) -> None:
+    """Insert rows in multi-row statements, optionally ignoring conflicts on a constraint."""
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        stmt = insert(model).values(rows[i : i + INSERT_BATCH_SIZE])
+        if conflict:
+            stmt = stmt.on_conflict_do_nothing(**conflict)
+        await session.execute(stmt)
+
+
+def valid_acl_sets(acl_sets: dict[str, list[AclEntryInput]]) -> dict[str, list[AclEntryInput]]:
+    """Drop the ACL sets that cannot be stored, as if the request had not sent them."""
+    valid = {}
+    for acl_hash, entries in acl_sets.items():
+        problem = text_problem("acl_hash", acl_hash) or acl_entries_problem(entries)
+        if len(acl_hash) > MAX_HASH_LENGTH:
+            problem = "acl_hash is too long"
+        if problem:
+            logger.warning(f"Skipping ACL set {acl_hash[:MAX_HASH_LENGTH]!r}: {problem}")
+            continue
+        valid[acl_hash] = entries
+    return valid
+
+
+class BulkIngest:
+    """
+    Apply a batch of file events with a fixed number of statements.
+
+    Shares and existing files are loaded in one query each and the events
+    are applied in order to in-memory records, so a batch may touch the same
+    file more than once. The results are then written with multi-row
+    INSERT ... ON CONFLICT statements: new ACL sets, files, then events and
+    extraction jobs.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        tenant_id: UUID,
+        acl_sets: dict[str, list[AclEntryInput]],
+    ):
+        self.session = session
+        self.tenant_id = tenant_id
+        self.acl_resolver = AclSetResolver(valid_acl_sets(acl_sets))
+        self.digest_changes = FolderDigestChanges()
+        self.now = datetime.utcnow()
+        self.files: dict[FileKey, FileRecord] = {}
+        # Rows referencing files by key until their IDs are known
+        self.events: list[tuple[FileKey, FileEventType, dict]] = []
+        # acl_hash of each file's new ACL set; files take it once the set is found
+        self.acls: dict[FileKey, str] = {}
+        self.jobs: list[FileKey] = []
+
+    async def load_shares(self, names: set[str]) -> dict[str, UUID]:
+        result = await self.session.execute(
+            select(Share.name, Share.id).where(
+                Share.tenant_id == self.tenant_id,
+                Share.name.in_(names),
+            )
+        )
+        return dict(result.tuples().all())
+
+    async def load_files(self, keys: set[FileKey]) -> None:
+        keys = list(keys)
+        for i in range(0, len(keys), INSERT_BATCH_SIZE):
+            result = await self.session.execute(
+                select(
+                    File.id,
+                    File.share_id,
+                    File.relative_path,
+                    *(getattr(File, column) for column in FILE_COLUMNS),
+                ).where(
+                    File.tenant_id == self.tenant_id,
+                    tuple_(File.share_id, File.relative_path).in_(keys[i : i + INSERT_BATCH_SIZE]),
+                )
+            )
+            for row in result:
+                record = FileRecord(**row._asdict())
+                self.files[record.key] = record
+
+    async def run(self, batches: list[list[FileEventInput]]) -> list[int]:
+        """
+        Apply batches of events in order and write the results; the caller commits.
+
+        Events naming an unknown share are skipped, and so are events that
+        could not be stored, see event_problem.
+
+        Returns:
+            Number of extraction jobs created by each batch
+        """
+        batches = [self.valid_events(batch) for batch in batches]
+        events = [event for batch in batches for event in batch]
+        shares = await self.load_shares({event.share_name for event in events})
+        for share_name in {event.share_name for event in events} - set(shares):
+            logger.warning(
+                f"Share '{share_name}' not found; skipping its events. "
+                f"Create it first via /v0/admin/share"
+            )
+        await self.load_files(
+            {
+                (shares[event.share_name], event.relative_path)
+                for event in events
+                if event.share_name in shares
+            }
+        )
+
+        jobs_created = []
+        for batch in batches:
+            jobs_before = len(self.jobs)
+            for event in batch:
+                share_id = shares.get(event.share_name)
+                if share_id is not None:
+                    self.apply(share_id, event)
+            jobs_created.append(len(self.jobs) - jobs_before)
+
+        await self.write()
+        return jobs_created
+
+    def valid_events(self, events: list[FileEventInput]) -> list[FileEventInput]:
+        """Drop, with a warning, the events that could not be stored."""
+        valid = []
+        for event in events:
+            problem = event_problem(event)
+            if problem:
+                logger.warning(
+                    f"Skipping {event.type.value} event for {event.relative_path[:200]!r} "
+                    f"in share {event.share_name[:200]!r}: {problem}"
+                )
+                continue
+            valid.append(event)
+        return valid
+
+    def apply(self, share_id: UUID, event: FileEventInput) -> None:
+        """Apply one event to the in-memory records."""
+        key = (share_id, event.relative_path)
+        record = self.files.get(key)
+        digest_before = record.digest() if record is not None else None
+
+        if event.type == FileEventType.FILE_DELETED:
+            if record is not None:
+                record.deleted = True
+                record.last_seen_at = self.now
+                record.dirty = True
+                self.digest_changes.record(share_id, event.relative_path, digest_before, None)
+                self.events.append((key, event.type, {"relative_path": event.relative_path}))
+            return
+
+        # FILE_DISCOVERED or FILE_MODIFIED
+        if record is None:
+            record = FileRecord(
+                id=uuid4(),
+                share_id=share_id,
+                relative_path=event.relative_path,
+                name=os.path.basename(event.relative_path),
+                size_bytes=event.size_bytes or 0,
+                mtime=event.mtime or self.now,
+                file_type=event.file_type or "application/octet-stream",
+                content_hash=event.content_hash or "",
+                acl_hash=None,  # Set once its ACL set is found, see write
+                acl_set_id=None,
+                last_seen_at=self.now,
+                deleted=False,
+                dirty=True,
+            )
+            self.files[key] = record
+            self.digest_changes.record(share_id, event.relative_path, None, record.digest())
+
+            acl_hash = self.acl_resolver.acl_set(event)
+            if acl_hash is not None:
+                self.acls[key] = acl_hash
+            self.events.append(
+                (
+                    key,
+                    event.type,
+                    {
+                        "relative_path": event.relative_path,
+                        "size_bytes": event.size_bytes,
+                        "file_type": event.file_type,
+                    },
+                )
+            )
+            self.jobs.append(key)
+            return
+
+        # Existing file - check for changes
+        content_changed = content_hash_changed(record, event)
+        # Only a change between two known ACLs is one; an unknown ACL is adopted below
+        known_acl_hash = self.acls.get(key, record.acl_hash)
+        acl_changed = bool(event.acl_hash and known_acl_hash) and event.acl_hash != known_acl_hash
+        # A file back from deletion may have had its documents purged meanwhile
+        revived = record.deleted
+        record.dirty = True
+
+        if not content_changed and not acl_changed:
+            # Same content: adopt the agent's hash algorithm, size and mtime, which
+            # may differ after a hash switch, so folder digests match the agent's
+            if event.content_hash:
+                record.content_hash = event.content_hash
+            if event.size_bytes is not None:
+                record.size_bytes = event.size_bytes
+            if event.mtime is not None:
+                record.mtime = event.mtime
+            record.last_seen_at = self.now
+            record.deleted = False
+            if not known_acl_hash:
+                acl_hash = self.acl_resolver.acl_set(event)
+                if acl_hash is not None:
+                    self.acls[key] = acl_hash
+            self.digest_changes.record(
+                share_id, event.relative_path, digest_before, record.digest()
+            )
+            if revived:
+                self.jobs.append(key)
+            return
+
+        # Update file metadata
+        if event.size_bytes is not None:
+            record.size_bytes = event.size_bytes
+        if event.mtime is not None:
+            record.mtime = event.mtime
+        if event.file_type is not None:
+            record.file_type = event.file_type
+        if event.content_hash is not None:
+            record.content_hash = event.content_hash
+        record.last_seen_at = self.now
+        record.deleted = False
+        self.digest_changes.record(share_id, event.relative_path, digest_before, record.digest())
+
+        if acl_changed:
+            acl_hash = self.acl_resolver.acl_set(event)
+            if acl_hash is not None:
+                self.acls[key] = acl_hash
+
+        self.events.append(
+            (
+                key,
+                FileEventType.FILE_MODIFIED if content_changed else FileEventType.ACL_CHANGED,
+                {
+                    "relative_path": event.relative_path,
+                    "content_changed": content_changed,
+                    "acl_changed": acl_changed,
+                },
+            )
+        )
+        # Create extraction job only if content changed or the file came back
+        if content_changed or revived:
+            self.jobs.append(key)
+
+    async def write_files(self) -> dict[FileKey, UUID]:
+        """
+        Upsert every changed file.
+
+        Returns:
+            File IDs by key; a file inserted concurrently by another request
+            keeps that request's ID
+        """
+        records = [record for record in self.files.values() if record.dirty]
+        file_ids = {key: record.id for key, record in self.files.items()}
+        for i in range(0, len(records), INSERT_BATCH_SIZE):
+            stmt = insert(File).values(
+                [
+                    {"tenant_id": self.tenant_id, **record.values()}
+                    for record in records[i : i + INSERT_BATCH_SIZE]
+                ]
+            )
+            result = await self.session.execute(
+                stmt.on_conflict_do_update(
+                    constraint="uq_file_path",
+                    set_={column: stmt.excluded[column] for column in FILE_COLUMNS},
+                ).returning(File.share_id, File.relative_path, File.id)
+            )
+            for share_id, relative_path, file_id in result.tuples():
+                file_ids[share_id, relative_path] = file_id
+        return file_ids
+
+    async def load_acl_sets(self, acl_hashes: list[str]) -> dict[str, UUID]:
+        acl_set_ids = {}
+        for i in range(0, len(acl_hashes), INSERT_BATCH_SIZE):
+            result = await self.session.execute(
+                select(AclSet.acl_hash, AclSet.id).where(
+                    AclSet.tenant_id == self.tenant_id,
+                    AclSet.acl_hash.in_(acl_hashes[i : i + INSERT_BATCH_SIZE]),
+                )
+            )
+            acl_set_ids.update(result.tuples().all())
+        return acl_set_ids
+
+    async def write_acl_sets(self) -> dict[str, UUID]:
+        """
+        Look up the batch's ACL sets, creating those not stored yet.
+
+        A set's entries are written only by the request that creates it; a
+        set another request created concurrently is read back instead.
+
+        Returns:
+            ACL set IDs by acl_hash; sets neither stored nor sent are missing
+        """
+        wanted = self.acl_resolver.wanted
+        if not wanted:
+            return {}
+        acl_set_ids = await self.load_acl_sets(list(wanted))
+
+        new_sets = {}
+        for acl_hash, entries in wanted.items():
+            if acl_hash in acl_set_ids:
+                continue
+            if entries is None:
+                logger.warning(
+                    f"Events reference unknown ACL set {acl_hash}; their files keep their ACL"
+                )
+                continue
+            new_sets[acl_hash] = entries
+        if not new_sets:
+            return acl_set_ids
+
+        principals = await resolve_principals(
+            self.session,
+            self.tenant_id,
+            (entry for entries in new_sets.values() for entry in entries),
+        )
+        created: dict[str, UUID] = {}
+        acl_hashes = list(new_sets)
+        for i in range(0, len(acl_hashes), INSERT_BATCH_SIZE):
+            result = await self.session.execute(
+                insert(AclSet)
+                .values(
+                    [
+                        {"id": uuid4(), "tenant_id": self.tenant_id, "acl_hash": acl_hash}
+                        for acl_hash in acl_hashes[i : i + INSERT_BATCH_SIZE]
+                    ]
+                )
+                .on_conflict_do_nothing(constraint="uq_acl_set_hash")
+                .returning(AclSet.acl_hash, AclSet.id)
+            )
+            created.update(result.tuples().all())
+
+        # Effective access (for v0, anyone with any rights can read)
+        await insert_rows(
+            self.session,
+            AclSetEntry,
+            [
+                {
+                    "id": uuid4(),
+                    "tenant_id": self.tenant_id,
+                    "acl_set_id": acl_set_id,
+                    "principal_id": principals[entry.principal_external_id],
+                    "rights": entry.rights,
+                    "source": entry.source,
+                    "can_read": True,
+                }
+                for acl_hash, acl_set_id in created.items()
+                for entry in new_sets[acl_hash]
+            ],
+        )
+        acl_set_ids.update(created)
+        if len(created) < len(new_sets):
+            acl_set_ids.update(await self.load_acl_sets([h for h in new_sets if h not in created]))
+        return acl_set_ids
+
+    async def write(self) -> None:
+        """Write the batch's ACL sets, files, events, jobs and folder digest changes."""
+        acl_set_ids = await self.write_acl_sets()
+        for key, acl_hash in self.acls.items():
+            acl_set_id = acl_set_ids.get(acl_hash)
+            if acl_set_id is not None:
+                self.files[key].acl_hash = acl_hash
+                self.files[key].acl_set_id = acl_set_id
+        file_ids = await self.write_files()
+
+        await insert_rows(
+            self.session,
+            FileEvent,
+            [
+                {
+                    "id": uuid4(),
+                    "tenant_id": self.tenant_id,
+                    "file_id": file_ids[key],
+                    "share_id": key[0],
+                    "event_type": event_type,
+                    "payload": payload,
+                }
+                for key, event_type, payload in self.events
+            ],
+        )
+        await insert_rows(
+            self.session,
+            Job,
+            [
+                {
+                    "id": uuid4(),
+                    "tenant_id": self.tenant_id,
+                    "job_type": JobType.EXTRACT_CONTENT,
+                    "file_id": file_ids[key],
+                }
+                for key in self.jobs
+            ],
+        )
+        await apply_folder_digest_changes(self.session, self.tenant_id, self.digest_changes)
+
+
+async def ingest_file_events(
+    session: AsyncSession,
+    tenant_id: UUID,
+    events: list[FileEventInput],
+    acl_sets: dict[str, list[AclEntryInput]],
+) -> int:
+    """
+    Apply a batch of agent file events; the caller commits.
+
+    Returns:
+        Number of extraction jobs created
+    """
+    jobs_created = await BulkIngest(session, tenant_id, acl_sets).run([events])
+    return jobs_created[0]
+
+
+async def ingest_staged_batches(
+    session: AsyncSession,
+    tenant_id: UUID,
+    requests: list[IngestEventsRequest],
+) -> list[int]:
+    """
+    Apply several staged requests of one tenant together, in order; the caller commits.
+
+    Returns:
+        Number of extraction jobs created by each request
+    """
+    acl_sets: dict[str, list[AclEntryInput]] = {}
+    for request in requests:
+        acl_sets.update(request.acl_sets)
+    return await BulkIngest(session, tenant_id, acl_sets).run(
+        [request.events for request in requests]
+    )
+
+
+async def stage_ingest_batch(
+    session: AsyncSession,
+    tenant_id: UUID,
+    request: IngestEventsRequest,
+) -> IngestBatch:
+    """Store a request for IngestWorker to apply later; the caller commits."""
+    batch = IngestBatch(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        agent_id=request.agent_id,
+        status=JobStatus.PENDING,
+        event_count=len(request.events),
+        payload_gzip=gzip.compress(request.model_dump_json().encode(), compresslevel=6),
+        attempts=0,
+    )
+    session.add(batch)
+    await session.flush()
+    return batch
+
+
+def load_staged_request(batch: IngestBatch) -> IngestEventsRequest:
+    """Decode the request stored by stage_ingest_batch."""
+    return IngestEventsRequest.model_validate_json(gzip.decompress(batch.payload_gzip))
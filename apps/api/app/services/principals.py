@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from uuid import UUID, uuid4
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import Principal, PrincipalType
+from app.schemas import AclEntryInput
+
+# Principals created per INSERT statement
+INSERT_BATCH_SIZE = 1000
+
+
+class PrincipalCache:
+    """
+    Bounded LRU map of (tenant_id, external_id) to principal ID.
+
+    Shared by every request this process handles; the same few thousand
+    principals recur across millions of ACL entries.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._ids: OrderedDict[tuple[UUID, str], UUID] = OrderedDict()
+
+    def get(self, tenant_id: UUID, external_id: str) -> UUID | None:
+        """Return a cached principal ID, marking it recently used."""
+        key = (tenant_id, external_id)
+        principal_id = self._ids.get(key)
+        if principal_id is not None:
+            self._ids.move_to_end(key)
+        return principal_id
+
+    def put(self, tenant_id: UUID, external_id: str, principal_id: UUID) -> None:
+        """Cache a principal ID, evicting the least recently used beyond max_size."""
+        if self.max_size <= 0:
+            return
+        self._ids[tenant_id, external_id] = principal_id
+        self._ids.move_to_end((tenant_id, external_id))
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_size)
+
+
+def principal_type(value: str) -> PrincipalType:
+    """Map an agent's principal type onto PrincipalType, defaulting to USER."""
+    return PrincipalType(value) if value in [t.value for t in PrincipalType] else PrincipalType.USER
+
+
+async def resolve_principals(
+    session: AsyncSession,
+    tenant_id: UUID,
+    entries: Iterable[AclEntryInput],
+) -> dict[str, UUID]:
+    """
+    Look up or create the principals named by ACL entries.
+
+    Cached principals cost nothing; the rest are looked up in one query and
+    those still missing are created in one INSERT ... ON CONFLICT. Only
+    principals read back from the database are cached: one created in this
+    transaction is not, since the transaction may yet roll back. It is
+    cached the next time it is looked up.
+
+    Returns:
+        Principal IDs keyed by external ID
+    """
+    wanted: dict[str, AclEntryInput] = {}
+    principals: dict[str, UUID] = {}
+    for entry in entries:
+        external_id = entry.principal_external_id
+        if external_id in principals or external_id in wanted:
+            continue
+        principal_id = principal_cache.get(tenant_id, external_id)
+        if principal_id is not None:
+            principals[external_id] = principal_id
+        else:
+            wanted[external_id] = entry
+    if not wanted:
+        return principals
+
+    found = await select_principals(session, tenant_id, list(wanted))
+    principals.update(found)
+
+    missing = [entry for external_id, entry in wanted.items() if external_id not in found]
+    for i in range(0, len(missing), INSERT_BATCH_SIZE):
+        result = await session.execute(
+            insert(Principal)
+            .values(
+                [
+                    {
+                        "id": uuid4(),
+                        "tenant_id": tenant_id,
+                        "type": principal_type(entry.principal_type),
+                        "external_id": entry.principal_external_id,
+                        "display_name": entry.principal_display_name or entry.principal_external_id,
+                    }
+                    for entry in missing[i : i + INSERT_BATCH_SIZE]
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_principal_external_id")
+            .returning(Principal.external_id, Principal.id)
+        )
+        principals.update(result.tuples().all())
+
+    # Created concurrently by another request
+    raced = [external_id for external_id in wanted if external_id not in principals]
+    if raced:
+        principals.update(await select_principals(session, tenant_id, raced))
+    return principals
+
+
+async def select_principals(
+    session: AsyncSession, tenant_id: UUID, external_ids: list[str]
+) -> dict[str, UUID]:
+    """Look up existing principals by external ID, caching what is found."""
+    result = await session.execute(
+        select(Principal.external_id, Principal.id).where(
+            Principal.tenant_id == tenant_id,
+            Principal.external_id.in_(external_ids),
+        )
+    )
+    found = dict(result.tuples().all())
+    for external_id, principal_id in found.items():
+        principal_cache.put(tenant_id, external_id, principal_id)
+    return found
@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from sqlalchemy import Enum, and_, exists, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import (
+    Document,
+    File,
+    FileEvent,
+    FileEventType,
+    Job,
+    JobStatus,
+    JobType,
+    ScanSession,
+    ScanSessionFolder,
+)
+from app.services.folder_digest import (
+    FolderDigestChanges,
+    apply_folder_digest_changes,
+    file_entry_digest,
+)
+from app.services.ingest import insert_rows
+
+logger = logging.getLogger(__name__)
+
+
+async def open_scan_session(
+    session: AsyncSession,
+    tenant_id: UUID,
+    share_id: UUID,
+    agent_id: str,
+) -> ScanSession:
+    """Start a scan session of a share; the caller commits."""
+    scan = ScanSession(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        share_id=share_id,
+        agent_id=agent_id,
+        # The same clock as File.last_seen_at, which ingest stamps with utcnow
+        started_at=datetime.utcnow(),
+    )
+    session.add(scan)
+    await session.flush()
+    return scan
+
+
+async def record_matched_folders(
+    session: AsyncSession, scan: ScanSession, folders: list[str]
+) -> None:
+    """Record folders whose digests matched during a scan; their files count as seen."""
+    if not folders:
+        return
+    await session.execute(
+        insert(ScanSessionFolder)
+        .values([{"id": uuid4(), "scan_session_id": scan.id, "path": path} for path in folders])
+        .on_conflict_do_nothing(constraint="uq_scan_session_folder_path")
+    )
+
+
+async def tombstone_unseen_files(session: AsyncSession, scan: ScanSession) -> int:
+    """
+    Mark the share's live files not seen since the session started as deleted.
+
+    Everything a complete scan reports, directly or through reconcile, bumps
+    last_seen_at, and files beneath folders recorded by
+    record_matched_folders were seen as well, so the rest went away. They
+    are marked in one UPDATE and their folder digests and FILE_DELETED
+    events are written in bulk.
+
+    Returns:
+        Number of files marked deleted
+    """
+    in_matched_folder = exists().where(
+        ScanSessionFolder.scan_session_id == scan.id,
+        or_(
+            ScanSessionFolder.path == "",
+            func.starts_with(File.relative_path, ScanSessionFolder.path + "/"),
+        ),
+    )
+    result = await session.execute(
+        update(File)
+        .where(
+            File.tenant_id == scan.tenant_id,
+            File.share_id == scan.share_id,
+            File.deleted == False,  # noqa: E712
+            File.last_seen_at < scan.started_at,
+            ~in_matched_folder,
+        )
+        .values(deleted=True)
+        .returning(File.id, File.relative_path, File.size_bytes, File.mtime, File.content_hash)
+    )
+    rows = result.all()
+
+    digest_changes = FolderDigestChanges()
+    for row in rows:
+        digest_changes.record(
+            scan.share_id,
+            row.relative_path,
+            file_entry_digest(row.relative_path, row.size_bytes, row.mtime, row.content_hash),
+            None,
+        )
+    await apply_folder_digest_changes(session, scan.tenant_id, digest_changes)
+
+    await insert_rows(
+        session,
+        FileEvent,
+        [
+            {
+                "id": uuid4(),
+                "tenant_id": scan.tenant_id,
+                "file_id": row.id,
+                "share_id": scan.share_id,
+                "event_type": FileEventType.FILE_DELETED,
+                "payload": {"relative_path": row.relative_path, "scan_session_id": str(scan.id)},
+            }
+            for row in rows
+        ],
+    )
+    return len(rows)
+
+
+async def schedule_purges(session: AsyncSession, tenant_id: UUID, share_id: UUID) -> int:
+    """
+    Queue a PURGE_CONTENT job for each deleted file of a share that still has documents.
+
+    Files with a purge already pending are skipped, so repeated calls are cheap.
+
+    Returns:
+        Number of jobs queued
+    """
+    pending_purge = exists().where(
+        Job.file_id == File.id,
+        Job.job_type == JobType.PURGE_CONTENT,
+        Job.status.in_([JobStatus.PENDING, JobStatus.IN_PROGRESS]),
+    )
+    has_documents = exists().where(Document.file_id == File.id)
+    result = await session.execute(
+        insert(Job)
+        .from_select(
+            ["id", "tenant_id", "job_type", "file_id"],
+            select(
+                func.gen_random_uuid(),
+                File.tenant_id,
+                literal(JobType.PURGE_CONTENT, Enum(JobType)),
+                File.id,
+            ).where(
+                and_(
+                    File.tenant_id == tenant_id,
+                    File.share_id == share_id,
+                    File.deleted == True,  # noqa: E712
+                    has_documents,
+                    ~pending_purge,
+                )
+            ),
+        )
+        .returning(Job.id)
+    )
+    return len(result.all())
+
+
+async def close_scan_session(session: AsyncSession, scan: ScanSession) -> int:
+    """
+    Close a scan session after a complete scan; the caller commits.
+
+    Files the scan did not see are marked deleted and the documents and
+    chunks of the share's deleted files are queued for purging.
+
+    Returns:
+        Number of files marked deleted
+    """
+    files_deleted = await tombstone_unseen_files(session, scan)
+    purges = await schedule_purges(session, scan.tenant_id, scan.share_id)
+    scan.closed_at = datetime.utcnow()
+    scan.files_deleted = files_deleted
+    logger.info(
+        f"Closed scan session {scan.id}: {files_deleted} unseen files marked deleted, "
+        f"{purges} purge jobs queued"
+    )
+    return files_deleted
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.db import async_session_factory
+from app.services.blob_store import sweep_blobs, sweep_orphan_files
+
+logger = logging.getLogger(__name__)
+
+
+class BlobSweeper:
+    """
+    Worker that periodically removes blobs no document references any more.
+
+    Blob files without an index row are looked for less often, see
+    settings.blob_store_orphan_sweep_interval_seconds, as that walks the
+    whole store.
+    """
+
+    def __init__(self):
+        self.running = False
+        self.orphans_swept_at = 0.0  # time.monotonic() of the last orphan sweep
+
+    async def run_once(self) -> int:
+        """Sweep once, returning the number of blobs and orphan files removed."""
+        if not settings.blob_store_enabled:
+            return 0
+        async with async_session_factory() as session:
+            removed = await sweep_blobs(session)
+            now = time.monotonic()
+            if (
+                not self.orphans_swept_at
+                or now - self.orphans_swept_at >= settings.blob_store_orphan_sweep_interval_seconds
+            ):
+                removed += await sweep_orphan_files(session)
+                self.orphans_swept_at = now
+            return removed
+
+    async def run(self) -> None:
+        """Run the worker loop continuously."""
+        self.running = True
+        logger.info(f"Starting {self.__class__.__name__} worker")
+
+        while self.running:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Worker error: {e}")
+
+            # Sleep in short steps so stop() takes effect promptly
+            waited = 0.0
+            while self.running and waited < settings.blob_store_sweep_interval_seconds:
+                await asyncio.sleep(settings.worker_poll_interval_seconds)
+                waited += settings.worker_poll_interval_seconds
+
+    def stop(self) -> None:
+        """Stop the worker loop."""
+        self.running = False
+        logger.info(f"Stopping {self.__class__.__name__} worker")
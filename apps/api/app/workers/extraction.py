@@ -8,8 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.models import Chunk, DocType, Document, File, Job, JobType, Share
+from app.services.blob_store import add_reference, load_extracted, store_extracted
 from app.services.classification import classify_document
-from app.services.extraction import chunk_text, chunk_text_type_aware, extract_content
+from app.services.extraction import (
+    chunk_text,
+    chunk_text_type_aware,
+    extract_content,
+)
 from app.workers.base import BaseWorker
 
 logger = logging.getLogger(__name__)
@@ -24,8 +29,8 @@ class ExtractionWorker(BaseWorker):
         """
         Process an EXTRACT_CONTENT job:
         1. Load file and share
-        2. Compute full path
-        3. Extract text content
+        2. Use text kept in the blob store, extracted here or uploaded by an agent
+        3. Otherwise extract text content from the share and keep it
         4. Create/update document
         5. Create chunks
         6. Schedule ENRICH_CHUNKS job
@@ -43,17 +48,23 @@ class ExtractionWorker(BaseWorker):
         if not share:
             raise ValueError(f"Share {file.share_id} not found")
 
-        # Compute full path
-        full_path = os.path.join(share.root_path, file.relative_path.lstrip("/"))
-        logger.info(f"Extracting content from: {full_path}")
+        extracted = await load_extracted(session, file.tenant_id, file.content_hash)
+        if extracted is not None:
+            logger.info(f"Using {len(extracted.text)} stored characters for {file.name}")
 
-        # Check if file exists
-        if not os.path.exists(full_path):
-            raise FileNotFoundError(f"File not found: {full_path}")
+        if extracted is None:
+            # Compute full path
+            full_path = os.path.join(share.root_path, file.relative_path.lstrip("/"))
+            logger.info(f"Extracting content from: {full_path}")
 
-        # Extract content
-        extracted = extract_content(full_path, file.file_type)
-        logger.info(f"Extracted {len(extracted.text)} characters from {file.name}")
+            # Check if file exists
+            if not os.path.exists(full_path):
+                raise FileNotFoundError(f"File not found: {full_path}")
+
+            # Extract content
+            extracted = extract_content(full_path, file.file_type)
+            logger.info(f"Extracted {len(extracted.text)} characters from {file.name}")
+            await store_extracted(session, file.tenant_id, file.content_hash, extracted)
 
         # v0.1: Classify document type
         doc_type = await classify_document(
@@ -92,6 +103,10 @@ class ExtractionWorker(BaseWorker):
                 )
                 session.add(document)
                 await session.flush()
+                await add_reference(
+                    session, job.tenant_id, existing_document.content_hash, delta=-1
+                )
+                await add_reference(session, job.tenant_id, file.content_hash, delta=1)
                 logger.info(
                     f"Created new version {document.version_number} for document "
                     f"(previous: {existing_document.id})"
@@ -123,6 +138,7 @@ class ExtractionWorker(BaseWorker):
             )
             session.add(document)
             await session.flush()
+            await add_reference(session, job.tenant_id, file.content_hash, delta=1)
 
         # v0.1: Use type-aware chunking for known document types
         if doc_type and doc_type != DocType.OTHER:
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from app.config import settings
+from app.db import advisory_lock_key, async_session_factory
+from app.models import IngestBatch, JobStatus
+from app.services.ingest import ingest_staged_batches, load_staged_request
+
+logger = logging.getLogger(__name__)
+
+# Tenants with pending batches considered per claim, oldest first; those
+# another worker is handling are passed over
+CLAIM_TENANT_CANDIDATES = 10
+
+
+class IngestWorker:
+    """
+    Worker that applies event batches staged by asynchronous ingest.
+
+    A tenant's batches must be applied in the order they were staged, so one
+    worker at a time handles a tenant, holding a transaction-scoped advisory
+    lock on it. The worker applies the tenant's oldest pending batches
+    together in one transaction, which also marks them succeeded, so a crash
+    leaves them pending. If a group fails, its batches are applied one by
+    one up to the first that fails; that batch is retried before any later
+    one until it gives up after settings.worker_max_attempts.
+    """
+
+    def __init__(self):
+        self.running = False
+
+    async def claim_batches(self, session: AsyncSession) -> list[IngestBatch]:
+        """Lock the oldest pending batches of a tenant no other worker is handling."""
+        result = await session.execute(
+            select(IngestBatch.tenant_id)
+            .where(IngestBatch.status == JobStatus.PENDING)
+            .group_by(IngestBatch.tenant_id)
+            .order_by(func.min(IngestBatch.created_at))
+            .limit(CLAIM_TENANT_CANDIDATES)
+        )
+        for tenant_id in result.scalars().all():
+            locked = await session.execute(
+                select(func.pg_try_advisory_xact_lock(advisory_lock_key(tenant_id)))
+            )
+            if not locked.scalar_one():
+                continue
+
+            result = await session.execute(
+                select(IngestBatch)
+                .options(undefer(IngestBatch.payload_gzip))
+                .where(
+                    IngestBatch.tenant_id == tenant_id,
+                    IngestBatch.status == JobStatus.PENDING,
+                )
+                .order_by(IngestBatch.created_at)
+                .limit(settings.ingest_worker_max_batches)
+                .with_for_update()
+            )
+            batches = list(result.scalars())
+            if batches:
+                return batches
+        return []
+
+    async def apply(self, session: AsyncSession, batches: list[IngestBatch]) -> None:
+        """Apply locked batches of one tenant in order and mark them succeeded."""
+        requests = [load_staged_request(batch) for batch in batches]
+        jobs_created = await ingest_staged_batches(session, batches[0].tenant_id, requests)
+
+        now = datetime.utcnow()
+        for batch, jobs in zip(batches, jobs_created, strict=True):
+            await session.execute(
+                update(IngestBatch)
+                .where(IngestBatch.id == batch.id)
+                .execution_options(synchronize_session=False)
+                .values(
+                    status=JobStatus.SUCCEEDED,
+                    jobs_created=jobs,
+                    payload_gzip=None,
+                    last_error=None,
+                    updated_at=now,
+                )
+            )
+
+        logger.info(
+            f"Applied {len(batches)} ingest batches "
+            f"({sum(batch.event_count for batch in batches)} events) "
+            f"for tenant {batches[0].tenant_id}, created {sum(jobs_created)} jobs"
+        )
+
+    async def mark_failed(self, session: AsyncSession, batch_id: UUID, error: str) -> None:
+        """Record a failed attempt, giving up after settings.worker_max_attempts."""
+        await session.execute(
+            update(IngestBatch)
+            .where(IngestBatch.id == batch_id)
+            .execution_options(synchronize_session=False)
+            .values(
+                attempts=IngestBatch.attempts + 1,
+                last_error=error,
+                status=case(
+                    (
+                        IngestBatch.attempts + 1 >= settings.worker_max_attempts,
+                        JobStatus.FAILED,
+                    ),
+                    else_=JobStatus.PENDING,
+                ),
+                updated_at=datetime.utcnow(),
+            )
+        )
+        logger.error(f"Ingest batch {batch_id} failed: {error}")
+
+    async def apply_in_order(self, session: AsyncSession, batches: list[IngestBatch]) -> None:
+        """
+        Apply batches together, or one by one up to the first that fails.
+
+        Each attempt runs in a savepoint, so a failure keeps the tenant and
+        batch locks and the batches after a failed one stay pending. Batches
+        are marked with UPDATE statements that leave the loaded rows alone,
+        so rolling back a savepoint does not expire them.
+        """
+        try:
+            async with session.begin_nested():
+                await self.apply(session, batches)
+            return
+        except Exception as e:
+            if len(batches) == 1:
+                logger.exception(f"Error applying ingest batch {batches[0].id}: {e}")
+                await self.mark_failed(session, batches[0].id, str(e))
+                return
+            logger.warning(
+                f"Applying {len(batches)} ingest batches together failed ({e}); "
+                f"applying them one by one"
+            )
+
+        for batch in batches:
+            try:
+                async with session.begin_nested():
+                    await self.apply(session, [batch])
+            except Exception as e:
+                logger.exception(f"Error applying ingest batch {batch.id}: {e}")
+                await self.mark_failed(session, batch.id, str(e))
+                return
+
+    async def run_once(self) -> bool:
+        """
+        Try to claim and apply pending batches.
+        Returns True if any batch was processed, False otherwise.
+        """
+        async with async_session_factory() as session:
+            batches = await self.claim_batches(session)
+            if not batches:
+                return False
+
+            await self.apply_in_order(session, batches)
+            await session.commit()
+            return True
+
+    async def run(self) -> None:
+        """Run the worker loop continuously."""
+        self.running = True
+        logger.info(f"Starting {self.__class__.__name__} worker")
+
+        while self.running:
+            try:
+                processed = await self.run_once()
+
+                if not processed:
+                    # No batches pending, sleep before checking again
+                    await asyncio.sleep(settings.worker_poll_interval_seconds)
+            except Exception as e:
+                logger.exception(f"Worker error: {e}")
+                await asyncio.sleep(settings.worker_poll_interval_seconds)
+
+    def stop(self) -> None:
+        """Stop the worker loop."""
+        self.running = False
+        logger.info(f"Stopping {self.__class__.__name__} worker")
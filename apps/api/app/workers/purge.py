@@ -0,0 +1,49 @@
+import logging
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Document, File, Job, JobType
+from app.services.blob_store import add_reference
+from app.workers.base import BaseWorker
+
+logger = logging.getLogger(__name__)
+
+
+class PurgeWorker(BaseWorker):
+    """Worker that removes the documents and chunks of deleted files."""
+
+    job_type = JobType.PURGE_CONTENT
+
+    async def process_job(self, session: AsyncSession, job: Job) -> None:
+        """
+        Process a PURGE_CONTENT job:
+        1. Skip files that came back since the job was queued
+        2. Release the current document's blob reference
+        3. Delete every version of the file's document; chunks, embeddings,
+           findings and exposure go with them
+        """
+        if not job.file_id:
+            raise ValueError("PURGE_CONTENT job requires file_id")
+
+        file = await session.get(File, job.file_id)
+        if file is None or not file.deleted:
+            logger.info(f"File {job.file_id} is live again; nothing to purge")
+            return
+
+        result = await session.execute(
+            select(Document)
+            .where(Document.tenant_id == job.tenant_id, Document.file_id == file.id)
+            .order_by(Document.version_number.desc())
+        )
+        documents = list(result.scalars())
+        if not documents:
+            return
+
+        # Each file holds one blob reference, through its latest version
+        await add_reference(session, job.tenant_id, documents[0].content_hash, delta=-1)
+
+        document_ids = [document.id for document in documents]
+        await session.execute(delete(Job).where(Job.document_id.in_(document_ids)))
+        await session.execute(delete(Document).where(Document.id.in_(document_ids)))
+        logger.info(f"Purged {len(document_ids)} document versions of deleted file {file.id}")
@@ -2,8 +2,11 @@ import asyncio
 import logging
 import signal
 
+from app.workers.blobs import BlobSweeper
 from app.workers.enrichment import EnrichmentWorker
 from app.workers.extraction import ExtractionWorker
+from app.workers.ingest import IngestWorker
+from app.workers.purge import PurgeWorker
 from app.workers.semantics import SemanticExtractionWorker
 
 logging.basicConfig(
@@ -15,25 +18,34 @@ logger = logging.getLogger(__name__)
 
 async def run_workers():
     """Run all workers concurrently."""
+    ingest_worker = IngestWorker()
     extraction_worker = ExtractionWorker()
     enrichment_worker = EnrichmentWorker()
     semantics_worker = SemanticExtractionWorker()
+    purge_worker = PurgeWorker()
+    blob_sweeper = BlobSweeper()
 
     # Handle shutdown signals
     def handle_shutdown(sig, _frame):
         logger.info(f"Received shutdown signal: {sig}")
+        ingest_worker.stop()
         extraction_worker.stop()
         enrichment_worker.stop()
         semantics_worker.stop()
+        purge_worker.stop()
+        blob_sweeper.stop()
 
     signal.signal(signal.SIGINT, handle_shutdown)
     signal.signal(signal.SIGTERM, handle_shutdown)
 
     # Run workers concurrently
     await asyncio.gather(
+        ingest_worker.run(),
         extraction_worker.run(),
         enrichment_worker.run(),
         semantics_worker.run(),
+        purge_worker.run(),
+        blob_sweeper.run(),
     )
 
 
@@ -0,0 +1,147 @@
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+
+from app.auth import TenantContext, get_tenant_context
+from app.main import app
+from app.models import Tenant
+
+
+class FakeRow(SimpleNamespace):
+    """A result row with attribute access, tuple unpacking and Row._asdict()."""
+
+    def __iter__(self):
+        return iter(vars(self).values())
+
+    def _asdict(self) -> dict:
+        return dict(vars(self))
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def all(self) -> list:
+        return list(self.rows)
+
+    def fetchall(self) -> list:
+        return list(self.rows)
+
+    def one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+    def tuples(self) -> "FakeResult":
+        return FakeResult([tuple(vars(row).values()) for row in self.rows])
+
+    def scalars(self) -> "FakeResult":
+        return FakeResult([next(iter(vars(row).values())) for row in self.rows])
+
+    def scalar(self):
+        return next(iter(vars(self.rows[0]).values())) if self.rows else None
+
+    def scalar_one(self):
+        [row] = self.rows
+        return next(iter(vars(row).values()))
+
+    def scalar_one_or_none(self):
+        return next(iter(vars(self.rows[0]).values())) if self.rows else None
+
+
+class FakeSession:
+    """
+    AsyncSession stand-in that records statements compiled for Postgres.
+
+    The responder returns rows for a statement's SQL and bound parameters,
+    or None for no rows.
+    """
+
+    def __init__(
+        self,
+        responder: Callable[[str, dict], list | None] | None = None,
+        objects: dict | None = None,
+    ):
+        self.responder = responder or (lambda sql, params: None)
+        self.objects = objects or {}  # Instances session.get returns, by primary key
+        self.statements: list[tuple[str, dict]] = []
+        self.added: list = []
+
+    async def execute(self, stmt, *args, **kwargs) -> FakeResult:
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        sql, params = str(compiled), compiled.params
+        self.statements.append((sql, params))
+        return FakeResult(self.responder(sql, params) or [])
+
+    async def stream(self, stmt, *args, **kwargs):
+        result = await self.execute(stmt)
+
+        async def rows():
+            for row in result:
+                yield row
+
+        return rows()
+
+    async def get(self, model, ident):
+        return self.objects.get(ident)
+
+    def add(self, instance) -> None:
+        self.added.append(instance)
+
+    async def flush(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        self.statements.append(("SAVEPOINT", {}))
+        try:
+            yield
+        except Exception:
+            self.statements.append(("ROLLBACK TO SAVEPOINT", {}))
+            raise
+        self.statements.append(("RELEASE SAVEPOINT", {}))
+
+    async def commit(self) -> None:
+        self.statements.append(("COMMIT", {}))
+
+    async def rollback(self) -> None:
+        self.statements.append(("ROLLBACK", {}))
+
+    def executed(self, prefix: str) -> list[tuple[str, dict]]:
+        """Return the statements whose SQL starts with a prefix, e.g. "INSERT INTO job"."""
+        return [(sql, params) for sql, params in self.statements if sql.startswith(prefix)]
+
+
+@pytest.fixture
+def tenant_id():
+    return uuid4()
+
+
+@pytest.fixture
+def share_id():
+    return uuid4()
+
+
+@pytest.fixture
+def api_client(tenant_id):
+    """Return a function giving a TestClient whose requests use a FakeSession."""
+
+    def client(session: FakeSession) -> TestClient:
+        tenant = Tenant(id=tenant_id, name="test")
+        app.dependency_overrides[get_tenant_context] = lambda: TenantContext(tenant, session)
+        return TestClient(app)
+
+    yield client
+    app.dependency_overrides.clear()
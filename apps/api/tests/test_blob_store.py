@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from app.services import blob_store as blob_store_module
+from app.services.blob_store import (
+    BlobStore,
+    add_reference,
+    load_extracted,
+    store_extracted,
+    sweep_blobs,
+    sweep_orphan_files,
+)
+from app.services.extraction import ExtractedDocument
+from tests.conftest import FakeRow, FakeSession
+
+
+@pytest.fixture
+def blob_store(tmp_path, monkeypatch) -> BlobStore:
+    store = BlobStore(str(tmp_path))
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    monkeypatch.setattr(blob_store_module.settings, "blob_store_enabled", True)
+    return store
+
+
+async def test_dropping_last_reference_keeps_blob_until_swept(tenant_id, blob_store):
+    blob_store.write(tenant_id, "sha256:x", b"{}")
+    session = FakeSession(lambda sql, params: [FakeRow(refcount=0)])
+
+    await add_reference(session, tenant_id, "sha256:x", delta=-1)
+
+    assert not session.executed("DELETE")
+    assert blob_store.read(tenant_id, "sha256:x") == b"{}"
+
+
+async def test_sweep_unlinks_blobs_before_releasing_rows(tenant_id, blob_store, monkeypatch):
+    blob_store.write(tenant_id, "sha256:x", b"{}")
+    unused = [FakeRow(tenant_id=tenant_id, content_hash="sha256:x")]
+    session = FakeSession(lambda sql, params: unused if sql.startswith("DELETE") else None)
+    delete = blob_store.delete
+
+    def unlink(*args) -> None:
+        session.statements.append(("UNLINK", {}))
+        unused.clear()
+        delete(*args)
+
+    monkeypatch.setattr(blob_store, "delete", unlink)
+
+    assert await sweep_blobs(session) == 1
+
+    assert [sql.split(" ")[0] for sql, _ in session.statements] == [
+        "DELETE",
+        "UNLINK",
+        "COMMIT",
+        "DELETE",
+        "COMMIT",
+    ]
+    assert blob_store.read(tenant_id, "sha256:x") is None
+
+
+async def test_uploaded_text_is_loaded_from_blob_store(tenant_id, blob_store):
+    uploaded = ExtractedDocument(title="Q1", text="Revenue grew.")
+    blob_store.write(tenant_id, "blake2b:x", uploaded.model_dump_json().encode())
+
+    extracted = await load_extracted(FakeSession(), tenant_id, "blake2b:x")
+
+    assert extracted == uploaded
+
+
+async def test_store_locks_blob_and_row_before_writing(tenant_id, blob_store, monkeypatch):
+    session = FakeSession()
+    write = blob_store.write_compressed
+
+    def write_file(*args) -> None:
+        session.statements.append(("WRITE", {}))
+        write(*args)
+
+    monkeypatch.setattr(blob_store, "write_compressed", write_file)
+
+    await store_extracted(session, tenant_id, "sha256:x", ExtractedDocument(title="", text="x"))
+
+    assert [sql.split(" ")[0] for sql, _ in session.statements] == ["SELECT", "INSERT", "WRITE"]
+    assert "pg_advisory_xact_lock" in session.statements[0][0]
+    assert blob_store.read(tenant_id, "sha256:x") is not None
+
+
+def age(path: str) -> None:
+    os.utime(path, (0, 0))
+
+
+async def test_orphan_sweep_removes_old_files_without_rows(tenant_id, blob_store):
+    for content_hash in ("sha256:indexed", "sha256:orphan", "sha256:new"):
+        blob_store.write(tenant_id, content_hash, b"{}")
+    age(blob_store.path(tenant_id, "sha256:indexed"))
+    age(blob_store.path(tenant_id, "sha256:orphan"))
+    tmp_path = os.path.join(os.path.dirname(blob_store.path(tenant_id, "sha256:new")), "a.tmp")
+    open(tmp_path, "wb").close()
+    age(tmp_path)
+
+    def responder(sql, params):
+        if "pg_try_advisory_xact_lock" in sql:
+            return [FakeRow(locked=True)]
+        return [FakeRow(content_hash="sha256:indexed")]
+
+    assert await sweep_orphan_files(FakeSession(responder)) == 2
+
+    assert blob_store.read(tenant_id, "sha256:indexed") == b"{}"
+    assert blob_store.read(tenant_id, "sha256:orphan") is None
+    assert blob_store.read(tenant_id, "sha256:new") == b"{}"
+    assert not os.path.exists(tmp_path)
+
+
+async def test_orphan_sweep_skips_files_being_stored(tenant_id, blob_store):
+    blob_store.write(tenant_id, "sha256:x", b"{}")
+    age(blob_store.path(tenant_id, "sha256:x"))
+
+    def responder(sql, params):
+        if "pg_try_advisory_xact_lock" in sql:
+            return [FakeRow(locked=False)]
+        return None
+
+    assert await sweep_orphan_files(FakeSession(responder)) == 0
+
+    assert blob_store.read(tenant_id, "sha256:x") == b"{}"
@@ -0,0 +1,116 @@
+from datetime import datetime
+from uuid import uuid4
+
+from app.models import ScanSession, Share
+from app.services.folder_digest import (
+    FolderDigestChanges,
+    apply_folder_digest_changes,
+    build_folder_digests,
+)
+from tests.conftest import FakeRow, FakeSession
+
+
+def digest_session(root_exists: bool) -> FakeSession:
+    def respond(sql, params):
+        if sql.startswith("SELECT folder_digest.id"):
+            return [FakeRow(id=uuid4())] if root_exists else []
+        if sql.startswith("SELECT file.relative_path"):
+            return [
+                FakeRow(
+                    relative_path="a/b.txt",
+                    size_bytes=1,
+                    mtime=datetime(2026, 1, 1),
+                    content_hash="sha256:x",
+                )
+            ]
+        return None
+
+    return FakeSession(respond)
+
+
+async def test_build_locks_share_before_reading_files(tenant_id, share_id):
+    session = digest_session(root_exists=False)
+
+    await build_folder_digests(session, tenant_id, share_id)
+
+    statements = [sql for sql, _ in session.statements]
+    assert statements[0].startswith("SELECT pg_advisory_xact_lock")
+    assert statements[1].startswith("SELECT folder_digest.id")
+    assert len(session.executed("INSERT INTO folder_digest")) == 1
+
+
+async def test_build_skips_share_built_concurrently(tenant_id, share_id):
+    session = digest_session(root_exists=True)
+
+    await build_folder_digests(session, tenant_id, share_id)
+
+    assert not session.executed("SELECT file.relative_path")
+    assert not session.executed("INSERT INTO folder_digest")
+
+
+async def test_changes_take_share_lock(tenant_id, share_id):
+    session = digest_session(root_exists=True)
+    changes = FolderDigestChanges()
+    changes.record(share_id, "a/b.txt", None, 42)
+
+    await apply_folder_digest_changes(session, tenant_id, changes)
+
+    assert session.statements[0][0].startswith("SELECT pg_advisory_xact_lock")
+    assert len(session.executed("INSERT INTO folder_digest")) == 1
+
+
+def compare_session(tenant_id, share_id, scan: ScanSession) -> FakeSession:
+    def respond(sql, params):
+        if sql.startswith("SELECT share"):
+            return [FakeRow(share=Share(id=share_id, tenant_id=tenant_id, name="docs"))]
+        if sql.startswith("SELECT folder_digest.id"):
+            return [FakeRow(id=uuid4())]
+        if sql.startswith("SELECT folder_digest.path"):
+            return [FakeRow(path="a", digest=1, file_count=2)]
+        return None
+
+    return FakeSession(respond, objects={scan.id: scan})
+
+
+def test_compare_records_matching_folders_for_the_scan_session(tenant_id, share_id, api_client):
+    scan = ScanSession(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        share_id=share_id,
+        agent_id="agent-1",
+        started_at=datetime.utcnow(),
+    )
+    session = compare_session(tenant_id, share_id, scan)
+
+    response = api_client(session).post(
+        "/v0/ingest/folders/compare",
+        json={
+            "agent_id": "agent-1",
+            "share_name": "docs",
+            "scan_session_id": str(scan.id),
+            "folders": [
+                {"path": "a", "digest": f"{1:064x}", "file_count": 2},
+                {"path": "b", "digest": f"{2:064x}", "file_count": 1},
+            ],
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"different": ["b"]}
+    [(_, params)] = session.executed("INSERT INTO scan_session_folder")
+    assert params["scan_session_id_m0"] == scan.id
+    assert params["path_m0"] == "a"
+    assert not session.executed("UPDATE file")
+
+
+def test_compare_rejects_malformed_digests(tenant_id, share_id, api_client):
+    response = api_client(FakeSession()).post(
+        "/v0/ingest/folders/compare",
+        json={
+            "agent_id": "agent-1",
+            "share_name": "docs",
+            "folders": [{"path": "", "digest": "not-hex", "file_count": 1}],
+        },
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,185 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+
+from app.models import FileEventType
+from app.schemas import AclEntryInput, FileEventInput
+from app.services.ingest import BulkIngest
+from tests.conftest import FakeRow, FakeSession
+
+MTIME = datetime(2026, 3, 1, 12, 30, tzinfo=UTC)
+
+
+def stored_file(share_id, **overrides) -> FakeRow:
+    """A file row as load_files selects it, with Postgres' tz-aware mtime."""
+    row = {
+        "id": uuid4(),
+        "share_id": share_id,
+        "relative_path": "reports/q1.pdf",
+        "name": "q1.pdf",
+        "size_bytes": 1024,
+        "mtime": MTIME,
+        "file_type": "application/pdf",
+        "content_hash": "sha256:" + "a" * 64,
+        "acl_hash": "sha256:acl",
+        "acl_set_id": uuid4(),
+        "last_seen_at": datetime(2026, 3, 2),
+        "deleted": False,
+    }
+    row.update(overrides)
+    return FakeRow(**row)
+
+
+def ingest_session(share_id, *files: FakeRow) -> FakeSession:
+    def respond(sql, params):
+        if sql.startswith("SELECT share.name"):
+            return [FakeRow(name="docs", id=share_id)]
+        if sql.startswith("SELECT file.id"):
+            return list(files)
+        return None
+
+    return FakeSession(respond)
+
+
+def event(**overrides) -> FileEventInput:
+    fields = {
+        "type": FileEventType.FILE_DISCOVERED,
+        "share_name": "docs",
+        "relative_path": "reports/q1.pdf",
+        "size_bytes": 1024,
+        # Agents send naive UTC mtimes
+        "mtime": MTIME.replace(tzinfo=None),
+        "file_type": "application/pdf",
+        "content_hash": "blake2b:" + "b" * 64,
+        "acl_hash": "sha256:acl",
+    }
+    fields.update(overrides)
+    return FileEventInput(**fields)
+
+
+async def test_hash_algorithm_switch_keeps_unchanged_file(tenant_id, share_id):
+    session = ingest_session(share_id, stored_file(share_id))
+
+    jobs_created = await BulkIngest(session, tenant_id, {}).run([[event()]])
+
+    assert jobs_created == [0]
+    assert not session.executed("INSERT INTO job")
+
+
+async def test_hash_algorithm_switch_with_new_mtime_queues_extraction(tenant_id, share_id):
+    session = ingest_session(share_id, stored_file(share_id))
+
+    jobs_created = await BulkIngest(session, tenant_id, {}).run(
+        [[event(mtime=datetime(2026, 4, 1))]]
+    )
+
+    assert jobs_created == [1]
+    assert session.executed("INSERT INTO job")
+
+
+async def test_touched_file_updates_size_and_mtime_without_extraction(tenant_id, share_id):
+    session = ingest_session(share_id, stored_file(share_id))
+    touched = datetime(2026, 4, 1, 8, 0)
+
+    jobs_created = await BulkIngest(session, tenant_id, {}).run(
+        [[event(content_hash="sha256:" + "a" * 64, mtime=touched, size_bytes=2048)]]
+    )
+
+    assert jobs_created == [0]
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["mtime_m0"] == touched
+    assert params["size_bytes_m0"] == 2048
+
+
+async def test_unstorable_events_are_skipped_not_the_batch(tenant_id, share_id):
+    session = ingest_session(share_id)
+
+    jobs_created = await BulkIngest(session, tenant_id, {}).run(
+        [
+            [
+                event(relative_path="bad\x00name.pdf"),
+                event(relative_path=""),
+                event(relative_path="huge.bin", size_bytes=2**64),
+                event(relative_path="reports/q2.pdf"),
+            ]
+        ]
+    )
+
+    assert jobs_created == [1]
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["relative_path_m0"] == "reports/q2.pdf"
+    assert "relative_path_m1" not in params
+
+
+async def test_unstorable_acl_set_is_dropped(tenant_id, share_id):
+    bad_entries = [AclEntryInput(principal_external_id="S-1-5\x00", rights="R")]
+    session = ingest_session(share_id)
+
+    await BulkIngest(session, tenant_id, {"sha256:bad": bad_entries}).run(
+        [[event(relative_path="reports/q2.pdf", acl_hash="sha256:bad")]]
+    )
+
+    assert not session.executed("INSERT INTO acl_set")
+
+
+async def test_unknown_acl_set_keeps_file_acl(tenant_id, share_id):
+    stored = stored_file(share_id)
+    session = ingest_session(share_id, stored)
+
+    await BulkIngest(session, tenant_id, {}).run([[event(acl_hash="sha256:unknown")]])
+
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["acl_hash_m0"] == stored.acl_hash
+    assert params["acl_set_id_m0"] == stored.acl_set_id
+
+
+async def test_known_acl_set_is_assigned(tenant_id, share_id):
+    acl_set_id = uuid4()
+    session = ingest_session(share_id, stored_file(share_id))
+    respond = session.responder
+
+    def respond_with_acl_set(sql, params):
+        if sql.startswith("SELECT acl_set.acl_hash"):
+            return [FakeRow(acl_hash="sha256:other", id=acl_set_id)]
+        return respond(sql, params)
+
+    session.responder = respond_with_acl_set
+
+    await BulkIngest(session, tenant_id, {}).run([[event(acl_hash="sha256:other")]])
+
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["acl_hash_m0"] == "sha256:other"
+    assert params["acl_set_id_m0"] == acl_set_id
+
+
+async def test_new_file_with_unknown_acl_set_has_no_acl_hash(tenant_id, share_id):
+    session = ingest_session(share_id)
+
+    await BulkIngest(session, tenant_id, {}).run([[event(acl_hash="sha256:unknown")]])
+
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["acl_hash_m0"] is None
+    assert params["acl_set_id_m0"] is None
+
+
+async def test_file_without_known_acl_adopts_one_without_acl_change(tenant_id, share_id):
+    acl_set_id = uuid4()
+    stored = stored_file(
+        share_id, content_hash="blake2b:" + "b" * 64, acl_hash=None, acl_set_id=None
+    )
+    session = ingest_session(share_id, stored)
+    respond = session.responder
+
+    def respond_with_acl_set(sql, params):
+        if sql.startswith("SELECT acl_set.acl_hash"):
+            return [FakeRow(acl_hash="sha256:acl", id=acl_set_id)]
+        return respond(sql, params)
+
+    session.responder = respond_with_acl_set
+
+    jobs_created = await BulkIngest(session, tenant_id, {}).run([[event()]])
+
+    assert jobs_created == [0]
+    assert not session.executed("INSERT INTO file_event")
+    [(_, params)] = session.executed("INSERT INTO file (")
+    assert params["acl_hash_m0"] == "sha256:acl"
+    assert params["acl_set_id_m0"] == acl_set_id
@@ -0,0 +1,92 @@
+import gzip
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.models import IngestBatch, JobStatus
+from app.schemas import IngestEventsRequest
+from app.workers import ingest as ingest_worker
+from app.workers.ingest import IngestWorker
+from tests.conftest import FakeRow, FakeSession
+
+
+def staged_batch(tenant_id, agent_id: str, minutes: int) -> IngestBatch:
+    request = IngestEventsRequest(agent_id=agent_id, events=[])
+    return IngestBatch(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        agent_id=agent_id,
+        status=JobStatus.PENDING,
+        event_count=0,
+        payload_gzip=gzip.compress(request.model_dump_json().encode()),
+        attempts=0,
+        created_at=datetime(2026, 1, 1) + timedelta(minutes=minutes),
+    )
+
+
+def worker_session(batches: list[IngestBatch], locked_tenants=()) -> FakeSession:
+    tenants = list(dict.fromkeys(batch.tenant_id for batch in batches))
+    claimed = []
+
+    def respond(sql, params):
+        if sql.startswith("SELECT ingest_batch.tenant_id"):
+            return [FakeRow(tenant_id=tenant_id) for tenant_id in tenants]
+        if sql.startswith("SELECT pg_try_advisory_xact_lock"):
+            tenant = tenants[len(claimed)]
+            claimed.append(tenant)
+            return [FakeRow(locked=tenant not in locked_tenants)]
+        if sql.startswith("SELECT ingest_batch.id"):
+            return [FakeRow(batch=batch) for batch in batches if batch.tenant_id == claimed[-1]]
+        return None
+
+    return FakeSession(respond)
+
+
+def batch_updates(session: FakeSession) -> list[tuple]:
+    """(batch_id, new status or "FAILED_ATTEMPT") of each UPDATE, in order."""
+    updates = []
+    for _, params in session.executed("UPDATE ingest_batch"):
+        updates.append((params["id_1"], params.get("status", "FAILED_ATTEMPT")))
+    return updates
+
+
+@pytest.fixture
+def failing_agent(monkeypatch):
+    """Make applying any request from agent "bad" fail."""
+
+    async def ingest_staged_batches(session, tenant_id, requests):
+        if any(request.agent_id == "bad" for request in requests):
+            raise ValueError("bad batch")
+        return [0] * len(requests)
+
+    monkeypatch.setattr(ingest_worker, "ingest_staged_batches", ingest_staged_batches)
+
+
+async def test_batches_after_a_failed_one_stay_pending(tenant_id, failing_agent, monkeypatch):
+    first, bad, later = (
+        staged_batch(tenant_id, "good", 0),
+        staged_batch(tenant_id, "bad", 1),
+        staged_batch(tenant_id, "good", 2),
+    )
+    session = worker_session([first, bad, later])
+    monkeypatch.setattr(ingest_worker, "async_session_factory", lambda: session)
+
+    assert await IngestWorker().run_once()
+
+    assert batch_updates(session) == [
+        (first.id, JobStatus.SUCCEEDED),
+        (bad.id, "FAILED_ATTEMPT"),
+    ]
+    # Everything ran in the transaction holding the tenant lock
+    assert session.statements[-1][0] == "COMMIT"
+    assert ("ROLLBACK", {}) not in session.statements
+
+
+async def test_claim_passes_over_tenants_another_worker_holds(tenant_id):
+    other_tenant = uuid4()
+    held = staged_batch(tenant_id, "good", 0)
+    free = staged_batch(other_tenant, "good", 1)
+    session = worker_session([held, free], locked_tenants={tenant_id})
+
+    assert await IngestWorker().claim_batches(session) == [free]
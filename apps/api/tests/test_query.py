@@ -0,0 +1,13 @@
+from tests.conftest import FakeSession
+
+
+def test_dashboard_counts_only_live_files(api_client):
+    session = FakeSession()
+
+    response = api_client(session).get("/v0/dashboard/metrics")
+
+    assert response.status_code == 200
+    selects = session.executed("SELECT")
+    assert len(selects) == 6
+    for sql, _ in selects:
+        assert "file.deleted = false" in sql
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.models import Document, File, Job, JobStatus, JobType, ScanSession
+from app.services.ingest import BulkIngest
+from app.services.scan_sessions import close_scan_session
+from app.workers.purge import PurgeWorker
+from tests.conftest import FakeRow, FakeSession
+from tests.test_ingest import event, ingest_session, stored_file
+
+
+async def test_file_rediscovered_after_purge_is_extracted_again(tenant_id, share_id):
+    started_at = datetime.utcnow()
+    row = stored_file(share_id, last_seen_at=started_at - timedelta(days=1))
+
+    # A complete scan does not see the file: it is tombstoned and a purge queued
+    def respond_close(sql, params):
+        if sql.startswith("UPDATE file"):
+            return [row]
+        if sql.startswith("INSERT INTO job"):
+            return [FakeRow(id=uuid4())]
+        return None
+
+    scan = ScanSession(
+        id=uuid4(), tenant_id=tenant_id, share_id=share_id, agent_id="a", started_at=started_at
+    )
+    session = FakeSession(respond_close)
+    assert await close_scan_session(session, scan) == 1
+    [(_, params)] = session.executed("INSERT INTO job")
+    assert JobType.PURGE_CONTENT in params.values()
+
+    # The purge removes the file's documents
+    file = File(id=row.id, tenant_id=tenant_id, share_id=share_id, deleted=True)
+    document = Document(id=uuid4(), file_id=row.id, content_hash=row.content_hash)
+    session = FakeSession(
+        lambda sql, params: (
+            [FakeRow(document=document)] if sql.startswith("SELECT document") else None
+        ),
+        objects={row.id: file},
+    )
+    job = Job(id=uuid4(), tenant_id=tenant_id, job_type=JobType.PURGE_CONTENT, file_id=row.id)
+    await PurgeWorker().process_job(session, job)
+    assert session.executed("DELETE FROM document")
+
+    # The file comes back unchanged and must be extracted again
+    session = ingest_session(share_id, stored_file(share_id, id=row.id, deleted=True))
+    jobs_created = await BulkIngest(session, tenant_id, {}).run(
+        [[event(content_hash=row.content_hash)]]
+    )
+    assert jobs_created == [1]
+    [(_, params)] = session.executed("INSERT INTO job")
+    assert params["file_id_m0"] == row.id
+
+
+async def test_close_keeps_files_beneath_matched_folders(tenant_id, share_id):
+    session = FakeSession()
+
+    await close_scan_session(session, open_scan(tenant_id, share_id))
+
+    [(sql, _)] = session.executed("UPDATE file")
+    assert "scan_session_folder" in sql
+    assert "starts_with(file.relative_path" in sql
+
+
+def open_scan(tenant_id, share_id) -> ScanSession:
+    return ScanSession(
+        id=uuid4(),
+        tenant_id=tenant_id,
+        share_id=share_id,
+        agent_id="agent-1",
+        started_at=datetime.utcnow(),
+    )
+
+
+def close_session(scan: ScanSession, staged: list[FakeRow]) -> FakeSession:
+    def respond(sql, params):
+        if sql.startswith("SELECT scan_session"):
+            return [FakeRow(scan=scan, name="docs")]
+        if sql.startswith("SELECT ingest_batch.status"):
+            return staged
+        return None
+
+    return FakeSession(respond)
+
+
+def test_close_only_waits_for_the_sessions_agent(tenant_id, share_id, api_client):
+    scan = open_scan(tenant_id, share_id)
+    session = close_session(scan, [])
+
+    response = api_client(session).post(f"/v0/ingest/scans/{scan.id}/close")
+
+    assert response.status_code == 200
+    [(_, params)] = session.executed("SELECT ingest_batch.status")
+    assert "agent-1" in params.values()
+
+
+def test_close_blocked_by_failed_batch_until_discarded(tenant_id, share_id, api_client):
+    scan = open_scan(tenant_id, share_id)
+    session = close_session(scan, [FakeRow(status=JobStatus.FAILED, count=1)])
+
+    response = api_client(session).post(f"/v0/ingest/scans/{scan.id}/close")
+
+    assert response.status_code == 409
+    assert "DELETE /v0/ingest/batches" in response.json()["detail"]
+
+
+def test_discard_failed_batch(tenant_id, api_client):
+    session = FakeSession(lambda sql, params: [FakeRow(status=JobStatus.FAILED)])
+
+    response = api_client(session).delete(f"/v0/ingest/batches/{uuid4()}")
+
+    assert response.status_code == 204
+    assert session.executed("DELETE FROM ingest_batch")
+
+
+def test_pending_batch_cannot_be_discarded(tenant_id, api_client):
+    session = FakeSession(lambda sql, params: [FakeRow(status=JobStatus.PENDING)])
+
+    response = api_client(session).delete(f"/v0/ingest/batches/{uuid4()}")
+
+    assert response.status_code == 409
+    assert not session.executed("DELETE FROM ingest_batch")